@@ -154,7 +154,10 @@ class AstroVision(QMainWindow):
     def close_tab(self, index):
         """Close a tab."""
         if index > 0:  # Prevent closing the home tab
+            tab = self.tab_widget.widget(index)
             self.tab_widget.removeTab(index)
+            tab.close()  # Let the module release threads, files and directory watches
+            tab.deleteLater()
 
 
 if __name__ == "__main__":
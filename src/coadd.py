@@ -0,0 +1,207 @@
+import os
+import shutil
+import tempfile
+import numpy as np
+from astropy.io import fits
+from astropy.wcs import WCS
+from reproject import reproject_interp
+
+from utilities import get_data_dir
+from field_index import locate_fields_covering
+from fits_utils import image_hdu
+from download_manager import shared_manager, frame_jobs, BULK
+
+
+# Rows of the output grid reprojected at once
+REPROJECT_ROWS = 256
+
+# Memory budget for one block of the combine step (bytes)
+COMBINE_MEMORY = 256 * 1024 ** 2
+
+
+def build_target_wcs(ra, dec, size, pixel_scale=0.396):
+    """
+    Build a north-up TAN grid centered on RA/DEC.
+
+    Parameters:
+        size (int): Width and height of the grid in pixels.
+        pixel_scale (float): Pixel scale in arcseconds (SDSS native is 0.396).
+    """
+    wcs = WCS(naxis=2)
+    wcs.wcs.ctype = ["RA---TAN", "DEC--TAN"]
+    wcs.wcs.crval = [ra, dec]
+    wcs.wcs.crpix = [(size + 1) / 2, (size + 1) / 2]
+    wcs.wcs.cdelt = [-pixel_scale / 3600, pixel_scale / 3600]
+    return wcs
+
+
+def robust_weight(image):
+    """Inverse-variance weight of an epoch from a robust (MAD) noise estimate on a subsample."""
+    sample = image[::4, ::4]
+    sample = sample[np.isfinite(sample)]
+    if sample.size < 100:
+        return 0.0
+    noise = 1.4826 * np.median(np.abs(sample - np.median(sample)))
+    return 1.0 / noise ** 2 if noise > 0 else 0.0
+
+
+def reproject_epochs(file_paths, target_wcs, shape, cube_path, progress_callback=None):
+    """
+    Reproject every epoch onto the target grid, row chunk by row chunk, into an on-disk cube.
+
+    Returns:
+        tuple: (cube, weights) where cube is a memory-mapped (epochs, height, width) array.
+    """
+    height, width = shape
+    cube = np.lib.format.open_memmap(cube_path, mode="w+", dtype=np.float32, shape=(len(file_paths), height, width))
+    weights = np.zeros(len(file_paths))
+
+    for index, file_path in enumerate(file_paths):
+        with fits.open(file_path, memmap=True) as hdul:
+            hdu = image_hdu(hdul)
+            data = hdu.data
+            wcs = WCS(hdu.header)
+            for y0 in range(0, height, REPROJECT_ROWS):
+                y1 = min(height, y0 + REPROJECT_ROWS)
+                reproject_interp(
+                    (data, wcs), target_wcs[y0:y1, :], shape_out=(y1 - y0, width),
+                    output_array=cube[index, y0:y1], return_footprint=False
+                )
+        weights[index] = robust_weight(cube[index])
+        cube.flush()
+
+        if progress_callback:
+            progress_callback(index + 1, len(file_paths))
+
+    return cube, weights
+
+
+def combine_cube(cube, weights, method="mean", sigma=3.0, iterations=3, memory_limit=COMBINE_MEMORY):
+    """
+    Combine a stack of reprojected epochs block by block.
+
+    Each block covers as many output rows as fit in `memory_limit`, so memory
+    use does not grow with the number of epochs.
+
+    Parameters:
+        method (str): "mean" for a weighted sigma-clipped mean, "median" for a median.
+
+    Returns:
+        tuple: (image, coverage) where coverage counts the epochs used per pixel.
+    """
+    epochs, height, width = cube.shape
+    rows = max(1, int(memory_limit // (epochs * width * 4 * 4)))  # Block plus temporaries
+    image = np.full((height, width), np.nan, dtype=np.float32)
+    coverage = np.zeros((height, width), dtype=np.int16)
+    weights = np.asarray(weights, dtype=np.float32)
+    epoch_weights = weights[:, None, None]
+
+    for y0 in range(0, height, rows):
+        y1 = min(height, y0 + rows)
+        block = np.array(cube[:, y0:y1], dtype=np.float32)
+        block[weights == 0] = np.nan  # Drop epochs without a usable noise estimate
+
+        with np.errstate(all="ignore"):
+            if method == "median":
+                image[y0:y1] = np.nanmedian(block, axis=0)
+            else:
+                # Iterative sigma clipping around the median with a MAD scatter
+                for _ in range(iterations):
+                    center = np.nanmedian(block, axis=0)
+                    scatter = 1.4826 * np.nanmedian(np.abs(block - center), axis=0)
+                    outliers = np.abs(block - center) > sigma * np.maximum(scatter, 1e-12)
+                    if not outliers.any():
+                        break
+                    block[outliers] = np.nan
+
+                valid = np.isfinite(block)
+                weight = np.where(valid, epoch_weights, 0)
+                total = weight.sum(axis=0)
+                image[y0:y1] = np.where(total > 0, np.nansum(block * weight, axis=0) / total, np.nan)
+
+        coverage[y0:y1] = np.isfinite(block).sum(axis=0)
+
+    return image, coverage
+
+
+def coadd_band(ra, dec, band, file_paths, output_directory, size=1024, method="mean", progress_callback=None):
+    """
+    Coadd all epochs of one band onto a common grid and write the result as FITS.
+
+    Returns:
+        str: Path of the coadded FITS file.
+    """
+    target_wcs = build_target_wcs(ra, dec, size)
+    scratch = tempfile.mkdtemp(prefix="astrovision-coadd-")
+    try:
+        cube, weights = reproject_epochs(
+            file_paths, target_wcs, (size, size), os.path.join(scratch, "cube.npy"), progress_callback
+        )
+        image, coverage = combine_cube(cube, weights, method)
+        del cube
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+    header = target_wcs.to_header()
+    header['FILTER'] = band
+    header['NCOMBINE'] = (len(file_paths), "Number of epochs combined")
+    header['COMBINE'] = ("sigma-clipped mean" if method == "mean" else "median", "Combination method")
+    header['BUNIT'] = "nanomaggy"
+
+    file_path = os.path.join(output_directory, f"coadd-{band}-{ra:.4f}{dec:+.4f}.fits")
+    fits.HDUList([
+        fits.PrimaryHDU(image, header=header),
+        fits.ImageHDU(coverage, header=target_wcs.to_header(), name="COVERAGE"),
+    ]).writeto(file_path, overwrite=True)
+    return file_path
+
+
+def coadd_position(ra, dec, bands, size=1024, method="mean", progress_callback=None):
+    """
+    Download every epoch covering RA/DEC and coadd each band.
+
+    The coadded frames are written to data/coadd-<ra><dec>/ so the directory can be
+    opened directly in Composite Creation.
+
+    Returns:
+        str: The output directory, or None if no epochs were found.
+    """
+    fields = locate_fields_covering(ra, dec)
+    if not fields:
+        return None
+
+    # Download (or reuse) every epoch through the shared queue, behind interactive downloads
+    downloads = shared_manager()
+    epoch_directories, job_ids = [], []
+    for row in fields:
+        run_camcol_field = f"{row['run']}-{row['camcol']}-{row['field']}"
+        jobs = frame_jobs(run_camcol_field, bands, downloads.compression)
+        job_ids += [downloads.enqueue(url, destination, BULK, processing) for url, destination, processing in jobs]
+        epoch_directories.append((run_camcol_field, get_data_dir(run_camcol_field)))
+
+    def download_progress(done, total):
+        if progress_callback:
+            progress_callback(int(done / total * 50))
+
+    downloads.wait(job_ids, download_progress)
+
+    output_directory = get_data_dir(f"coadd-{ra:.4f}{dec:+.4f}")
+    for band_index, band in enumerate(bands):
+        file_paths = []
+        for run_camcol_field, directory in epoch_directories:
+            run, camcol, field = run_camcol_field.split("-")
+            file_path = os.path.join(directory, f"frame-{band}-{run.zfill(6)}-{camcol}-{field.zfill(4)}.fits")
+            for candidate in (file_path, file_path + ".fz"):
+                if os.path.exists(candidate):
+                    file_paths.append(candidate)
+                    break
+        if not file_paths:
+            continue
+
+        def band_progress(done, total, band_index=band_index):
+            if progress_callback:
+                progress_callback(50 + int((band_index + done / total) / len(bands) * 50))
+
+        coadd_band(ra, dec, band, file_paths, output_directory, size, method, band_progress)
+
+    return output_directory
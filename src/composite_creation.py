@@ -2,46 +2,48 @@ from PyQt5.QtWidgets import (
     QWidget, QVBoxLayout, QHBoxLayout, QLabel, QLineEdit, QPushButton, QFileDialog, QCheckBox, QFrame, QComboBox, QSlider, QSizePolicy
 )
 from PyQt5.QtGui import QPixmap, QImage
-from PyQt5.QtCore import Qt
+from PyQt5.QtCore import Qt, QThread, pyqtSignal
 from astropy.io import fits
 from astropy.wcs import WCS
 from astropy.visualization import make_lupton_rgb
 from reproject import reproject_interp
 import os
 import re
+import shutil
+import tempfile
 import numpy as np
 from PIL import Image
-from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas, NavigationToolbar2QT as NavigationToolbar
+from matplotlib.backends.backend_agg import FigureCanvasAgg
 from matplotlib.figure import Figure
 
+from image_view import CompositeImageView
+from dir_watcher import shared_watcher
+from fits_utils import is_fits_file, image_hdu
+from registration import prepare_cutout, estimate_offset, apply_shift
+from composite_export import (
+    iter_strips_top_down, write_compressed_fits, write_png16, write_tiff16, write_deep_zoom, STRIP_ROWS
+)
 
-class MatplotlibCanvas(FigureCanvas):
-    def __init__(self, parent=None, width=5, height=4, dpi=100):
-        self.fig = Figure(figsize=(width, height), dpi=dpi)
-        self.ax = self.fig.add_subplot(111)
-        super().__init__(self.fig)
-
-        # Make the background transparent
-        self.setStyleSheet("background-color: transparent;")
-
-        # Initially hide the axes and set transparent
-        self.ax.axis('off')
-        self.fig.patch.set_alpha(0)  # Make figure transparent
 
-    def display_image(self, rgb_image):
-        """Display the composite RGB image on the canvas."""
-        self.ax.clear()  # Clear the axes
-        self.ax.imshow(rgb_image, origin='lower', aspect='equal')  # Display the image without fixed aspect ratio
-        self.ax.axis('off')  # Hide axes for a clean look
-        self.fig.subplots_adjust(left=0, right=1, top=1, bottom=0)  # Remove any padding/margins
-        self.draw()  # Render the updated canvas
+class ExportThread(QThread):
+    progress_signal = pyqtSignal(int)  # Percent done, for exports that report progress
+    finished_signal = pyqtSignal(str)
 
-    def reset_canvas(self):
-        """Reset the canvas to its transparent state."""
-        self.ax.clear()
-        self.ax.axis('off')  # Hide axes
-        self.fig.subplots_adjust(left=0, right=1, top=1, bottom=0)  # Reset margins
-        self.draw()
+    def __init__(self, export_function, success_message, *args, report_progress=False, **kwargs):
+        super().__init__()
+        self.export_function = export_function
+        self.success_message = success_message
+        self.args = args
+        self.kwargs = kwargs
+        if report_progress:
+            self.kwargs["progress_callback"] = self.progress_signal.emit
+
+    def run(self):
+        try:
+            self.export_function(*self.args, **self.kwargs)
+            self.finished_signal.emit(self.success_message)
+        except Exception as e:
+            self.finished_signal.emit(f"Error during export: {e}")
 
 
 class CompositeCreation(QWidget):
@@ -52,6 +54,19 @@ class CompositeCreation(QWidget):
         self.selected_filters = []
         self.reference_file = None  # Reference file for alignment
         self.auto_scale = False  # Automatic scaling checkbox state
+        self.rgb_image = None  # Last generated composite (uint8, origin at the bottom)
+        self.reference_wcs = None  # WCS of the reference frame used for alignment
+        self.channel_filters = {}  # Filter used for each RGB channel
+        self.aligned_images = {}  # Aligned channels, memory-mapped from the channel cache
+        self.reference_header = None  # WCS cards of the aligned channels
+        self.cache_dir = None  # Directory holding the aligned channel cache
+        self.export_thread = None
+        self.watched_directory = None  # Directory whose listing drives the filter dropdowns
+        self.available_filters = set()
+
+        # Shared directory listing; filter dropdowns follow files appearing or disappearing
+        self.watcher = shared_watcher()
+        self.watcher.files_changed.connect(self.on_files_changed)
 
         layout = QHBoxLayout(self)
 
@@ -71,16 +86,9 @@ class CompositeCreation(QWidget):
     def init_left_section(self, parent):
         layout = QVBoxLayout(parent)
 
-        # Matplotlib Canvas for Image Display
-        self.canvas = MatplotlibCanvas(self)
+        # Image view for the composite (wheel to zoom, drag to pan, double-click to fit)
+        self.canvas = CompositeImageView(self)
         self.canvas.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Expanding)
-        
-        # Matplotlib Toolbar
-        self.toolbar = NavigationToolbar(self.canvas, self)
-        self.toolbar.setStyleSheet("color: white;")
-        self.toolbar.hide()  # Initially hide the toolbar
-        
-        layout.addWidget(self.toolbar)
         layout.addWidget(self.canvas, stretch=5)
 
 
@@ -155,6 +163,21 @@ class CompositeCreation(QWidget):
 
         layout.addLayout(reference_row)
 
+        # Alignment Method
+        alignment_row = QHBoxLayout()
+
+        alignment_label = QLabel("Alignment:")
+        alignment_label.setStyleSheet("color: white; font-size: 14px;")
+        alignment_label.setFixedWidth(150)
+        alignment_row.addWidget(alignment_label)
+
+        self.alignment_dropdown = QComboBox()
+        self.alignment_dropdown.setStyleSheet("background-color: #3A3A3A; color: white; padding: 5px; font-size: 14px;")
+        self.alignment_dropdown.addItems(["WCS Reprojection", "FFT Registration"])
+        alignment_row.addWidget(self.alignment_dropdown, stretch=1)
+
+        layout.addLayout(alignment_row)
+
         # Stretch Factor
         stretch_row = QHBoxLayout()
 
@@ -271,6 +294,18 @@ class CompositeCreation(QWidget):
         save_image_button.clicked.connect(self.save_as_image)
         layout.addWidget(save_image_button)
 
+        # Add Save Annotated Image Button (rendered with Matplotlib)
+        save_annotated_button = QPushButton("Save Annotated Image")
+        save_annotated_button.setStyleSheet("background-color: #5A9; color: white; font-weight: bold; padding: 10px;")
+        save_annotated_button.clicked.connect(self.save_annotated_image)
+        layout.addWidget(save_annotated_button)
+
+        # Add Deep Zoom Export Button (tile pyramid for large mosaics)
+        save_tiles_button = QPushButton("Export Deep Zoom Tiles")
+        save_tiles_button.setStyleSheet("background-color: #5A9; color: white; font-weight: bold; padding: 10px;")
+        save_tiles_button.clicked.connect(self.save_as_deep_zoom)
+        layout.addWidget(save_tiles_button)
+
         layout.addStretch()
 
     def select_directory(self):
@@ -279,14 +314,27 @@ class CompositeCreation(QWidget):
             self.directory_input.setText(directory)
             self.check_filters(directory)
 
-    def check_filters(self, directory):
-        """Enable preprocessing and populate dropdowns if enough FITS files are available."""
+    def find_filters(self, directory):
+        """Return the set of bands with a FITS file in the directory."""
         available_filters = set()
-        for file_name in os.listdir(directory):
-            if file_name.lower().endswith(".fits"):
+        for file_name in self.watcher.files(directory):
+            if is_fits_file(file_name):
                 for band in ["u", "g", "r", "i", "z"]:
                     if f"-{band}-" in file_name:
                         available_filters.add(band)
+        return available_filters
+
+    def check_filters(self, directory):
+        """Enable preprocessing and populate dropdowns if enough FITS files are available."""
+        directory = os.path.abspath(directory)
+        if directory != self.watched_directory:
+            self.watcher.watch(directory)
+            if self.watched_directory is not None:
+                self.watcher.unwatch(self.watched_directory)
+            self.watched_directory = directory
+
+        available_filters = self.find_filters(directory)
+        self.available_filters = available_filters
 
         # Enable dropdowns and preprocessing options if at least 3 filters are available
         if len(available_filters) >= 3:
@@ -312,6 +360,11 @@ class CompositeCreation(QWidget):
 
             self.warning_label.setText("Please select a directory with at least 3 FITS files.")
 
+    def on_files_changed(self, directory, changed, removed):
+        """Refresh the dropdowns when the set of bands in the selected directory changes."""
+        if directory == self.watched_directory and self.find_filters(directory) != self.available_filters:
+            self.check_filters(directory)
+
     def update_reference_dropdown(self):
         """Update the reference file dropdown based on selected RGB filters."""
         selected_filters = [
@@ -355,8 +408,20 @@ class CompositeCreation(QWidget):
         except ValueError:
             pass  # Ignore invalid input
 
+    def find_band_file(self, directory, band):
+        """Return the single-epoch frame or coadd for a band in the directory, if any."""
+        for file_name in self.watcher.files(directory):
+            if re.match(rf"^(frame-{band}-\d+-\d+-\d+|coadd-{band}-.+)\.fits(\.fz)?$", file_name.lower()):
+                return os.path.join(directory, file_name)
+        return None
+
     def generate_composite(self):
         """Generate the composite RGB image based on user input."""
+        # A running export is still reading the channel cache, which is replaced below
+        if self.export_thread is not None and self.export_thread.isRunning():
+            self.warning_label.setText("Wait for the running export to finish before generating a new composite.")
+            return
+
         directory = self.directory_input.text()
         if not os.path.isdir(directory):
             self.warning_label.setText("Invalid directory. Please select a valid FITS directory.")
@@ -374,59 +439,71 @@ class CompositeCreation(QWidget):
 
         # Get the reference frame
         reference_filter = self.reference_dropdown.currentText()
-        reference_file_path = None
-
-        for file_name in os.listdir(directory):
-            if re.match(rf"^frame-{reference_filter}-\d+-\d+-\d+\.fits$", file_name.lower()):
-                reference_file_path = os.path.join(directory, file_name)
-                break
+        reference_file_path = self.find_band_file(directory, reference_filter)
 
         if not reference_file_path:
             self.warning_label.setText(f"Reference file for filter '{reference_filter}' not found in directory.")
             return
 
         # Fetch stretch and Q values
-        try:
-            stretch = float(self.stretch_input.text())
-            q_factor = int(self.q_input.text())
-        except ValueError:
-            self.warning_label.setText("Invalid stretch or Q factor values.")
+        values = self.stretch_values()
+        if values is None:
             return
+        stretch, q_factor = values
 
         # Step 1: Load the reference FITS file
         try:
             reference_hdulist = fits.open(reference_file_path)
-            reference_data = reference_hdulist[0].data
-            reference_header = reference_hdulist[0].header
+            reference_hdu = image_hdu(reference_hdulist)
+            reference_data = reference_hdu.data
+            reference_header = reference_hdu.header
             reference_wcs = WCS(reference_header)
+            self.reference_wcs = reference_wcs
         except Exception as e:
             self.warning_label.setText(f"Error loading reference file: {e}")
             return
 
-        # Step 2: Reproject and align all selected filters
+        # Step 2: Reproject and align all selected filters into the on-disk channel cache
+        self.release_channel_cache()
+        self.cache_dir = tempfile.mkdtemp(prefix="astrovision-composite-")
         aligned_images = {}
+        use_fft = self.alignment_dropdown.currentText() == "FFT Registration"
+        offsets = []
         try:
+            if use_fft:
+                reference_cutout = prepare_cutout(reference_data)
+
             for color, filter_name in selected_filters.items():
-                file_path = None
-                for file_name in os.listdir(directory):
-                    if re.match(rf"^frame-{filter_name}-\d+-\d+-\d+\.fits$", file_name.lower()):
-                        file_path = os.path.join(directory, file_name)
-                        break
+                file_path = self.find_band_file(directory, filter_name)
 
                 if not file_path:
                     self.warning_label.setText(f"File for filter '{filter_name}' not found in directory.")
                     return
 
-                # Load and reproject
-                hdulist = fits.open(file_path)
-                data = hdulist[0].data
-                header = hdulist[0].header
-                wcs = WCS(header)
-
-                reprojected_data, _ = reproject_interp(
-                    (data, wcs), reference_wcs, shape_out=reference_data.shape
-                )
-                aligned_images[color] = np.nan_to_num(reprojected_data, nan=0.0)  # Handle NaNs
+                # Load and align straight into a memory-mapped cache file
+                with fits.open(file_path) as hdulist:
+                    hdu = image_hdu(hdulist)
+                    data = hdu.data
+                    header = hdu.header
+                    wcs = WCS(header)
+
+                    aligned = np.lib.format.open_memmap(
+                        os.path.join(self.cache_dir, f"{color.lower()}.npy"), mode="w+",
+                        dtype=np.float32, shape=reference_data.shape
+                    )
+                    if use_fft:
+                        # Measure the offset on a downsampled cutout, then shift the full frame once
+                        dy, dx, confidence = estimate_offset(reference_data, data, reference_cutout=reference_cutout)
+                        apply_shift(data, dy, dx, shape=reference_data.shape, output=aligned)
+                        offsets.append(f"{color} ({filter_name}): dy={dy:+.2f}, dx={dx:+.2f}, confidence={confidence:.2f}")
+                    else:
+                        reproject_interp(
+                            (data, wcs), reference_wcs, shape_out=reference_data.shape,
+                            output_array=aligned, return_footprint=False
+                        )
+                    np.nan_to_num(aligned, copy=False, nan=0.0)  # Handle NaNs
+                    aligned.flush()
+                    aligned_images[color] = aligned
         except Exception as e:
             self.warning_label.setText(f"Error reprojecting images: {e}")
             return
@@ -442,59 +519,157 @@ class CompositeCreation(QWidget):
                 stretch=stretch, Q=q_factor
             )
 
-            # Display the image on the Matplotlib canvas
+            # Display the uint8 buffer directly, no re-rasterization
+            self.rgb_image = rgb_image
+            self.aligned_images = aligned_images
+            self.reference_header = reference_wcs.to_header()
+            self.channel_filters = selected_filters
             self.canvas.display_image(rgb_image)
 
-            # Show the toolbar for interaction
-            self.toolbar.show()
+            # Report the measured offsets for FFT registration
+            self.warning_label.setText("\n".join(offsets))
         except Exception as e:
             self.warning_label.setText(f"Error generating composite: {e}")
     
+    def release_channel_cache(self):
+        """Drop the aligned channel cache and delete its files."""
+        self.aligned_images = {}
+        if self.cache_dir:
+            shutil.rmtree(self.cache_dir, ignore_errors=True)
+            self.cache_dir = None
+
+    def cached_channels(self):
+        """Return the aligned (red, green, blue) channels, or None if no composite was generated."""
+        if not all(color in self.aligned_images for color in ["Red", "Green", "Blue"]):
+            self.warning_label.setText("Generate a composite before saving.")
+            return None
+        return self.aligned_images["Red"], self.aligned_images["Green"], self.aligned_images["Blue"]
+
+    def stretch_values(self):
+        """Return the (stretch, Q factor) entered, or None after reporting invalid values."""
+        try:
+            return float(self.stretch_input.text()), int(self.q_input.text())
+        except ValueError:
+            self.warning_label.setText("Invalid stretch or Q factor values.")
+            return None
+
+    def start_export(self, export_function, success_message, *args, report_progress=False, **kwargs):
+        """Run an export in a background thread and report its progress and result in the warning label."""
+        if self.export_thread is not None and self.export_thread.isRunning():
+            self.warning_label.setText("An export is already running.")
+            return
+        self.warning_label.setText("Exporting...")
+        self.export_thread = ExportThread(export_function, success_message, *args, report_progress=report_progress, **kwargs)
+        self.export_thread.progress_signal.connect(lambda percent: self.warning_label.setText(f"Exporting... {percent}%"))
+        self.export_thread.finished_signal.connect(self.warning_label.setText)
+        self.export_thread.start()
+
     def save_as_fits(self):
-        """Save the current composite RGB image as a FITS file."""
-        file_path, _ = QFileDialog.getSaveFileName(
-            self, "Save FITS File", "", "FITS Files (*.fits);;All Files (*)"
+        """Save the aligned channels as a tile-compressed FITS file with the reference WCS."""
+        channels = self.cached_channels()
+        if channels is None:
+            return
+
+        file_path, selected_filter = QFileDialog.getSaveFileName(
+            self, "Save FITS File", "",
+            "Tile-compressed FITS, RICE (*.fits.fz);;Tile-compressed FITS, lossless GZIP (*.fits.fz);;All Files (*)"
         )
         if file_path:
-            try:
-                # Retrieve the aligned images (R, G, B) used to create the composite
-                red_data = self.aligned_images.get("Red")
-                green_data = self.aligned_images.get("Green")
-                blue_data = self.aligned_images.get("Blue")
-
-                # Create Primary HDU with metadata
-                primary_hdu = fits.PrimaryHDU()
-                primary_hdu.header['COMMENT'] = "Composite RGB image"
-                primary_hdu.header['STRETCH'] = self.stretch_input.text()
-                primary_hdu.header['Q_FACTOR'] = self.q_input.text()
-
-                # Create separate HDUs for each channel
-                red_hdu = fits.ImageHDU(red_data, name="RED_CHANNEL")
-                green_hdu = fits.ImageHDU(green_data, name="GREEN_CHANNEL")
-                blue_hdu = fits.ImageHDU(blue_data, name="BLUE_CHANNEL")
-
-                # Save the FITS file
-                hdul = fits.HDUList([primary_hdu, red_hdu, green_hdu, blue_hdu])
-                hdul.writeto(file_path, overwrite=True)
-
-                self.warning_label.setText("FITS file saved successfully!")
-            except Exception as e:
-                self.warning_label.setText(f"Error saving FITS file: {e}")
+            compression = "GZIP_2" if "GZIP" in selected_filter else "RICE_1"
+            metadata = {
+                'STRETCH': self.stretch_input.text(),
+                'Q_FACTOR': self.q_input.text(),
+                'RED_FILT': self.channel_filters.get("Red", ""),
+                'GRN_FILT': self.channel_filters.get("Green", ""),
+                'BLU_FILT': self.channel_filters.get("Blue", ""),
+            }
+            self.start_export(
+                write_compressed_fits, "FITS file saved successfully!",
+                file_path, channels, header=self.reference_header, compression=compression, metadata=metadata
+            )
 
     def save_as_image(self):
-        """Save the current composite RGB image as an image file."""
+        """Save the composite as an image; 16-bit formats are streamed from the channel cache."""
+        if self.rgb_image is None:
+            self.warning_label.setText("Generate a composite before saving.")
+            return
+
+        file_path, selected_filter = QFileDialog.getSaveFileName(
+            self, "Save Image", "",
+            "PNG 16-bit (*.png);;TIFF 16-bit (*.tif *.tiff);;PNG 8-bit (*.png);;JPEG Files (*.jpg);;All Files (*)"
+        )
+        if not file_path:
+            return
+
+        if "16-bit" in selected_filter:
+            channels = self.cached_channels()
+            values = self.stretch_values()
+            if channels is None or values is None:
+                return
+            height, width = channels[0].shape
+            strips = iter_strips_top_down(channels, *values, bits=16, rows=STRIP_ROWS)
+            if "TIFF" in selected_filter:
+                self.start_export(write_tiff16, "Image saved successfully!", file_path, strips, width, height, rows_per_strip=STRIP_ROWS)
+            else:
+                self.start_export(write_png16, "Image saved successfully!", file_path, strips, width, height)
+            return
+
+        try:
+            # The composite is stored with its origin at the bottom, flip it to match the display
+            image = Image.fromarray(np.flipud(self.rgb_image))
+            image.save(file_path)
+            self.warning_label.setText("Image saved successfully!")
+        except Exception as e:
+            self.warning_label.setText(f"Error saving image: {e}")
+
+    def save_as_deep_zoom(self):
+        """Export the composite as a Deep Zoom tile pyramid for viewing huge mosaics."""
+        channels = self.cached_channels()
+        values = self.stretch_values()
+        if channels is None or values is None:
+            return
+
+        file_path, _ = QFileDialog.getSaveFileName(self, "Export Deep Zoom Tiles", "", "Deep Zoom Image (*.dzi)")
+        if file_path:
+            if not file_path.lower().endswith(".dzi"):
+                file_path += ".dzi"
+            self.start_export(
+                write_deep_zoom, "Deep Zoom tiles exported successfully!",
+                file_path, channels, *values, report_progress=True
+            )
+
+    def save_annotated_image(self):
+        """Save the composite with WCS axes and channel labels, rendered off-screen with Matplotlib."""
+        if self.rgb_image is None:
+            self.warning_label.setText("Generate a composite before saving.")
+            return
+
         file_path, _ = QFileDialog.getSaveFileName(
-            self, "Save Image", "", "PNG Files (*.png);;JPEG Files (*.jpg);;All Files (*)"
+            self, "Save Annotated Image", "", "PNG Files (*.png);;PDF Files (*.pdf);;All Files (*)"
         )
         if file_path:
             try:
-                # Retrieve the RGB image displayed on the canvas
-                rgb_image = self.canvas.ax.images[0].get_array().data
-
-                # Convert the RGB image to PIL format and save
-                image = Image.fromarray((rgb_image * 255).astype(np.uint8))
-                image.save(file_path)
-                self.warning_label.setText("Image saved successfully!")
+                fig = Figure(figsize=(10, 10 * self.rgb_image.shape[0] / self.rgb_image.shape[1] + 1), dpi=150)
+                FigureCanvasAgg(fig)
+                ax = fig.add_subplot(111, projection=self.reference_wcs) if self.reference_wcs else fig.add_subplot(111)
+                ax.imshow(self.rgb_image, origin='lower')
+                if self.reference_wcs:
+                    ax.set_xlabel("RA")
+                    ax.set_ylabel("DEC")
+                    ax.coords.grid(color='white', alpha=0.3, linestyle='dotted')
+                mapping = ", ".join(f"{color}: {band}" for color, band in self.channel_filters.items())
+                ax.set_title(f"{mapping}  (stretch={self.stretch_input.text()}, Q={self.q_input.text()})")
+                fig.savefig(file_path, bbox_inches='tight')
+                self.warning_label.setText("Annotated image saved successfully!")
             except Exception as e:
-                self.warning_label.setText(f"Error saving image: {e}")
-
+                self.warning_label.setText(f"Error saving annotated image: {e}")
+
+    def closeEvent(self, event):
+        """Clean up the channel cache and directory watch when the tab is closed."""
+        if self.export_thread is not None:
+            self.export_thread.wait()
+        self.release_channel_cache()
+        self.watcher.files_changed.disconnect(self.on_files_changed)
+        if self.watched_directory is not None:
+            self.watcher.unwatch(self.watched_directory)
+        event.accept()
@@ -0,0 +1,204 @@
+import os
+import math
+import struct
+import zlib
+import numpy as np
+from PIL import Image
+from astropy.io import fits
+from astropy.visualization import make_lupton_rgb
+
+
+# Rows of the aligned channels processed at once by the streaming writers
+STRIP_ROWS = 256
+
+
+def render_strip(red, green, blue, stretch, q_factor, bits=8):
+    """
+    Apply the Lupton asinh stretch to a strip of aligned channel data.
+
+    The stretch is computed per pixel, so rendering strip by strip gives the same
+    result as rendering the whole image at once.
+
+    Returns:
+        ndarray: (rows, width, 3) array of uint8 or uint16 values.
+    """
+    rgb = make_lupton_rgb(
+        np.nan_to_num(red, nan=0.0), np.nan_to_num(green, nan=0.0), np.nan_to_num(blue, nan=0.0),
+        stretch=stretch, Q=q_factor, output_dtype=np.float64
+    )
+    if bits == 16:
+        return np.round(rgb * 65535).astype(np.uint16)
+    return np.round(rgb * 255).astype(np.uint8)
+
+
+def iter_strips_top_down(channels, stretch, q_factor, bits=8, rows=STRIP_ROWS):
+    """
+    Yield rendered strips of the composite in display order (top row first).
+
+    The channels follow the FITS convention (row 0 at the bottom), so strips are
+    read from the end of the arrays and flipped.
+    """
+    red, green, blue = channels
+    height = red.shape[0]
+    for y1 in range(height, 0, -rows):
+        y0 = max(0, y1 - rows)
+        strip = render_strip(red[y0:y1], green[y0:y1], blue[y0:y1], stretch, q_factor, bits)
+        yield strip[::-1]
+
+
+def write_compressed_fits(file_path, channels, header=None, compression="RICE_1", metadata=None):
+    """
+    Write the three aligned channels as tile-compressed image extensions.
+
+    Parameters:
+        channels (tuple): Red, green and blue arrays (memory-mapped arrays are read tile by tile).
+        header (Header): WCS cards copied into every channel extension.
+        compression (str): "RICE_1" (quantized) or "GZIP_2" (lossless).
+        metadata (dict): Extra cards written to the primary header.
+    """
+    primary_hdu = fits.PrimaryHDU()
+    primary_hdu.header['COMMENT'] = "Composite RGB image"
+    for key, value in (metadata or {}).items():
+        primary_hdu.header[key] = value
+    primary_hdu.writeto(file_path, overwrite=True)
+
+    # Lossless GZIP needs quantization turned off for floating point data
+    quantize_level = 0.0 if compression.startswith("GZIP") else 16.0
+
+    # Append one channel at a time so only one compressed HDU is held in memory
+    for name, data in zip(["RED_CHANNEL", "GREEN_CHANNEL", "BLUE_CHANNEL"], channels):
+        channel_header = fits.Header(header) if header is not None else fits.Header()
+        hdu = fits.CompImageHDU(
+            data=np.asarray(data, dtype=np.float32), header=channel_header, name=name,
+            compression_type=compression, quantize_level=quantize_level
+        )
+        with fits.open(file_path, mode="append") as hdul:
+            hdul.append(hdu)
+
+
+def _png_chunk(chunk_type, data):
+    """Build a PNG chunk with its length and CRC."""
+    crc = zlib.crc32(chunk_type + data) & 0xFFFFFFFF
+    return struct.pack(">I", len(data)) + chunk_type + data + struct.pack(">I", crc)
+
+
+def write_png16(file_path, strips, width, height):
+    """
+    Stream 16-bit RGB strips into a PNG file.
+
+    Each strip is compressed and written as its own IDAT chunk, so only one strip
+    is held in memory at a time.
+    """
+    compressor = zlib.compressobj(6)
+    with open(file_path, "wb") as f:
+        f.write(b"\x89PNG\r\n\x1a\n")
+        f.write(_png_chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 16, 2, 0, 0, 0)))
+        for strip in strips:
+            rows = np.ascontiguousarray(strip, dtype=">u2").view(np.uint8).reshape(strip.shape[0], width * 6)
+            # Prefix every row with filter type 0 (None)
+            filtered = np.zeros((rows.shape[0], width * 6 + 1), dtype=np.uint8)
+            filtered[:, 1:] = rows
+            data = compressor.compress(filtered.tobytes())
+            if data:
+                f.write(_png_chunk(b"IDAT", data))
+        f.write(_png_chunk(b"IDAT", compressor.flush()))
+        f.write(_png_chunk(b"IEND", b""))
+
+
+def write_tiff16(file_path, strips, width, height, rows_per_strip=STRIP_ROWS):
+    """
+    Stream 16-bit RGB strips into an uncompressed baseline TIFF file.
+
+    Strips are written as they arrive and the image directory is appended at the end.
+    """
+    strip_offsets, strip_byte_counts = [], []
+    with open(file_path, "wb") as f:
+        f.write(b"II*\x00" + struct.pack("<I", 0))  # IFD offset is patched once all strips are written
+        for strip in strips:
+            # Every strip holds rows_per_strip rows except the last one
+            data = strip.astype("<u2").tobytes()
+            strip_offsets.append(f.tell())
+            strip_byte_counts.append(len(data))
+            f.write(data)
+
+        # Out-of-line tag values
+        bits_offset = f.tell()
+        f.write(struct.pack("<HHH", 16, 16, 16))
+        offsets_offset = f.tell()
+        f.write(struct.pack(f"<{len(strip_offsets)}I", *strip_offsets))
+        counts_offset = f.tell()
+        f.write(struct.pack(f"<{len(strip_byte_counts)}I", *strip_byte_counts))
+        if f.tell() % 2:
+            f.write(b"\x00")
+
+        entries = [
+            (256, 4, 1, width),                     # ImageWidth
+            (257, 4, 1, height),                    # ImageLength
+            (258, 3, 3, bits_offset),               # BitsPerSample
+            (259, 3, 1, 1),                         # Compression: none
+            (262, 3, 1, 2),                         # Photometric: RGB
+            (273, 4, len(strip_offsets), offsets_offset if len(strip_offsets) > 1 else strip_offsets[0]),
+            (277, 3, 1, 3),                         # SamplesPerPixel
+            (278, 4, 1, rows_per_strip),            # RowsPerStrip
+            (279, 4, len(strip_byte_counts), counts_offset if len(strip_byte_counts) > 1 else strip_byte_counts[0]),
+            (284, 3, 1, 1),                         # PlanarConfiguration: contiguous
+        ]
+        ifd_offset = f.tell()
+        f.write(struct.pack("<H", len(entries)))
+        for tag, field_type, count, value in entries:
+            if field_type == 3 and count == 1:
+                f.write(struct.pack("<HHIHH", tag, field_type, count, value, 0))
+            else:
+                f.write(struct.pack("<HHII", tag, field_type, count, value))
+        f.write(struct.pack("<I", 0))
+
+        f.seek(4)
+        f.write(struct.pack("<I", ifd_offset))
+
+
+def write_deep_zoom(dzi_path, channels, stretch, q_factor, tile_size=254, overlap=1, tile_format="jpg", progress_callback=None):
+    """
+    Write a Deep Zoom (DZI) tile pyramid of the composite.
+
+    Every level is rendered one row of tiles at a time, sampling the aligned
+    channels with the level's stride, so memory stays bounded by a single tile row.
+    """
+    red, green, blue = channels
+    height, width = red.shape
+    max_level = int(math.ceil(math.log2(max(width, height))))
+
+    base, _ = os.path.splitext(dzi_path)
+    tiles_dir = f"{base}_files"
+    with open(dzi_path, "w", encoding="utf-8") as f:
+        f.write(
+            '<?xml version="1.0" encoding="UTF-8"?>\n'
+            f'<Image xmlns="http://schemas.microsoft.com/deepzoom/2008" Format="{tile_format}" '
+            f'Overlap="{overlap}" TileSize="{tile_size}">\n'
+            f'  <Size Width="{width}" Height="{height}"/>\n'
+            '</Image>\n'
+        )
+
+    for level in range(max_level, -1, -1):
+        step = 2 ** (max_level - level)
+        level_width = int(math.ceil(width / step))
+        level_height = int(math.ceil(height / step))
+        level_dir = os.path.join(tiles_dir, str(level))
+        os.makedirs(level_dir, exist_ok=True)
+
+        for row in range(int(math.ceil(level_height / tile_size))):
+            # Display rows covered by this tile row, including overlap
+            top = max(0, row * tile_size - overlap)
+            bottom = min(level_height, (row + 1) * tile_size + overlap)
+
+            # Display row r maps to FITS row (level_height - 1 - r) at this level
+            fits_rows = (level_height - 1 - np.arange(top, bottom)) * step
+            fits_rows = np.clip(fits_rows, 0, height - 1)
+            strip = render_strip(red[fits_rows, ::step], green[fits_rows, ::step], blue[fits_rows, ::step], stretch, q_factor)
+
+            for col in range(int(math.ceil(level_width / tile_size))):
+                left = max(0, col * tile_size - overlap)
+                right = min(level_width, (col + 1) * tile_size + overlap)
+                Image.fromarray(strip[:, left:right]).save(os.path.join(level_dir, f"{col}_{row}.{tile_format}"))
+
+        if progress_callback:
+            progress_callback(int((max_level - level + 1) / (max_level + 1) * 100))
@@ -0,0 +1,238 @@
+from PyQt5.QtCore import QObject, QFileSystemWatcher, QTimer, pyqtSignal
+import os
+import time
+
+
+# Interval of the polling fallback and of re-checks of files still being written (milliseconds)
+POLL_INTERVAL_MS = 2000
+
+# Delay that coalesces bursts of change notifications into one rescan (milliseconds)
+SETTLE_MS = 300
+
+# Files modified within this many seconds are re-checked on every poll until they stop changing
+ACTIVE_SECONDS = 10
+
+
+def scan_entries(directory):
+    """
+    List a directory once.
+
+    Returns:
+        tuple: ({file name: (mtime, size)}, [subdirectory paths])
+    """
+    files, subdirectories = {}, []
+    try:
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                try:
+                    if entry.is_dir():
+                        subdirectories.append(entry.path)
+                    elif entry.is_file():
+                        stat = entry.stat()
+                        files[entry.name] = (stat.st_mtime, stat.st_size)
+                except OSError:
+                    continue  # Entry vanished while scanning
+    except OSError:
+        pass
+    return files, subdirectories
+
+
+class DirectoryWatcher(QObject):
+    """
+    Shared, in-memory listing of watched directories that is kept up to date incrementally.
+
+    Change notifications come from QFileSystemWatcher where available. For
+    directories it cannot watch (e.g. on network filesystems or when inotify
+    watches run out), a polling timer compares directory mtimes instead, and only
+    directories that actually changed are rescanned. Files that are still being
+    written are re-checked until their size and mtime settle, so half-downloaded
+    files are reported again once complete. The timer only runs while there is
+    something to poll.
+    """
+    files_changed = pyqtSignal(str, list, list)  # Directory, added or modified paths, removed paths
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.listings = {}  # Directory -> {file name: (mtime, size)}
+        self.directory_mtimes = {}  # Directory -> mtime at the last scan
+        self.subdirectories = {}  # Directory -> subdirectory paths at the last scan
+        self.watch_counts = {}  # Directory -> number of watch() calls
+        self.recursive_roots = set()
+        self.active_files = {}  # Path -> (mtime, size) of recently modified files
+        self.polled = set()  # Directories QFileSystemWatcher could not watch
+        self.dirty = set()
+
+        self.watcher = QFileSystemWatcher(self)
+        self.watcher.directoryChanged.connect(self.mark_dirty)
+
+        self.settle_timer = QTimer(self)
+        self.settle_timer.setSingleShot(True)
+        self.settle_timer.setInterval(SETTLE_MS)
+        self.settle_timer.timeout.connect(self.rescan_dirty)
+
+        self.poll_timer = QTimer(self)
+        self.poll_timer.setInterval(POLL_INTERVAL_MS)
+        self.poll_timer.timeout.connect(self.poll)
+
+    def watch(self, directory, recursive=False):
+        """Start watching a directory (and, if recursive, everything below it)."""
+        directory = os.path.abspath(directory)
+        if recursive:
+            self.recursive_roots.add(directory)
+        self.watch_counts[directory] = self.watch_counts.get(directory, 0) + 1
+        self.add_directory(directory)
+
+    def unwatch(self, directory):
+        """Stop watching a directory once every watch() call has been matched."""
+        directory = os.path.abspath(directory)
+        count = self.watch_counts.get(directory, 0) - 1
+        if count > 0:
+            self.watch_counts[directory] = count
+            return
+        self.watch_counts.pop(directory, None)
+        if directory in self.recursive_roots:
+            self.recursive_roots.discard(directory)
+            for path in list(self.listings):
+                if path.startswith(os.path.join(directory, "")) and not self.is_watched(path):
+                    self.drop_directory(path)
+        if not self.is_watched(directory):
+            self.drop_directory(directory)
+
+    def is_watched(self, directory):
+        """Return True if a directory is watched directly or below a recursive root."""
+        if directory in self.watch_counts:
+            return True
+        return any(directory.startswith(os.path.join(root, "")) for root in self.recursive_roots)
+
+    def add_directory(self, directory):
+        """Scan a directory into the listing cache and subscribe to its changes."""
+        if directory in self.listings or not os.path.isdir(directory):
+            return
+        self.scan(directory)
+        if not self.watcher.addPath(directory):  # Watch limit or unsupported filesystem
+            self.polled.add(directory)
+            self.start_polling()
+        if self.is_recursive(directory):
+            for subdirectory in self.subdirectories[directory]:
+                self.add_directory(subdirectory)
+
+    def drop_directory(self, directory):
+        """Forget a directory's listing."""
+        if directory in self.polled:
+            self.polled.discard(directory)
+        else:
+            self.watcher.removePath(directory)
+        for path in [path for path in self.active_files if os.path.dirname(path) == directory]:
+            del self.active_files[path]
+        self.listings.pop(directory, None)
+        self.directory_mtimes.pop(directory, None)
+        self.subdirectories.pop(directory, None)
+
+    def is_recursive(self, directory):
+        """Return True if a directory lies under a recursive root."""
+        return any(directory == root or directory.startswith(os.path.join(root, "")) for root in self.recursive_roots)
+
+    def scan(self, directory):
+        """Rescan one directory and return (added or modified paths, removed paths)."""
+        try:
+            mtime = os.stat(directory).st_mtime
+        except OSError:
+            mtime = None
+        files, subdirectories = scan_entries(directory)
+        previous = self.listings.get(directory, {})
+        self.listings[directory] = files
+        self.directory_mtimes[directory] = mtime
+        self.subdirectories[directory] = subdirectories
+
+        now = time.time()
+        added = []
+        for name, stat in files.items():
+            path = os.path.join(directory, name)
+            if previous.get(name) != stat:
+                added.append(path)
+            if now - stat[0] < ACTIVE_SECONDS:
+                self.active_files[path] = stat
+                self.start_polling()
+        removed = [os.path.join(directory, name) for name in previous if name not in files]
+        return added, removed
+
+    def files(self, directory):
+        """Return the sorted file names of a directory from the listing cache (scanning it once if needed)."""
+        directory = os.path.abspath(directory)
+        if directory not in self.listings:
+            files, _ = scan_entries(directory)
+            return sorted(files)
+        return sorted(self.listings[directory])
+
+    def mark_dirty(self, directory):
+        """Queue a directory for rescanning after the settle delay."""
+        self.dirty.add(os.path.abspath(directory))
+        self.settle_timer.start()
+
+    def rescan_dirty(self):
+        """Rescan queued directories and notify listeners of their changes."""
+        dirty, self.dirty = self.dirty, set()
+        for directory in sorted(dirty):
+            if directory not in self.listings:
+                continue
+            if not os.path.isdir(directory):
+                removed = [os.path.join(directory, name) for name in self.listings[directory]]
+                self.drop_directory(directory)
+                if removed:
+                    self.files_changed.emit(directory, [], removed)
+                continue
+
+            known_subdirectories = set(self.subdirectories.get(directory, []))
+            added, removed = self.scan(directory)
+            if self.is_recursive(directory):
+                for subdirectory in self.subdirectories[directory]:
+                    if subdirectory not in known_subdirectories:
+                        self.add_directory(subdirectory)
+                        new_files = [os.path.join(subdirectory, name) for name in self.listings.get(subdirectory, {})]
+                        if new_files:
+                            self.files_changed.emit(subdirectory, new_files, [])
+            if added or removed:
+                self.files_changed.emit(directory, added, removed)
+
+    def start_polling(self):
+        if not self.poll_timer.isActive():
+            self.poll_timer.start()
+
+    def poll(self):
+        """Rescan unwatchable directories whose mtime changed and re-check files still being written."""
+        for directory in list(self.polled):
+            mtime = self.directory_mtimes.get(directory)
+            try:
+                current = os.stat(directory).st_mtime
+            except OSError:
+                current = None
+            if current != mtime:
+                self.dirty.add(directory)
+
+        for path, stat in list(self.active_files.items()):
+            try:
+                current = os.stat(path)
+                current = (current.st_mtime, current.st_size)
+            except OSError:
+                del self.active_files[path]
+                continue
+            if current != stat:
+                self.dirty.add(os.path.dirname(path))
+            elif time.time() - current[0] >= ACTIVE_SECONDS:
+                del self.active_files[path]
+
+        if self.dirty:
+            self.rescan_dirty()
+        if not self.polled and not self.active_files:
+            self.poll_timer.stop()
+
+
+_shared_watcher = None
+
+
+def shared_watcher():
+    """Return the application-wide DirectoryWatcher, creating it on first use."""
+    global _shared_watcher
+    if _shared_watcher is None:
+        _shared_watcher = DirectoryWatcher()
+    return _shared_watcher
@@ -0,0 +1,651 @@
+from PyQt5.QtWidgets import (
+    QWidget, QVBoxLayout, QHBoxLayout, QLabel, QPushButton, QSpinBox, QDoubleSpinBox, QTableWidget,
+    QTableWidgetItem, QHeaderView, QComboBox
+)
+from PyQt5.QtCore import QObject, QTimer, pyqtSignal
+import os
+import bz2
+import time
+import shutil
+import sqlite3
+import threading
+import requests
+
+from utilities import get_data_dir, get_fits_urls, spectrum_url, spectrum_path
+from fits_utils import compress_fits
+from spectrum_io import fetch_table_hdu, is_partial_file, SPECTRUM_HDUS
+
+
+# Priority classes; lower values are served first
+INTERACTIVE = 0
+BULK = 1
+
+# Default number of simultaneous downloads
+MAX_CONCURRENCY = 4
+
+# Failed downloads are retried with exponential backoff up to this many attempts
+MAX_ATTEMPTS = 4
+
+CHUNK_SIZE = 64 * 1024
+
+# How downloaded frames are stored: (label, tile compression or None for plain FITS)
+STORAGE_MODES = [
+    ("Plain FITS", None),
+    ("Tile-compressed, RICE", "RICE_1"),
+    ("Tile-compressed, lossless GZIP", "GZIP_2"),
+]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    url TEXT,
+    destination TEXT UNIQUE,
+    priority INTEGER,
+    decompress TEXT,
+    state TEXT,
+    attempts INTEGER DEFAULT 0,
+    not_before REAL DEFAULT 0,
+    bytes INTEGER DEFAULT 0,
+    total INTEGER,
+    error TEXT,
+    created REAL,
+    finished REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_queue ON jobs (state, priority, id);
+CREATE TABLE IF NOT EXISTS settings (
+    key TEXT PRIMARY KEY,
+    value REAL
+);
+"""
+
+# States in which a job will not change any more
+FINISHED_STATES = ("done", "local", "failed")
+
+
+class TokenBucket:
+    """Thread-safe token bucket shared by all downloads to cap the total bandwidth."""
+
+    def __init__(self, rate=0):
+        self.lock = threading.Lock()
+        self.set_rate(rate)
+
+    def set_rate(self, rate):
+        """Set the cap in bytes per second (0 for unlimited)."""
+        with self.lock:
+            self.rate = rate
+            self.tokens = rate
+            self.updated = time.monotonic()
+
+    def consume(self, amount):
+        """Block until `amount` bytes may be transferred."""
+        while True:
+            with self.lock:
+                if self.rate <= 0:
+                    return
+                now = time.monotonic()
+                self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= amount or self.tokens >= self.rate:
+                    self.tokens -= amount
+                    return
+                wait = (amount - self.tokens) / self.rate
+            time.sleep(min(wait, 0.5))
+
+
+def frame_jobs(run_camcol_field, bands, compression=None):
+    """
+    Return (url, destination, processing) jobs for the frames of a Run-Camcol-Field.
+
+    Frames are stored as plain `.fits`, or as tile-compressed `.fits.fz` when a
+    compression type is given. A frame already on disk in either form is reused.
+    """
+    directory = get_data_dir(run_camcol_field)
+    jobs = []
+    for url in get_fits_urls(run_camcol_field, bands):
+        plain = os.path.join(directory, url.split("/")[-1].replace(".bz2", ""))
+        if os.path.exists(plain + ".fz") or (compression and not os.path.exists(plain)):
+            jobs.append((url, plain + ".fz", f"bz2+{compression or 'RICE_1'}"))
+        else:
+            jobs.append((url, plain, "bz2"))
+    return jobs
+
+
+def spectrum_jobs(spectra, hdus=SPECTRUM_HDUS):
+    """
+    Return (url, destination, processing) jobs for spec-lite files, stored under data/spectra/<plate>/.
+
+    Parameters:
+        spectra (list): Dictionaries with plate, mjd, fiberID and (optionally) run2d, as returned
+            by the SpecObj queries; a fiber listed twice is downloaded once.
+        hdus (tuple): Fetch only these table HDUs with Range requests (by default COADD and
+            SPALL, which holds the redshift), or None for whole files.
+    """
+    processing = None if hdus is None else "hdu:" + ",".join(str(hdu) for hdu in hdus)
+    jobs, seen = [], set()
+    for row in spectra:
+        key = (int(row['plate']), int(row['mjd']), int(row['fiberID']))
+        if key not in seen:
+            seen.add(key)
+            jobs.append((spectrum_url(*key, row.get('run2d')), spectrum_path(*key), processing))
+    return jobs
+
+
+def merge_processing(queued, requested):
+    """
+    Processing of a job queued with `queued` and requested again with `requested`: a whole-file
+    request supersedes an HDU selection, and two HDU selections are merged.
+    """
+    if not (queued or "").startswith("hdu:"):
+        return queued
+    if not (requested or "").startswith("hdu:"):
+        return requested
+    hdus = queued[4:].split(",")
+    return "hdu:" + ",".join(hdus + [hdu for hdu in requested[4:].split(",") if hdu not in hdus])
+
+
+def is_downloaded(destination, decompress):
+    """Return True if a job's destination is on disk, unless the whole file is wanted and only some HDUs were fetched."""
+    if not os.path.exists(destination):
+        return False
+    return decompress is not None or not is_partial_file(destination)
+
+
+class DownloadManager(QObject):
+    """
+    Persistent download queue served by a pool of worker threads.
+
+    Jobs live in an SQLite database under the data directory, so queued and
+    interrupted downloads resume after a restart (partial files continue with
+    HTTP Range requests). Interactive jobs are always served before bulk ones,
+    and all workers share one concurrency limit and one bandwidth cap.
+    """
+    job_changed = pyqtSignal(int)  # Job id; emitted from worker threads, delivered in the GUI thread
+
+    def __init__(self, db_path=None):
+        super().__init__()
+        self.db_path = db_path or os.path.join(get_data_dir(), "downloads.sqlite")
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.executescript(SCHEMA)
+        with self.connection:
+            # Downloads cut short by the last shutdown start again (resuming their partial files)
+            self.connection.execute("UPDATE jobs SET state = 'queued' WHERE state = 'active'")
+
+        self.condition = threading.Condition()
+        self.workers = []
+        self.live = {}  # Job id -> (bytes done, total, start time, bytes at start) of active jobs
+        self.last_emit = {}
+        self.bucket = TokenBucket(self.get_setting("bandwidth", 0))
+        self.concurrency = int(self.get_setting("concurrency", MAX_CONCURRENCY))
+        self.storage = int(self.get_setting("storage", 0))
+        self.start_workers()
+
+    # Settings
+
+    def get_setting(self, key, default):
+        with self.lock:
+            row = self.connection.execute("SELECT value FROM settings WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+
+    def set_setting(self, key, value):
+        with self.lock, self.connection:
+            self.connection.execute("INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)", (key, value))
+
+    def set_concurrency(self, concurrency):
+        """Change the number of simultaneous downloads."""
+        self.concurrency = max(1, int(concurrency))
+        self.set_setting("concurrency", self.concurrency)
+        self.start_workers()
+        with self.condition:
+            self.condition.notify_all()
+
+    def set_bandwidth(self, bytes_per_second):
+        """Cap the total download rate (0 for unlimited)."""
+        self.bucket.set_rate(bytes_per_second)
+        self.set_setting("bandwidth", bytes_per_second)
+
+    def set_storage(self, mode):
+        """Choose how newly downloaded frames are stored (an index into STORAGE_MODES)."""
+        self.storage = mode
+        self.set_setting("storage", mode)
+
+    @property
+    def compression(self):
+        """Tile compression applied to newly downloaded frames, or None for plain FITS."""
+        return STORAGE_MODES[self.storage][1]
+
+    # Queue
+
+    def enqueue(self, url, destination, priority=BULK, decompress=None):
+        """
+        Add a download to the queue.
+
+        `decompress` names the processing applied once the download completes:
+        "bz2" to decompress, optionally followed by "+RICE_1" or "+GZIP_2" to
+        tile-compress the result. "hdu:<n>[,<m>...]" instead downloads only those
+        table HDUs of a FITS file, with Range requests.
+
+        Files that already exist locally are recorded as "local" without a
+        download, and a destination that is already queued is not queued twice
+        (its priority is raised if the new request is more urgent, and a whole
+        file request replaces a queued HDU selection).
+
+        Returns:
+            int: Job id.
+        """
+        return self.enqueue_many([(url, destination, decompress)], priority)[0]
+
+    def enqueue_many(self, jobs, priority=BULK):
+        """
+        Add (url, destination, decompress) downloads to the queue in one transaction, as `enqueue` does.
+
+        Returns:
+            list: Job ids, in the order of `jobs`.
+        """
+        job_ids = []
+        with self.lock, self.connection:
+            for url, destination, decompress in jobs:
+                job_ids.append(self.insert_job(url, os.path.abspath(destination), priority, decompress))
+
+        with self.condition:
+            self.condition.notify_all()
+        for job_id in job_ids:
+            self.job_changed.emit(job_id)
+        return job_ids
+
+    def insert_job(self, url, destination, priority, decompress):
+        """Record one download (called with the lock held, inside a transaction) and return its job id."""
+        row = self.connection.execute(
+            "SELECT id, state, priority, decompress FROM jobs WHERE destination = ?", (destination,)
+        ).fetchone()
+        if is_downloaded(destination, decompress):
+            state = "local"
+        elif row and row[1] in ("queued", "active"):
+            # An active job keeps running as claimed; finish() requeues it if its processing was widened
+            processing = merge_processing(row[3], decompress)
+            if priority < row[2] or processing != row[3]:
+                self.connection.execute(
+                    "UPDATE jobs SET priority = ?, url = ?, decompress = ? WHERE id = ?",
+                    (min(priority, row[2]), url, processing, row[0])
+                )
+            return row[0]
+        else:
+            state = "queued"
+
+        now = time.time()
+        finished = now if state == "local" else None
+        if row:
+            self.connection.execute(
+                """
+                UPDATE jobs SET url = ?, priority = ?, decompress = ?, state = ?, attempts = 0,
+                not_before = 0, error = NULL, created = ?, finished = ? WHERE id = ?
+                """,
+                (url, priority, decompress, state, now, finished, row[0])
+            )
+            return row[0]
+        return self.connection.execute(
+            """
+            INSERT INTO jobs (url, destination, priority, decompress, state, created, finished)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            """,
+            (url, destination, priority, decompress, state, now, finished)
+        ).lastrowid
+
+    def states(self, job_ids):
+        """Return {job id: state} for the given jobs."""
+        with self.lock:
+            rows = self.connection.execute(
+                f"SELECT id, state FROM jobs WHERE id IN ({', '.join('?' * len(job_ids))})", list(job_ids)
+            ).fetchall()
+        return dict(rows)
+
+    def wait(self, job_ids, progress_callback=None, poll=0.5):
+        """
+        Block until every given job has finished (for use from worker threads).
+
+        Returns:
+            dict: {job id: final state}
+        """
+        while True:
+            states = self.states(job_ids)
+            # Jobs cleared from the history count as finished
+            finished = sum(state in FINISHED_STATES for state in states.values()) + len(job_ids) - len(states)
+            if progress_callback:
+                progress_callback(finished, len(job_ids))
+            if finished == len(job_ids):
+                return states
+            time.sleep(poll)
+
+    def state_counts(self):
+        """Return {state: number of jobs} over the whole queue."""
+        with self.lock:
+            return dict(self.connection.execute("SELECT state, COUNT(*) FROM jobs GROUP BY state").fetchall())
+
+    def jobs(self, limit=200):
+        """Snapshot of the most relevant jobs (active and queued first) for display."""
+        with self.lock:
+            rows = self.connection.execute(
+                """
+                SELECT id, destination, priority, state, attempts, bytes, total, error FROM jobs
+                ORDER BY CASE state WHEN 'active' THEN 0 WHEN 'queued' THEN 1 ELSE 2 END,
+                         CASE WHEN state IN ('active', 'queued') THEN priority ELSE 0 END,
+                         CASE WHEN state IN ('active', 'queued') THEN id ELSE -finished END
+                LIMIT ?
+                """,
+                (limit,)
+            ).fetchall()
+
+        jobs, now = [], time.monotonic()
+        for job_id, destination, priority, state, attempts, done, total, error in rows:
+            rate = 0.0
+            live = self.live.get(job_id)
+            if live:
+                done, total, started, start_bytes = live
+                rate = (done - start_bytes) / max(now - started, 1e-3)
+            jobs.append({
+                "id": job_id, "name": os.path.basename(destination), "priority": priority, "state": state,
+                "attempts": attempts, "bytes": done or 0, "total": total, "rate": rate, "error": error,
+            })
+        return jobs
+
+    def retry_failed(self):
+        """Queue every failed job again."""
+        with self.lock, self.connection:
+            self.connection.execute("UPDATE jobs SET state = 'queued', attempts = 0, not_before = 0 WHERE state = 'failed'")
+        with self.condition:
+            self.condition.notify_all()
+
+    def clear_finished(self):
+        """Remove finished jobs from the queue history."""
+        with self.lock, self.connection:
+            self.connection.execute(
+                f"DELETE FROM jobs WHERE state IN ({', '.join('?' * len(FINISHED_STATES))})", FINISHED_STATES
+            )
+
+    # Workers
+
+    def start_workers(self):
+        """Start worker threads up to the concurrency limit."""
+        self.workers = [worker for worker in self.workers if worker.is_alive()]
+        for index in range(len(self.workers), self.concurrency):
+            worker = threading.Thread(target=self.work, args=(index,), daemon=True)
+            worker.start()
+            self.workers.append(worker)
+
+    def claim_next(self):
+        """Mark the most urgent runnable job as active and return its row, or None."""
+        with self.lock, self.connection:
+            row = self.connection.execute(
+                """
+                SELECT id, url, destination, decompress, attempts FROM jobs
+                WHERE state = 'queued' AND not_before <= ? ORDER BY priority, id LIMIT 1
+                """,
+                (time.time(),)
+            ).fetchone()
+            if row:
+                self.connection.execute("UPDATE jobs SET state = 'active' WHERE id = ?", (row[0],))
+        return row
+
+    def work(self, index):
+        """Worker loop: serve jobs while this worker is within the concurrency limit."""
+        while True:
+            job = self.claim_next() if index < self.concurrency else None
+            if job is None:
+                with self.condition:
+                    self.condition.wait(timeout=1.0)
+                continue
+            self.run_job(*job)
+
+    def finish(self, job_id, state, error=None, attempts=None, not_before=0):
+        """Record the outcome of a job."""
+        done, total = self.live.pop(job_id, (0, None, 0, 0))[:2]
+        with self.lock, self.connection:
+            if state in ("done", "local"):
+                destination, decompress = self.connection.execute(
+                    "SELECT destination, decompress FROM jobs WHERE id = ?", (job_id,)
+                ).fetchone()
+                if not is_downloaded(destination, decompress):
+                    state = "queued"  # A whole file was requested while only some HDUs were being fetched
+            self.connection.execute(
+                """
+                UPDATE jobs SET state = ?, error = ?, attempts = COALESCE(?, attempts), not_before = ?,
+                bytes = ?, total = ?, finished = ? WHERE id = ?
+                """,
+                (state, error, attempts, not_before, done, total, time.time() if state in FINISHED_STATES else None, job_id)
+            )
+        self.job_changed.emit(job_id)
+
+    def report(self, job_id, done, total):
+        """Update the live progress of a job, notifying listeners a few times per second."""
+        started, start_bytes = self.live[job_id][2:] if job_id in self.live else (time.monotonic(), done)
+        self.live[job_id] = (done, total, started, start_bytes)
+        now = time.monotonic()
+        if now - self.last_emit.get(job_id, 0) > 0.25:
+            self.last_emit[job_id] = now
+            self.job_changed.emit(job_id)
+
+    def run_job(self, job_id, url, destination, decompress, attempts):
+        """Download one job, resuming a partial file, then decompress and optionally tile-compress it."""
+        if is_downloaded(destination, decompress):
+            self.finish(job_id, "local")
+            return
+
+        if decompress and decompress.startswith("hdu:"):
+            hdus = tuple(int(hdu) for hdu in decompress[4:].split(","))
+            self.run_table_job(job_id, url, destination, hdus, attempts)
+            return
+
+        part_path = destination + ".part"
+        try:
+            offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+            headers = {"Range": f"bytes={offset}-"} if offset else {}
+            with requests.get(url, stream=True, headers=headers, timeout=60) as response:
+                if response.status_code == 416:  # Partial file already complete
+                    total = offset
+                else:
+                    response.raise_for_status()
+                    if offset and response.status_code != 206:
+                        offset = 0  # Server ignored the range; start over
+                    length = response.headers.get("Content-Length")
+                    total = offset + int(length) if length else None
+                    self.report(job_id, offset, total)
+
+                    with open(part_path, "ab" if offset else "wb") as part_file:
+                        done = offset
+                        for chunk in response.iter_content(CHUNK_SIZE):
+                            self.bucket.consume(len(chunk))
+                            part_file.write(chunk)
+                            done += len(chunk)
+                            self.report(job_id, done, total)
+        except Exception as e:
+            self.retry_later(job_id, url, attempts, e)
+            return
+
+        # Decompress (streaming from the partial file), tile-compress if requested and move the result into place atomically
+        steps = (decompress or "").split("+")
+        temporary_path = destination + ".tmp"
+        compressed_path = destination + ".compressing"
+        try:
+            if steps[0] == "bz2":
+                with bz2.BZ2File(part_path, "rb") as compressed_stream, open(temporary_path, "wb") as output:
+                    shutil.copyfileobj(compressed_stream, output, CHUNK_SIZE * 16)
+                os.remove(part_path)
+            else:
+                os.replace(part_path, temporary_path)
+            if len(steps) > 1:
+                compress_fits(temporary_path, compressed_path, steps[1])
+                os.replace(compressed_path, temporary_path)
+            os.replace(temporary_path, destination)
+        except Exception as e:
+            for path in (part_path, temporary_path, compressed_path):
+                if os.path.exists(path):
+                    os.remove(path)  # Corrupt archive; download it again from scratch
+            self.retry_later(job_id, url, attempts, e)
+            return
+        self.finish(job_id, "done")
+
+    def run_table_job(self, job_id, url, destination, hdus, attempts):
+        """Download table HDUs of a remote FITS file (headers are located with small Range requests)."""
+        done = 0
+
+        def received(size):
+            nonlocal done
+            self.bucket.consume(size)
+            done += size
+            self.report(job_id, done, None)
+
+        try:
+            fetch_table_hdu(url, destination, hdus, on_chunk=received)
+        except Exception as e:
+            self.retry_later(job_id, url, attempts, e)
+            return
+        self.finish(job_id, "done")
+
+    def retry_later(self, job_id, url, attempts, error):
+        """Requeue a failed job with exponential backoff, or mark it failed after MAX_ATTEMPTS."""
+        print(f"Error downloading {url}: {error}")
+        attempts += 1
+        if attempts < MAX_ATTEMPTS:
+            self.finish(job_id, "queued", str(error), attempts, time.time() + 2 ** attempts)
+        else:
+            self.finish(job_id, "failed", str(error), attempts)
+
+
+_shared_manager = None
+
+
+def shared_manager():
+    """Return the application-wide DownloadManager, creating it on first use."""
+    global _shared_manager
+    if _shared_manager is None:
+        _shared_manager = DownloadManager()
+    return _shared_manager
+
+
+def format_bytes(count):
+    """Human-readable byte count."""
+    for unit in ("B", "KB", "MB", "GB"):
+        if count < 1024 or unit == "GB":
+            return f"{count:.0f} {unit}" if unit == "B" else f"{count:.1f} {unit}"
+        count /= 1024
+
+
+class DownloadQueueView(QWidget):
+    """Table of queued, active and recent downloads with throughput and queue controls."""
+
+    def __init__(self, manager, parent=None):
+        super().__init__(parent)
+        self.manager = manager
+        self.dirty = True
+
+        layout = QVBoxLayout(self)
+        layout.setContentsMargins(0, 0, 0, 0)
+
+        controls = QHBoxLayout()
+        self.summary_label = QLabel("")
+        self.summary_label.setStyleSheet("color: white; font-size: 14px;")
+        controls.addWidget(self.summary_label, stretch=1)
+
+        concurrency_label = QLabel("Parallel:")
+        concurrency_label.setStyleSheet("color: white; font-size: 14px;")
+        controls.addWidget(concurrency_label)
+        self.concurrency_spin = QSpinBox()
+        self.concurrency_spin.setRange(1, 16)
+        self.concurrency_spin.setValue(manager.concurrency)
+        self.concurrency_spin.setStyleSheet("color: white; background-color: #3A3A3A; font-size: 14px; padding: 3px;")
+        self.concurrency_spin.valueChanged.connect(manager.set_concurrency)
+        controls.addWidget(self.concurrency_spin)
+
+        bandwidth_label = QLabel("Cap (MB/s, 0 = none):")
+        bandwidth_label.setStyleSheet("color: white; font-size: 14px;")
+        controls.addWidget(bandwidth_label)
+        self.bandwidth_spin = QDoubleSpinBox()
+        self.bandwidth_spin.setRange(0, 1000)
+        self.bandwidth_spin.setDecimals(1)
+        self.bandwidth_spin.setValue(manager.bucket.rate / 1024 ** 2)
+        self.bandwidth_spin.setStyleSheet("color: white; background-color: #3A3A3A; font-size: 14px; padding: 3px;")
+        self.bandwidth_spin.valueChanged.connect(lambda value: manager.set_bandwidth(value * 1024 ** 2))
+        controls.addWidget(self.bandwidth_spin)
+
+        storage_label = QLabel("Store frames as:")
+        storage_label.setStyleSheet("color: white; font-size: 14px;")
+        controls.addWidget(storage_label)
+        self.storage_combo = QComboBox()
+        self.storage_combo.addItems([label for label, _ in STORAGE_MODES])
+        self.storage_combo.setCurrentIndex(manager.storage)
+        self.storage_combo.setStyleSheet("color: white; background-color: #3A3A3A; font-size: 14px; padding: 3px;")
+        self.storage_combo.currentIndexChanged.connect(manager.set_storage)
+        controls.addWidget(self.storage_combo)
+
+        retry_button = QPushButton("Retry Failed")
+        retry_button.setStyleSheet("background-color: #5A9; color: white; font-weight: bold; padding: 5px;")
+        retry_button.clicked.connect(manager.retry_failed)
+        controls.addWidget(retry_button)
+
+        clear_button = QPushButton("Clear Finished")
+        clear_button.setStyleSheet("background-color: #5A9; color: white; font-weight: bold; padding: 5px;")
+        clear_button.clicked.connect(self.clear_finished)
+        controls.addWidget(clear_button)
+        layout.addLayout(controls)
+
+        self.table = QTableWidget(0, 5)
+        self.table.setHorizontalHeaderLabels(["File", "Priority", "State", "Progress", "Rate"])
+        self.table.setEditTriggers(QTableWidget.NoEditTriggers)
+        self.table.verticalHeader().setVisible(False)
+        self.table.horizontalHeader().setSectionResizeMode(0, QHeaderView.Stretch)
+        self.table.setStyleSheet(
+            "QHeaderView::section {background-color: #2E2E2E; color: white; font-weight: bold; border: 1px solid #3A3A3A;}"
+            "QTableWidget {background-color: #1E1E1E; color: white; font-size: 13px; gridline-color: #3A3A3A;}"
+        )
+        layout.addWidget(self.table)
+
+        # Refresh at a fixed rate rather than on every progress signal
+        manager.job_changed.connect(self.mark_dirty)
+        self.refresh_timer = QTimer(self)
+        self.refresh_timer.setInterval(1000)
+        self.refresh_timer.timeout.connect(self.refresh)
+        self.refresh_timer.start()
+        self.refresh()
+
+    def mark_dirty(self, job_id=None):
+        self.dirty = True
+
+    def clear_finished(self):
+        self.manager.clear_finished()
+        self.mark_dirty()
+        self.refresh()
+
+    def refresh(self):
+        """Redraw the queue table if anything changed (active jobs always update their rate)."""
+        if not self.dirty and not self.manager.live:
+            return
+        self.dirty = False
+        jobs = self.manager.jobs()
+
+        self.table.setRowCount(len(jobs))
+        for row, job in enumerate(jobs):
+            if job["total"]:
+                progress = f"{format_bytes(job['bytes'])} / {format_bytes(job['total'])} ({job['bytes'] / job['total']:.0%})"
+            else:
+                progress = format_bytes(job["bytes"]) if job["bytes"] else ""
+            state = job["state"]
+            if state == "queued" and job["attempts"]:
+                state = f"retrying ({job['attempts']})"
+            values = [
+                job["name"], "interactive" if job["priority"] == INTERACTIVE else "bulk", state, progress,
+                f"{format_bytes(job['rate'])}/s" if job["state"] == "active" else "",
+            ]
+            for column, value in enumerate(values):
+                item = QTableWidgetItem(value)
+                if column == 2 and job["error"]:
+                    item.setToolTip(job["error"])
+                self.table.setItem(row, column, item)
+
+        # Counts cover the whole queue, not only the jobs listed; active jobs always sort into the list
+        counts = self.manager.state_counts()
+        total_rate = sum(job["rate"] for job in jobs if job["state"] == "active")
+        self.summary_label.setText(
+            f"{counts.get('active', 0)} active, {counts.get('queued', 0)} queued, {counts.get('failed', 0)} failed"
+            f" - {format_bytes(total_rate)}/s"
+        )
@@ -0,0 +1,180 @@
+import os
+import numpy as np
+import requests
+
+from utilities import get_data_dir, query_run_camcol_field, get_run_rerun_camcol_field, get_fields_covering
+
+
+# Declination strip queried per request when downloading the index (degrees)
+DOWNLOAD_STRIP = 1.0
+
+# Fields taller or wider than this (in RA) are checked individually instead of through the sorted intervals
+WIDE_FIELD = 1.0
+
+COLUMNS = {
+    "run": np.int32, "rerun": np.int16, "camcol": np.int8, "field": np.int16, "mjd": np.float32,
+    "ra": np.float64, "dec": np.float64,
+    "ra_min": np.float64, "ra_max": np.float64, "dec_min": np.float64, "dec_max": np.float64,
+}
+
+
+def default_index_path():
+    return os.path.join(get_data_dir(), "field_index.npz")
+
+
+def download_field_index(path=None, progress_callback=None):
+    """
+    Download the footprint boxes of every SDSS imaging field and save them as a local index.
+
+    The Field table is fetched in declination strips so each request stays small.
+
+    Returns:
+        int: Number of fields in the index.
+    """
+    url = "http://skyserver.sdss.org/dr18/SkyServerWS/SearchTools/SqlSearch"
+    strips = np.arange(-90, 90, DOWNLOAD_STRIP)
+    rows = []
+    for index, dec_low in enumerate(strips, start=1):
+        query = f"""
+        SELECT run, rerun, camcol, field, mjd_r AS mjd, ra, dec, raMin, raMax, decMin, decMax
+        FROM Field
+        WHERE decMin >= {dec_low} AND decMin < {dec_low + DOWNLOAD_STRIP}
+        """
+        response = requests.get(url, params={"cmd": query, "format": "json"})
+        response.raise_for_status()
+        rows += response.json()[0]['Rows']
+        if progress_callback:
+            progress_callback(int(index / len(strips) * 100))
+
+    keys = ["run", "rerun", "camcol", "field", "mjd", "ra", "dec", "raMin", "raMax", "decMin", "decMax"]
+    arrays = {
+        column: np.array([row[key] for row in rows], dtype=dtype)
+        for (column, dtype), key in zip(COLUMNS.items(), keys)
+    }
+    order = np.argsort(arrays["dec_min"], kind="stable")
+    np.savez_compressed(path or default_index_path(), **{column: array[order] for column, array in arrays.items()})
+    return len(rows)
+
+
+class FieldIndex:
+    """
+    Local index of field footprints answering "which fields contain this point" without a server.
+
+    Footprint boxes are grouped into declination bands one field-height tall and
+    sorted by their lower RA within each band. A lookup binary-searches the two
+    bands that can hold a box containing the point, so it only tests the handful
+    of boxes just below and to the left of the point, regardless of the number of
+    fields. The few boxes that are very tall, very wide (near the poles) or
+    cross RA = 0 are tested individually.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or default_index_path()
+        self.arrays = None
+        if os.path.exists(self.path):
+            self.load()
+
+    def load(self):
+        """Load the index from disk and build the band/RA search structure."""
+        with np.load(self.path) as data:
+            self.arrays = {column: data[column] for column in COLUMNS}
+        a = self.arrays
+        height = a["dec_max"] - a["dec_min"]
+        width = a["ra_max"] - a["ra_min"]
+        special = (height > WIDE_FIELD) | (width > WIDE_FIELD) | (width < 0)
+        self.special = np.flatnonzero(special)
+
+        regular = np.flatnonzero(~special)
+        self.band_height = float(height[regular].max()) if regular.size else 1.0
+        self.max_width = float(width[regular].max()) if regular.size else 0.0
+        band = ((a["dec_min"][regular] + 90) // self.band_height).astype(np.int64)
+        order = np.lexsort((a["ra_min"][regular], band))
+        self.order = regular[order]
+        self.sorted_ra_min = a["ra_min"][self.order]
+        self.band_starts = np.searchsorted(band[order], np.arange(int(180 // self.band_height) + 3))
+
+    def available(self):
+        return self.arrays is not None
+
+    def __len__(self):
+        return 0 if self.arrays is None else len(self.arrays["run"])
+
+    def candidates(self, ra, dec):
+        """Indices of the boxes that may contain RA/DEC."""
+        parts = [self.special]
+        current = int((dec + 90) // self.band_height)
+        for band in (current - 1, current):
+            if 0 <= band < len(self.band_starts) - 1:
+                low, high = self.band_starts[band], self.band_starts[band + 1]
+                ra_values = self.sorted_ra_min[low:high]
+                start = low + np.searchsorted(ra_values, ra - self.max_width, side="left")
+                stop = low + np.searchsorted(ra_values, ra, side="right")
+                parts.append(self.order[start:stop])
+        return np.concatenate(parts)
+
+    def fields_containing(self, ra, dec):
+        """
+        Return the fields whose footprint box contains RA/DEC, nearest field center first.
+
+        Returns:
+            list: Dictionaries with run, rerun, camcol, field and mjd.
+        """
+        if self.arrays is None:
+            return []
+        a = self.arrays
+        candidates = self.candidates(ra, dec)
+
+        ra_min, ra_max = a["ra_min"][candidates], a["ra_max"][candidates]
+        wraps = (ra_min > ra_max) | (ra_max - ra_min > 180)  # Boxes crossing RA = 0
+        low, high = np.minimum(ra_min, ra_max), np.maximum(ra_min, ra_max)
+        inside_ra = np.where(wraps, (ra >= high) | (ra <= low), (ra >= low) & (ra <= high))
+        inside = inside_ra & (a["dec_min"][candidates] <= dec) & (a["dec_max"][candidates] >= dec)
+        matches = candidates[inside]
+
+        # Boxes are larger than the tilted fields, so rank by distance to the field center
+        delta_ra = ((a["ra"][matches] - ra + 180) % 360 - 180) * np.cos(np.radians(dec))
+        distance = np.hypot(delta_ra, a["dec"][matches] - dec)
+        matches = matches[np.argsort(distance)]
+        return [
+            {key: a[key][i].item() for key in ("run", "rerun", "camcol", "field", "mjd")}
+            for i in matches
+        ]
+
+
+_shared_index = None
+
+
+def shared_field_index():
+    """Return the application-wide FieldIndex, loading it on first use."""
+    global _shared_index
+    if _shared_index is None:
+        _shared_index = FieldIndex()
+    return _shared_index
+
+
+def locate_run_camcol_field(ra, dec):
+    """Run-Camcol-Field containing RA/DEC, from the local index if available, else from SkyServer."""
+    index = shared_field_index()
+    if index.available():
+        fields = index.fields_containing(ra, dec)
+        return f"{fields[0]['run']}-{fields[0]['camcol']}-{fields[0]['field']}" if fields else None
+    return query_run_camcol_field(ra, dec)
+
+
+def locate_run_rerun_camcol_field(ra, dec):
+    """(run, rerun, camcol, field) containing RA/DEC, from the local index if available, else from SkyServer."""
+    index = shared_field_index()
+    if index.available():
+        fields = index.fields_containing(ra, dec)
+        if not fields:
+            return None, None, None, None
+        return fields[0]['run'], fields[0]['rerun'], fields[0]['camcol'], fields[0]['field']
+    return get_run_rerun_camcol_field(ra, dec)
+
+
+def locate_fields_covering(ra, dec):
+    """Every field (all runs) covering RA/DEC, from the local index if available, else from SkyServer."""
+    index = shared_field_index()
+    if index.available():
+        return sorted(index.fields_containing(ra, dec), key=lambda row: row['mjd'])
+    return get_fields_covering(ra, dec)
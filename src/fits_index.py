@@ -0,0 +1,522 @@
+import os
+import re
+import json
+import sqlite3
+import threading
+import warnings
+import multiprocessing
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from astropy.io import fits
+from astropy.wcs import WCS
+from astropy.time import Time
+
+from utilities import get_data_dir
+from fits_utils import is_fits_file, image_hdu
+
+
+# Worker processes are spawned, not forked: forking the multithreaded GUI process can deadlock the children
+# on locks held by other threads
+PROCESS_CONTEXT = multiprocessing.get_context("spawn")
+
+# Quality statistics use every SAMPLE_STEP-th pixel along each image axis
+SAMPLE_STEP = 4
+
+# Frames above these fractions of NaN or saturated pixels are reported as suspect
+MAX_NAN_FRACTION = 0.1
+MAX_SATURATED_FRACTION = 0.01
+
+# Without a SATURATE keyword, at least this many sampled pixels at the image maximum count as clipping
+PLATEAU_PIXELS = 5
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    directory TEXT,
+    name TEXT,
+    mtime REAL,
+    size INTEGER,
+    band TEXT,
+    mjd REAL,
+    naxis1 INTEGER,
+    naxis2 INTEGER,
+    ra_center REAL,
+    dec_center REAL,
+    ra_min REAL,
+    ra_max REAL,
+    dec_min REAL,
+    dec_max REAL,
+    footprint TEXT
+);
+CREATE TABLE IF NOT EXISTS cards (
+    path TEXT,
+    keyword TEXT,
+    value TEXT,
+    num REAL
+);
+CREATE TABLE IF NOT EXISTS quality (
+    path TEXT PRIMARY KEY,
+    mtime REAL,
+    size INTEGER,
+    status TEXT,
+    problems TEXT,
+    checksum TEXT,
+    sky REAL,
+    noise REAL,
+    saturated REAL,
+    nan_fraction REAL
+);
+CREATE INDEX IF NOT EXISTS files_directory ON files (directory);
+CREATE INDEX IF NOT EXISTS files_band ON files (band);
+CREATE INDEX IF NOT EXISTS files_mjd ON files (mjd);
+CREATE INDEX IF NOT EXISTS files_dec ON files (dec_min, dec_max);
+CREATE INDEX IF NOT EXISTS cards_path ON cards (path);
+CREATE INDEX IF NOT EXISTS cards_keyword_value ON cards (keyword, value);
+CREATE INDEX IF NOT EXISTS cards_keyword_num ON cards (keyword, num);
+"""
+
+
+def read_header_record(path):
+    """
+    Read the primary header of a FITS file (no data) and extract the indexed fields.
+
+    For tile-compressed files the image header of the first extension is used,
+    since the primary HDU is empty.
+
+    Returns:
+        dict: Index record, or None if the file could not be read.
+    """
+    try:
+        header = fits.getheader(path, 0)
+        if header.get("NAXIS", 0) == 0 and path.lower().endswith(".fz"):
+            header = fits.getheader(path, 1)
+    except Exception as e:
+        print(f"Error reading header of {path}: {e}")
+        return None
+
+    stat = os.stat(path)
+    record = {
+        "path": path,
+        "directory": os.path.dirname(path),
+        "name": os.path.basename(path),
+        "mtime": stat.st_mtime,
+        "size": stat.st_size,
+        "band": str(header.get("FILTER", "")).strip() or None,
+        "mjd": None,
+        "naxis1": header.get("ZNAXIS1", header.get("NAXIS1")),
+        "naxis2": header.get("ZNAXIS2", header.get("NAXIS2")),
+        "ra_center": None, "dec_center": None,
+        "ra_min": None, "ra_max": None, "dec_min": None, "dec_max": None,
+        "footprint": None,
+        "cards": [],
+    }
+
+    # Observation date
+    for key in ("MJD", "MJD-OBS"):
+        if isinstance(header.get(key), (int, float)):
+            record["mjd"] = float(header[key])
+            break
+    else:
+        if header.get("DATE-OBS"):
+            try:
+                record["mjd"] = Time(header["DATE-OBS"]).mjd
+            except ValueError:
+                pass
+
+    # Sky footprint from the WCS
+    if record["naxis1"] and record["naxis2"]:
+        try:
+            wcs = WCS(header, naxis=2)
+            if wcs.has_celestial:
+                corners = wcs.calc_footprint(axes=(record["naxis1"], record["naxis2"]))
+                ra, dec = corners[:, 0], corners[:, 1]
+                if ra.max() - ra.min() > 180:  # Footprint crosses RA = 0
+                    ra = np.where(ra > 180, ra - 360, ra)
+                center = wcs.all_pix2world([[record["naxis1"] / 2, record["naxis2"] / 2]], 0)[0]
+                record.update({
+                    "ra_center": float(center[0]), "dec_center": float(center[1]),
+                    "ra_min": float(ra.min()), "ra_max": float(ra.max()),
+                    "dec_min": float(dec.min()), "dec_max": float(dec.max()),
+                    "footprint": json.dumps(np.column_stack((ra, dec)).tolist()),
+                })
+        except Exception:
+            pass  # Headers without a usable WCS are indexed without a footprint
+
+    # Every card, for arbitrary keyword queries
+    for keyword, value in header.items():
+        if not keyword or keyword in ("COMMENT", "HISTORY"):
+            continue
+        number = float(value) if isinstance(value, (int, float)) and not isinstance(value, bool) else None
+        record["cards"].append((keyword.upper(), str(value).strip(), number))
+
+    return record
+
+
+def check_file_quality(path):
+    """
+    Verify the structure and checksums of a FITS file and measure its image statistics.
+
+    The file is read once; CHECKSUM/DATASUM cards are verified while it is read,
+    and sky level, noise (scaled MAD), saturated and NaN fractions are estimated
+    from a subsampled grid of the first image.
+
+    Returns:
+        dict: Quality record with status "ok", "suspect" or "corrupt" and a list of problems.
+    """
+    stat = os.stat(path)
+    record = {
+        "path": path, "mtime": stat.st_mtime, "size": stat.st_size,
+        "status": "ok", "problems": [], "checksum": "absent",
+        "sky": None, "noise": None, "saturated": None, "nan_fraction": None,
+    }
+    try:
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter("always")
+            with fits.open(path, memmap=False, checksum=True) as hdul:
+                hdul.readall()
+                end = max(info["datLoc"] + info["datSpan"] for info in map(hdul.fileinfo, range(len(hdul))))
+                if end > stat.st_size:
+                    record["problems"].append(f"truncated ({stat.st_size} of {end} bytes)")
+                if any("CHECKSUM" in hdu.header or "DATASUM" in hdu.header for hdu in hdul):
+                    record["checksum"] = "ok"
+
+                hdu = image_hdu(hdul)
+                if hdu.is_image and hdu.data is not None and hdu.data.ndim >= 2:
+                    record.update(image_statistics(hdu.data, hdu.header))
+        for warning in caught:
+            message = str(warning.message).strip()
+            if "verification failed" in message:
+                record["checksum"] = "failed"
+                record["problems"].append(message)
+            elif "truncated" in message:
+                record["problems"].append(message)
+    except Exception as e:
+        record["problems"].append(f"unreadable: {e}")
+
+    if record["problems"]:
+        record["status"] = "corrupt"
+    elif record["nan_fraction"] is not None:
+        if record["nan_fraction"] > MAX_NAN_FRACTION:
+            record["problems"].append(f"{record['nan_fraction']:.1%} NaN pixels")
+        if record["saturated"] > MAX_SATURATED_FRACTION:
+            record["problems"].append(f"{record['saturated']:.1%} saturated pixels")
+        if record["noise"] == 0:
+            record["problems"].append("constant image")
+        if record["problems"]:
+            record["status"] = "suspect"
+    return record
+
+
+def image_statistics(data, header):
+    """
+    Estimate sky level, noise, saturated fraction and NaN fraction from a pixel subsample.
+
+    Returns:
+        dict: sky, noise, saturated and nan_fraction.
+    """
+    while data.ndim > 2:
+        data = data[0]
+    sample = np.asarray(data[::SAMPLE_STEP, ::SAMPLE_STEP], dtype=np.float32)
+    finite = np.isfinite(sample)
+    values = sample[finite]
+    if values.size == 0:
+        return {"sky": None, "noise": None, "saturated": 0.0, "nan_fraction": 1.0}
+
+    sky = np.median(values)
+    noise = 1.4826 * np.median(np.abs(values - sky))
+    level = header.get("SATURATE", header.get("SATLEVEL"))
+    if isinstance(level, (int, float)):
+        saturated = np.count_nonzero(values >= level)
+    else:
+        saturated = np.count_nonzero(values >= values.max())
+        if saturated < PLATEAU_PIXELS:
+            saturated = 0  # A single brightest pixel is not clipping
+    return {
+        "sky": float(sky), "noise": float(noise),
+        "saturated": saturated / sample.size, "nan_fraction": 1.0 - values.size / sample.size,
+    }
+
+
+def point_in_polygon(ra, dec, polygon):
+    """Ray-casting test for a point inside a small sky polygon given as [[ra, dec], ...]."""
+    inside = False
+    count = len(polygon)
+    for i in range(count):
+        x1, y1 = polygon[i]
+        x2, y2 = polygon[(i + 1) % count]
+        if (y1 > dec) != (y2 > dec):
+            x_cross = x1 + (dec - y1) * (x2 - x1) / (y2 - y1)
+            if ra < x_cross:
+                inside = not inside
+    return inside
+
+
+def root_prefix(root):
+    """
+    Parameters for "substr(path, 1, ?) = ?", matching paths under root exactly.
+
+    LIKE would treat "_" and "%" in directory names as wildcards and ignore ASCII case.
+    """
+    prefix = os.path.join(root, "")
+    return len(prefix), prefix
+
+
+def parse_filter(text):
+    """
+    Parse a filter expression such as "FILTER=r MJD>=51000 RUN=756".
+
+    Returns:
+        list: (keyword, operator, value) tuples.
+    """
+    terms = []
+    for match in re.finditer(r"([A-Za-z0-9_\-]+)\s*(<=|>=|!=|=|<|>)\s*(\"[^\"]*\"|'[^']*'|[^\s,]+)", text):
+        keyword, operator, value = match.groups()
+        terms.append((keyword.upper(), operator, value.strip("'\"")))
+    return terms
+
+
+class FITSIndex:
+    """SQLite index of FITS headers under the data root."""
+
+    def __init__(self, db_path=None):
+        self.db_path = db_path or os.path.join(get_data_dir(), "fits_index.sqlite")
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.executescript(SCHEMA)
+
+    def close(self):
+        self.connection.close()
+
+    def scan_directory(self, root):
+        """Return {path: (mtime, size)} for every FITS file under root."""
+        found = {}
+        for directory, _, file_names in os.walk(root):
+            for file_name in file_names:
+                if is_fits_file(file_name):
+                    path = os.path.join(directory, file_name)
+                    try:
+                        stat = os.stat(path)
+                    except OSError:
+                        continue
+                    found[path] = (stat.st_mtime, stat.st_size)
+        return found
+
+    def update(self, root=None, workers=None, progress_callback=None):
+        """
+        Bring the index up to date with the files under root.
+
+        Only new files and files whose mtime or size changed are read; entries for
+        deleted files are removed. Headers are parsed in a process pool.
+
+        Returns:
+            tuple: (number of files indexed, number of entries removed)
+        """
+        root = os.path.abspath(root or get_data_dir())
+        on_disk = self.scan_directory(root)
+
+        with self.lock:
+            known = {
+                path: (mtime, size) for path, mtime, size in self.connection.execute(
+                    "SELECT path, mtime, size FROM files WHERE substr(path, 1, ?) = ?", root_prefix(root)
+                )
+            }
+
+        changed = [path for path, stat in on_disk.items() if known.get(path) != stat]
+        removed = [path for path in known if path not in on_disk]
+        self.remove(removed)
+
+        if changed:
+            with ProcessPoolExecutor(max_workers=workers, mp_context=PROCESS_CONTEXT) as executor:
+                batch = []
+                for index, record in enumerate(executor.map(read_header_record, changed, chunksize=64), start=1):
+                    if record:
+                        batch.append(record)
+                    if len(batch) >= 500:
+                        self.store(batch)
+                        batch = []
+                    if progress_callback:
+                        progress_callback(int(index / len(changed) * 100))
+                self.store(batch)
+
+        return len(changed), len(removed)
+
+    def update_quality(self, root=None, workers=None, progress_callback=None, rescan=False):
+        """
+        Check the integrity and image quality of every FITS file under root.
+
+        Files are read in a process pool; unless rescan is set, files whose mtime
+        and size match their last check are skipped.
+
+        Returns:
+            int: Number of files checked.
+        """
+        root = os.path.abspath(root or get_data_dir())
+        on_disk = self.scan_directory(root)
+        with self.lock:
+            known = {
+                path: (mtime, size) for path, mtime, size in self.connection.execute(
+                    "SELECT path, mtime, size FROM quality WHERE substr(path, 1, ?) = ?", root_prefix(root)
+                )
+            }
+            stale = [(path,) for path in known if path not in on_disk]
+            with self.connection:
+                self.connection.executemany("DELETE FROM quality WHERE path = ?", stale)
+
+        # Largest files first, so a long file does not start last and hold up the pool
+        pending = sorted(
+            (path for path, stat in on_disk.items() if rescan or known.get(path) != stat),
+            key=lambda path: -on_disk[path][1]
+        )
+        if pending:
+            with ProcessPoolExecutor(max_workers=workers, mp_context=PROCESS_CONTEXT) as executor:
+                batch = []
+                for index, record in enumerate(executor.map(check_file_quality, pending, chunksize=4), start=1):
+                    batch.append(record)
+                    if len(batch) >= 100:
+                        self.store_quality(batch)
+                        batch = []
+                    if progress_callback:
+                        progress_callback(int(index / len(pending) * 100))
+                self.store_quality(batch)
+        return len(pending)
+
+    def store_quality(self, records):
+        """Insert or replace quality records."""
+        if not records:
+            return
+        columns = ["path", "mtime", "size", "status", "problems", "checksum", "sky", "noise", "saturated", "nan_fraction"]
+        with self.lock, self.connection:
+            self.connection.executemany(
+                f"INSERT OR REPLACE INTO quality ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+                [
+                    tuple("; ".join(record[column]) if column == "problems" else record[column] for column in columns)
+                    for record in records
+                ]
+            )
+
+    def quality_report(self, root=None):
+        """
+        List stored quality records (with band and MJD from the header index), worst first.
+
+        Returns:
+            list: Dictionaries with the quality columns plus band and mjd.
+        """
+        root = os.path.abspath(root or get_data_dir())
+        with self.lock:
+            cursor = self.connection.execute(
+                """
+                SELECT q.path, f.band, f.mjd, q.size, q.status, q.checksum, q.sky, q.noise,
+                q.saturated, q.nan_fraction, q.problems
+                FROM quality q LEFT JOIN files f ON f.path = q.path
+                WHERE substr(q.path, 1, ?) = ?
+                ORDER BY CASE q.status WHEN 'corrupt' THEN 0 WHEN 'suspect' THEN 1 ELSE 2 END, q.path
+                """,
+                root_prefix(root)
+            )
+            columns = [description[0] for description in cursor.description]
+            return [dict(zip(columns, row)) for row in cursor]
+
+    def index_files(self, paths):
+        """Index (or re-index) specific files in the calling thread."""
+        self.store([record for record in map(read_header_record, paths) if record])
+
+    def apply_changes(self, changed, removed):
+        """
+        Re-index changed files and drop removed ones, as reported by a directory watcher.
+
+        Returns:
+            tuple: (number of files indexed, number of entries removed)
+        """
+        changed = [path for path in changed if is_fits_file(path)]
+        removed = [path for path in removed if is_fits_file(path)]
+        self.index_files(changed)
+        self.remove(removed)
+        return len(changed), len(removed)
+
+    def store(self, records):
+        """Insert or replace index records."""
+        if not records:
+            return
+        columns = [
+            "path", "directory", "name", "mtime", "size", "band", "mjd", "naxis1", "naxis2",
+            "ra_center", "dec_center", "ra_min", "ra_max", "dec_min", "dec_max", "footprint"
+        ]
+        with self.lock, self.connection:
+            paths = [(record["path"],) for record in records]
+            self.connection.executemany("DELETE FROM cards WHERE path = ?", paths)
+            self.connection.executemany(
+                f"INSERT OR REPLACE INTO files ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+                [tuple(record[column] for column in columns) for record in records]
+            )
+            self.connection.executemany(
+                "INSERT INTO cards (path, keyword, value, num) VALUES (?, ?, ?, ?)",
+                [(record["path"], *card) for record in records for card in record["cards"]]
+            )
+
+    def remove(self, paths):
+        """Remove index entries for the given paths."""
+        if not paths:
+            return
+        with self.lock, self.connection:
+            rows = [(path,) for path in paths]
+            self.connection.executemany("DELETE FROM files WHERE path = ?", rows)
+            self.connection.executemany("DELETE FROM cards WHERE path = ?", rows)
+            self.connection.executemany("DELETE FROM quality WHERE path = ?", rows)
+
+    def query(self, terms=(), directory=None):
+        """
+        List indexed files matching every (keyword, operator, value) term.
+
+        Numeric comparisons are used when the value is a number.
+
+        Returns:
+            list: Matching file paths, sorted.
+        """
+        sql = "SELECT path FROM files WHERE 1 = 1"
+        params = []
+        if directory:
+            sql += " AND directory = ?"
+            params.append(os.path.abspath(directory))
+
+        for keyword, operator, value in terms:
+            if operator not in ("=", "!=", "<", "<=", ">", ">="):
+                continue
+            try:
+                number = float(value)
+                sql += f" AND path IN (SELECT path FROM cards WHERE keyword = ? AND num {operator} ?)"
+                params += [keyword, number]
+            except ValueError:
+                sql += f" AND path IN (SELECT path FROM cards WHERE keyword = ? AND value {operator} ? COLLATE NOCASE)"
+                params += [keyword, value]
+
+        with self.lock:
+            return [row[0] for row in self.connection.execute(sql + " ORDER BY path", params)]
+
+    def covering(self, ra, dec, candidates=None):
+        """
+        List indexed files whose footprint contains RA/DEC.
+
+        Parameters:
+            candidates (list): Optional paths to restrict the search to.
+        """
+        with self.lock:
+            rows = self.connection.execute(
+                """
+                SELECT path, footprint FROM files
+                WHERE ? BETWEEN dec_min AND dec_max
+                AND (? BETWEEN ra_min AND ra_max OR ? BETWEEN ra_min AND ra_max)
+                ORDER BY path
+                """,
+                (dec, ra, ra - 360)
+            ).fetchall()
+
+        candidate_set = set(candidates) if candidates is not None else None
+        matches = []
+        for path, footprint in rows:
+            if candidate_set is not None and path not in candidate_set:
+                continue
+            polygon = json.loads(footprint)
+            if point_in_polygon(ra, dec, polygon) or point_in_polygon(ra - 360, dec, polygon):
+                matches.append(path)
+        return matches
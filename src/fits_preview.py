@@ -0,0 +1,226 @@
+from PyQt5.QtWidgets import QGraphicsItem, QStyleOptionGraphicsItem
+from PyQt5.QtGui import QImage, QTransform
+from PyQt5.QtCore import QRectF, QTimer, QElapsedTimer
+from astropy.visualization import ZScaleInterval
+from collections import OrderedDict
+import numpy as np
+
+from image_view import ZoomableGraphicsView
+
+
+# Edge length of a pyramid tile in screen pixels
+TILE_SIZE = 256
+
+# Maximum number of tiles kept in memory (256 x 256 bytes each)
+CACHE_TILES = 400
+
+# Time spent reading tiles per timer tick, so panning stays responsive (milliseconds)
+LOAD_BUDGET_MS = 25
+
+
+def image_plane_prefix(hdu):
+    """Index prefix selecting the first 2D plane of an N-dimensional image HDU."""
+    return (0,) * max(0, hdu.header.get("ZNAXIS", hdu.header.get("NAXIS", 0)) - 2)
+
+
+def is_image_hdu(hdu):
+    """Return True if the HDU holds an image with at least two axes."""
+    if not hdu.is_image:
+        return False
+    header = hdu.header
+    return header.get("ZNAXIS", header.get("NAXIS", 0)) >= 2
+
+
+def read_region(section, prefix, y0, y1, x0, x1, step=1):
+    """
+    Read a (optionally decimated) region of an image through `hdu.section`.
+
+    Decimated regions are read one row at a time so only every `step`-th row
+    is touched; strided multi-row section reads are much slower.
+    """
+    if step == 1:
+        return np.asarray(section[prefix + (slice(y0, y1), slice(x0, x1))], dtype=np.float32)
+    rows = [section[prefix + (y, slice(x0, x1))][::step] for y in range(y0, y1, step)]
+    return np.asarray(rows, dtype=np.float32)
+
+
+def zscale_limits(section, prefix, shape, samples=64):
+    """
+    Estimate zscale display limits from a sparse grid of rows.
+
+    Returns:
+        tuple: (vmin, vmax)
+    """
+    height, width = shape
+    step = max(1, width // (samples * 4))
+    rows = np.unique(np.linspace(0, height - 1, min(height, samples)).astype(int))
+    sample = np.concatenate([np.asarray(section[prefix + (y, slice(None))][::step], dtype=np.float32) for y in rows.tolist()])
+    sample = sample[np.isfinite(sample)]
+    if sample.size == 0:
+        return 0.0, 1.0
+    vmin, vmax = ZScaleInterval().get_limits(sample)
+    if vmax <= vmin:
+        vmax = vmin + 1.0
+    return float(vmin), float(vmax)
+
+
+class FITSTileLayer(QGraphicsItem):
+    """
+    Graphics item that paints an image HDU from a tile pyramid built on demand.
+
+    Level 0 is full resolution and each further level halves it. Tiles are read
+    with `hdu.section`, scaled to 8 bits with zscale limits and kept in an LRU
+    cache. Painting never reads from disk: missing tiles are queued and drawn
+    from a coarser cached tile until they arrive.
+    """
+
+    def __init__(self, hdu):
+        super().__init__()
+        self.setFlag(QGraphicsItem.ItemUsesExtendedStyleOption)  # Needed for a precise exposedRect
+        self.section = hdu.section
+        self.prefix = image_plane_prefix(hdu)
+        header = hdu.header
+        self.width = header.get("ZNAXIS1", header.get("NAXIS1"))
+        self.height = header.get("ZNAXIS2", header.get("NAXIS2"))
+        self.vmin, self.vmax = zscale_limits(self.section, self.prefix, (self.height, self.width))
+
+        self.max_level = 0
+        while max(self.width, self.height) > TILE_SIZE << self.max_level:
+            self.max_level += 1
+
+        self.cache = OrderedDict()  # (level, ty, tx) -> (QImage, buffer)
+        self.pending = []  # Tiles requested by the last paint, most important first
+        self.tiles_requested = None  # Called from paint when tiles are missing
+
+        # FITS origin is at the lower left
+        self.setTransform(QTransform(1, 0, 0, -1, 0, self.height))
+
+    def boundingRect(self):
+        return QRectF(0, 0, self.width, self.height)
+
+    def tile_rect(self, level, ty, tx):
+        """Full-resolution pixel rectangle (x0, y0, x1, y1) covered by a tile."""
+        span = TILE_SIZE << level
+        return (
+            tx * span, ty * span,
+            min(self.width, (tx + 1) * span), min(self.height, (ty + 1) * span)
+        )
+
+    def load_tile(self, key):
+        """Read, scale and cache one tile."""
+        level, ty, tx = key
+        x0, y0, x1, y1 = self.tile_rect(level, ty, tx)
+        data = read_region(self.section, self.prefix, y0, y1, x0, x1, 1 << level)
+
+        scaled = (np.nan_to_num(data, nan=self.vmin) - self.vmin) * (255.0 / (self.vmax - self.vmin))
+        buffer = np.ascontiguousarray(np.clip(scaled, 0, 255).astype(np.uint8))
+        image = QImage(buffer.data, buffer.shape[1], buffer.shape[0], buffer.strides[0], QImage.Format_Grayscale8)
+
+        self.cache[key] = (image, buffer)
+        while len(self.cache) > CACHE_TILES:
+            self.cache.popitem(last=False)
+
+    def cached(self, key):
+        """Return the cached QImage of a tile (marking it recently used) or None."""
+        entry = self.cache.get(key)
+        if entry is None:
+            return None
+        self.cache.move_to_end(key)
+        return entry[0]
+
+    def paint(self, painter, option, widget=None):
+        # Coarsest level that still has at least one image pixel per screen pixel
+        lod = QStyleOptionGraphicsItem.levelOfDetailFromTransform(painter.worldTransform())
+        level = 0
+        while level < self.max_level and lod > 0 and lod * (2 ** (level + 1)) <= 1:
+            level += 1
+
+        exposed = option.exposedRect.intersected(self.boundingRect())
+        if exposed.isEmpty():
+            return
+
+        span = TILE_SIZE << level
+        ty0, ty1 = int(exposed.top()) // span, int(np.ceil(exposed.bottom() / span))
+        tx0, tx1 = int(exposed.left()) // span, int(np.ceil(exposed.right() / span))
+
+        missing = []
+        for ty in range(ty0, ty1):
+            for tx in range(tx0, tx1):
+                x0, y0, x1, y1 = self.tile_rect(level, ty, tx)
+                target = QRectF(x0, y0, x1 - x0, y1 - y0)
+                image = self.cached((level, ty, tx))
+                if image is not None:
+                    painter.drawImage(target, image)
+                    continue
+                missing.append((level, ty, tx))
+
+                # Draw the covering part of the nearest coarser tile until this one is loaded
+                for coarse in range(level + 1, self.max_level + 1):
+                    key = (coarse, ty >> (coarse - level), tx >> (coarse - level))
+                    image = self.cached(key)
+                    if image is not None:
+                        cx0, cy0, _, _ = self.tile_rect(*key)
+                        factor = 1 << coarse
+                        source = QRectF((x0 - cx0) / factor, (y0 - cy0) / factor, (x1 - x0) / factor, (y1 - y0) / factor)
+                        painter.drawImage(target, image, source)
+                        break
+
+        # Always keep the single overview tile available as the last fallback
+        if (self.max_level, 0, 0) not in self.cache:
+            missing.insert(0, (self.max_level, 0, 0))
+        self.pending = missing
+        if missing and self.tiles_requested:
+            self.tiles_requested()
+
+
+class FITSPreviewView(ZoomableGraphicsView):
+    """Pan/zoom preview of an image HDU that loads tiles progressively from disk."""
+
+    def __init__(self, parent=None):
+        super().__init__(parent=parent)
+        self.layer = None
+
+        self.load_timer = QTimer(self)
+        self.load_timer.setInterval(0)
+        self.load_timer.timeout.connect(self.load_pending_tiles)
+        self.view_changed.connect(self.schedule_loading)
+
+    def show_hdu(self, hdu):
+        """Display an image HDU; only its header and a sparse zscale sample are read up front."""
+        self.clear()
+        self.layer = FITSTileLayer(hdu)
+        self.layer.tiles_requested = self.load_timer.start
+        self.scene().addItem(self.layer)
+        self.scene().setSceneRect(self.layer.sceneBoundingRect())
+        self.fit_to_window()
+        self.schedule_loading()
+
+    def schedule_loading(self):
+        """Repaint the viewport; painting queues whatever tiles it is missing."""
+        if self.layer is not None:
+            self.viewport().update()
+
+    def load_pending_tiles(self):
+        """Load queued tiles for up to LOAD_BUDGET_MS, then repaint."""
+        if self.layer is None or not self.layer.pending:
+            self.load_timer.stop()
+            return
+
+        timer = QElapsedTimer()
+        timer.start()
+        while self.layer.pending and timer.elapsed() < LOAD_BUDGET_MS:
+            key = self.layer.pending.pop(0)
+            if key not in self.layer.cache:
+                self.layer.load_tile(key)
+
+        # Painting recomputes the missing tiles for the current view (stale requests are dropped)
+        self.layer.pending = []
+        self.layer.update()
+
+    def clear(self):
+        """Remove the displayed HDU and release its tiles."""
+        self.load_timer.stop()
+        if self.layer is not None:
+            self.scene().removeItem(self.layer)
+            self.layer = None
+        self.resetTransform()
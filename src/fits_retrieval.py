@@ -1,25 +1,162 @@
 from PyQt5.QtWidgets import (
     QWidget, QVBoxLayout, QHBoxLayout, QRadioButton, QLabel, QLineEdit, QCheckBox, QPushButton, QProgressBar,
-    QTextEdit, QFileDialog, QFrame, QListWidget, QListWidgetItem, QComboBox, QScrollArea, QGridLayout
+    QTextEdit, QFileDialog, QFrame, QListWidget, QListWidgetItem, QComboBox, QTabWidget
 )
-from PyQt5.QtCore import Qt, QThread, pyqtSignal
+from PyQt5.QtCore import Qt, QObject, QThread, QTimer, pyqtSignal
 from astropy.io import fits
+import numpy as np
 import os
 
-from utilities import validate_ra_dec, query_run_camcol_field, get_fits_urls, download_fits_files
+from utilities import validate_ra_dec, get_fits_urls, get_data_dir
+from coadd import coadd_position
+from fits_index import FITSIndex, parse_filter
+from fits_utils import is_fits_file
+from dir_watcher import shared_watcher
+from download_manager import shared_manager, frame_jobs, DownloadQueueView, INTERACTIVE, BULK, FINISHED_STATES
+from sky_region import find_region_fields
+from field_index import locate_run_camcol_field, shared_field_index, download_field_index
+from header_viewer import HeaderViewer
+from fits_preview import FITSPreviewView, is_image_hdu
+from quality_report import QualityReportView
 
-class FITSDownloadThread(QThread):
+
+# Delay that batches watcher notifications into one index update (milliseconds)
+INDEX_SETTLE_MS = 1000
+
+
+class CoaddThread(QThread):
     progress_signal = pyqtSignal(int)
-    finished_signal = pyqtSignal()
+    finished_signal = pyqtSignal(str)  # Output directory, empty on failure
 
-    def __init__(self, run_camcol_field, bands):
+    def __init__(self, ra, dec, bands, size, method):
         super().__init__()
-        self.run_camcol_field = run_camcol_field
+        self.ra = ra
+        self.dec = dec
         self.bands = bands
+        self.size = size
+        self.method = method
 
     def run(self):
-        download_fits_files(self.run_camcol_field, self.bands, self.progress_signal.emit)
-        self.finished_signal.emit()
+        try:
+            output_directory = coadd_position(
+                self.ra, self.dec, self.bands, self.size, self.method, self.progress_signal.emit
+            )
+        except Exception as e:
+            print(f"Error building coadd: {e}")
+            output_directory = None
+        self.finished_signal.emit(output_directory or "")
+
+
+class IndexThread(QThread):
+    progress_signal = pyqtSignal(int)
+    finished_signal = pyqtSignal(int, int)  # Files indexed, entries removed
+
+    def __init__(self, index, root=None, changes=None):
+        super().__init__()
+        self.index = index
+        self.root = root
+        self.changes = changes  # (changed paths, removed paths) from the directory watcher
+
+    def run(self):
+        try:
+            if self.changes is not None:
+                indexed, removed = self.index.apply_changes(*self.changes)
+            else:
+                indexed, removed = self.index.update(self.root, progress_callback=self.progress_signal.emit)
+        except Exception as e:
+            print(f"Error updating the header index: {e}")
+            indexed, removed = 0, 0
+        self.finished_signal.emit(indexed, removed)
+
+
+class IndexUpdater(QObject):
+    """
+    Single writer of the header index, shared by every FITS Retrieval tab.
+
+    Watcher notifications are collected for INDEX_SETTLE_MS and applied as one
+    batch, and full updates of a directory are queued; one IndexThread runs at
+    a time, however many tabs are open.
+    """
+    index_updated = pyqtSignal(int, int)  # Files indexed, entries removed
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.index = FITSIndex()
+        self.thread = None
+        self.roots = []  # Directories queued for a full update
+        self.changed, self.removed = set(), set()
+
+        self.settle_timer = QTimer(self)
+        self.settle_timer.setSingleShot(True)
+        self.settle_timer.setInterval(INDEX_SETTLE_MS)
+        self.settle_timer.timeout.connect(self.start_next)
+        shared_watcher().files_changed.connect(self.on_files_changed)
+
+    def on_files_changed(self, directory, changed, removed):
+        """Collect watcher changes; the latest event for a path wins."""
+        self.changed.difference_update(removed)
+        self.removed.difference_update(changed)
+        self.changed.update(changed)
+        self.removed.update(removed)
+        self.settle_timer.start()
+
+    def update_root(self, root):
+        """Queue a full update of the index for the files under root."""
+        root = os.path.abspath(root)
+        if root not in self.roots:
+            self.roots.append(root)
+        self.start_next()
+
+    def start_next(self):
+        """Start the next queued update unless one is running."""
+        if self.thread is not None:
+            return
+        if self.roots:
+            self.thread = IndexThread(self.index, root=self.roots.pop(0))
+        elif self.changed or self.removed:
+            changes = (sorted(self.changed), sorted(self.removed))
+            self.changed, self.removed = set(), set()
+            self.thread = IndexThread(self.index, changes=changes)
+        else:
+            return
+        self.thread.finished_signal.connect(self.on_thread_finished)
+        self.thread.start()
+
+    def on_thread_finished(self, indexed, removed):
+        self.thread.wait()
+        self.thread = None
+        self.index_updated.emit(indexed, removed)
+        if not self.settle_timer.isActive():
+            self.start_next()
+
+    def wait(self):
+        """Wait for the running update to finish."""
+        if self.thread is not None:
+            self.thread.wait()
+
+
+_shared_index_updater = None
+
+
+def shared_index_updater():
+    """Return the application-wide IndexUpdater, creating it on first use."""
+    global _shared_index_updater
+    if _shared_index_updater is None:
+        _shared_index_updater = IndexUpdater()
+    return _shared_index_updater
+
+
+class FieldIndexThread(QThread):
+    progress_signal = pyqtSignal(int)
+    finished_signal = pyqtSignal(int)  # Number of fields, -1 on failure
+
+    def run(self):
+        try:
+            count = download_field_index(progress_callback=self.progress_signal.emit)
+        except Exception as e:
+            print(f"Error downloading field index: {e}")
+            count = -1
+        self.finished_signal.emit(count)
 
 
 class FITSRetrieval(QWidget):
@@ -29,6 +166,22 @@ class FITSRetrieval(QWidget):
         self.hdul_data = None
         self.current_file_path = None  # Store the path of the current FITS file
         self.last_directory = os.getcwd()  # Default to the program's current working directory
+        self.indexer = shared_index_updater()  # Keeps the header index of local FITS files up to date
+        self.indexer.index_updated.connect(self.on_indexing_complete)
+        self.index = self.indexer.index
+        self.listed_directory = None  # Directory shown in the file list (None for index search results)
+        self.field_index_thread = None
+        self.coadd_thread = None
+        self.pending_downloads = {}  # Download label -> (job ids, destination paths) still being downloaded
+
+        # Shared, persistent download queue
+        self.downloads = shared_manager()
+        self.downloads.job_changed.connect(self.on_download_progress)
+
+        # Shared listing of the data tree, updated incrementally as files appear or disappear
+        self.watcher = shared_watcher()
+        self.watcher.watch(get_data_dir(), recursive=True)
+        self.watcher.files_changed.connect(self.on_files_changed)
 
         layout = QVBoxLayout(self)
 
@@ -59,6 +212,11 @@ class FITSRetrieval(QWidget):
         self.run_camcol_field_radio.toggled.connect(self.toggle_input_mode)
         mode_layout.addWidget(self.run_camcol_field_radio)
 
+        self.region_radio = QRadioButton("Use Sky Region")
+        self.region_radio.setStyleSheet("color: white; font-size: 14px;")
+        self.region_radio.toggled.connect(self.toggle_input_mode)
+        mode_layout.addWidget(self.region_radio)
+
         self.directory_radio = QRadioButton("Retrieve FITS from Directory")
         self.directory_radio.setStyleSheet("color: white; font-size: 14px;")
         self.directory_radio.toggled.connect(self.toggle_input_mode)
@@ -97,9 +255,60 @@ class FITSRetrieval(QWidget):
         ra_dec_layout.addSpacing(10)
         ra_dec_layout.addWidget(dec_label)
         ra_dec_layout.addWidget(self.dec_entry)
+        ra_dec_layout.addSpacing(10)
+
+        # Local field footprint index, so positions resolve offline and in empty sky
+        self.field_index_button = QPushButton()
+        self.field_index_button.setStyleSheet("background-color: #5A9; color: white; font-weight: bold; padding: 10px;")
+        self.field_index_button.clicked.connect(self.start_field_index_download)
+        ra_dec_layout.addWidget(self.field_index_button)
+        self.update_field_index_button()
 
         self.input_layout.addWidget(self.ra_dec_inputs)
 
+        # Sky Region Inputs (box or cone)
+        self.region_inputs = QWidget()
+        self.region_inputs.setVisible(False)
+        region_layout = QHBoxLayout(self.region_inputs)
+        region_layout.setAlignment(Qt.AlignCenter)
+
+        self.region_shape_combo = QComboBox()
+        self.region_shape_combo.setStyleSheet("color: white; background-color: #3A3A3A; font-size: 14px; padding: 5px;")
+        self.region_shape_combo.addItems(["Box", "Cone"])
+        self.region_shape_combo.currentIndexChanged.connect(self.toggle_region_shape)
+        region_layout.addWidget(self.region_shape_combo)
+
+        self.region_ra_entry = QLineEdit()
+        self.region_ra_entry.setPlaceholderText("Center RA")
+        self.region_ra_entry.setStyleSheet("color: white; background-color: #3A3A3A; padding: 10px; font-size: 14px;")
+        self.region_ra_entry.setFixedWidth(110)
+        region_layout.addWidget(self.region_ra_entry)
+
+        self.region_dec_entry = QLineEdit()
+        self.region_dec_entry.setPlaceholderText("Center DEC")
+        self.region_dec_entry.setStyleSheet("color: white; background-color: #3A3A3A; padding: 10px; font-size: 14px;")
+        self.region_dec_entry.setFixedWidth(110)
+        region_layout.addWidget(self.region_dec_entry)
+
+        self.region_width_entry = QLineEdit()
+        self.region_width_entry.setPlaceholderText("Width (deg)")
+        self.region_width_entry.setStyleSheet("color: white; background-color: #3A3A3A; padding: 10px; font-size: 14px;")
+        self.region_width_entry.setFixedWidth(110)
+        region_layout.addWidget(self.region_width_entry)
+
+        self.region_height_entry = QLineEdit()
+        self.region_height_entry.setPlaceholderText("Height (deg)")
+        self.region_height_entry.setStyleSheet("color: white; background-color: #3A3A3A; padding: 10px; font-size: 14px;")
+        self.region_height_entry.setFixedWidth(110)
+        region_layout.addWidget(self.region_height_entry)
+
+        self.best_seeing_checkbox = QCheckBox("Best Seeing")
+        self.best_seeing_checkbox.setStyleSheet("color: white; font-size: 14px;")
+        self.best_seeing_checkbox.setToolTip("Where several runs cover the same area, keep the sharpest (smallest r-band PSF)")
+        region_layout.addWidget(self.best_seeing_checkbox)
+
+        self.input_layout.addWidget(self.region_inputs)
+
         # Run-Camcol-Field Inputs
         self.run_camcol_field_inputs = QWidget()
         self.run_camcol_field_inputs.setVisible(False)
@@ -149,6 +358,33 @@ class FITSRetrieval(QWidget):
         self.directory_button.clicked.connect(self.select_directory)
         layout.addWidget(self.directory_button)
 
+        # Header Index Search (for Directory mode)
+        self.index_search_inputs = QWidget()
+        self.index_search_inputs.setVisible(False)
+        index_search_layout = QHBoxLayout(self.index_search_inputs)
+        index_search_layout.setAlignment(Qt.AlignCenter)
+
+        self.index_filter_entry = QLineEdit()
+        self.index_filter_entry.setPlaceholderText("Header filter, e.g. FILTER=r MJD>=51000")
+        self.index_filter_entry.setStyleSheet("color: white; background-color: #3A3A3A; padding: 10px; font-size: 14px;")
+        self.index_filter_entry.setFixedWidth(350)
+        self.index_filter_entry.returnPressed.connect(self.search_index)
+        index_search_layout.addWidget(self.index_filter_entry)
+
+        self.covers_entry = QLineEdit()
+        self.covers_entry.setPlaceholderText("Covers RA, DEC")
+        self.covers_entry.setStyleSheet("color: white; background-color: #3A3A3A; padding: 10px; font-size: 14px;")
+        self.covers_entry.setFixedWidth(200)
+        self.covers_entry.returnPressed.connect(self.search_index)
+        index_search_layout.addWidget(self.covers_entry)
+
+        self.index_search_button = QPushButton("Search Index")
+        self.index_search_button.setStyleSheet("background-color: #5A9; color: white; font-weight: bold; padding: 10px;")
+        self.index_search_button.clicked.connect(self.search_index)
+        index_search_layout.addWidget(self.index_search_button)
+
+        layout.addWidget(self.index_search_inputs)
+
         # Band Selection and Fetch Button (RA/DEC and Run-Camcol-Field only)
         self.band_fetch_layout = QVBoxLayout()
 
@@ -181,6 +417,33 @@ class FITSRetrieval(QWidget):
         self.band_fetch_layout.addLayout(fetch_button_layout)
         layout.addLayout(self.band_fetch_layout)
 
+        # Multi-epoch Coadd (RA/DEC only)
+        self.coadd_inputs = QWidget()
+        coadd_layout = QHBoxLayout(self.coadd_inputs)
+        coadd_layout.setAlignment(Qt.AlignCenter)
+
+        coadd_size_label = QLabel("Coadd Size (px):")
+        coadd_size_label.setStyleSheet("color: white; font-size: 14px;")
+        coadd_layout.addWidget(coadd_size_label)
+
+        self.coadd_size_entry = QLineEdit("1024")
+        self.coadd_size_entry.setStyleSheet("color: white; background-color: #3A3A3A; padding: 10px; font-size: 14px;")
+        self.coadd_size_entry.setFixedWidth(80)
+        coadd_layout.addWidget(self.coadd_size_entry)
+
+        self.coadd_method_combo = QComboBox()
+        self.coadd_method_combo.setStyleSheet("color: white; background-color: #3A3A3A; font-size: 14px; padding: 5px;")
+        self.coadd_method_combo.addItems(["Sigma-clipped Mean", "Median"])
+        coadd_layout.addWidget(self.coadd_method_combo)
+
+        self.coadd_button = QPushButton("Coadd All Epochs")
+        self.coadd_button.setStyleSheet("background-color: #5A9; color: white; font-weight: bold; padding: 10px;")
+        self.coadd_button.setFixedWidth(175)
+        self.coadd_button.clicked.connect(self.start_coadd)
+        coadd_layout.addWidget(self.coadd_button)
+
+        layout.addWidget(self.coadd_inputs)
+
         # Progress Bar (not visible in Directory mode)
         self.progress_bar = QProgressBar()
         self.progress_bar.setStyleSheet("""
@@ -196,6 +459,11 @@ class FITSRetrieval(QWidget):
         self.progress_bar.setValue(0)
         layout.addWidget(self.progress_bar)
 
+        # Download queue (not visible in Directory mode)
+        self.download_queue_view = DownloadQueueView(self.downloads)
+        self.download_queue_view.setFixedHeight(160)
+        layout.addWidget(self.download_queue_view)
+
         # FITS List (common to all modes in the correct position)
         self.fits_list = QListWidget()
         self.fits_list.setStyleSheet("color: white; background-color: #3A3A3A; font-size: 14px; padding: 10px;")
@@ -217,28 +485,54 @@ class FITSRetrieval(QWidget):
         self.metadata_combo = QComboBox()
         self.metadata_combo.setStyleSheet("color: white; background-color: #3A3A3A; font-size: 14px; padding: 5px;")
         self.metadata_combo.currentIndexChanged.connect(self.update_metadata_display)
-        metadata_layout.addWidget(self.metadata_combo)
-
-        # Scrollable Metadata Area
-        scroll_area = QScrollArea()
-        scroll_area.setStyleSheet("background-color: #1E1E1E; border: none;")
-        scroll_area.setWidgetResizable(True)
 
-        self.metadata_grid = QWidget()
-        self.metadata_grid_layout = QGridLayout(self.metadata_grid)
-        self.metadata_grid_layout.setAlignment(Qt.AlignTop)
-        self.metadata_grid_layout.setColumnStretch(1, 1)  # Ensure values stretch to use available space
-        scroll_area.setWidget(self.metadata_grid)
-
-        metadata_layout.addWidget(scroll_area)
+        # Data is only read from disk when a preview is requested
+        self.preview_button = QPushButton("Preview Data")
+        self.preview_button.setStyleSheet("background-color: #5A9; color: white; font-weight: bold; padding: 5px;")
+        self.preview_button.setEnabled(False)
+        self.preview_button.clicked.connect(self.preview_hdu_data)
+
+        metadata_row = QHBoxLayout()
+        metadata_row.addWidget(self.metadata_combo, stretch=1)
+        metadata_row.addWidget(self.preview_button)
+        metadata_layout.addLayout(metadata_row)
+
+        # Header browser (model/view, so only the visible cards are rendered)
+        self.header_viewer = HeaderViewer()
+
+        # Tiled image preview, read from disk one visible tile at a time
+        self.image_preview = FITSPreviewView()
+        self.preview_key = None  # (file, HDU) currently shown in the image preview
+
+        self.inspection_tabs = QTabWidget()
+        self.inspection_tabs.setStyleSheet(
+            "QTabWidget::pane {border: none;}"
+            "QTabBar::tab {background-color: #3A3A3A; color: white; padding: 5px 15px;}"
+            "QTabBar::tab:selected {background-color: #5A9;}"
+            "QTabBar::tab:disabled {color: #777;}"
+        )
+        self.inspection_tabs.addTab(self.header_viewer, "Header")
+        self.inspection_tabs.addTab(self.image_preview, "Image")
+        self.inspection_tabs.setTabEnabled(1, False)
+
+        # Integrity and quality report of the whole archive
+        self.quality_report = QualityReportView(self.index)
+        self.quality_report.file_activated.connect(self.inspect_reported_file)
+        self.inspection_tabs.addTab(self.quality_report, "Quality")
+        self.inspection_tabs.currentChanged.connect(self.update_image_preview)
+        metadata_layout.addWidget(self.inspection_tabs)
         layout.addWidget(metadata_frame)
 
         self.setLayout(layout)
 
+        # Bring the header index of the data directory up to date in the background
+        self.indexer.update_root(get_data_dir())
+
     def toggle_input_mode(self):
         """Toggle between RA/DEC, Run-Camcol-Field, and Directory modes."""
         self.ra_dec_inputs.setVisible(self.ra_dec_radio.isChecked())
         self.run_camcol_field_inputs.setVisible(self.run_camcol_field_radio.isChecked())
+        self.region_inputs.setVisible(self.region_radio.isChecked())
         is_directory_mode = self.directory_radio.isChecked()
 
         # Hide bands checklist, fetch button, progress bar, and "Select Bands" label in Directory mode
@@ -246,8 +540,46 @@ class FITSRetrieval(QWidget):
             checkbox.setVisible(not is_directory_mode)
         self.fetch_button.setVisible(not is_directory_mode)
         self.progress_bar.setVisible(not is_directory_mode)
+        self.download_queue_view.setVisible(not is_directory_mode)
         self.band_label.setVisible(not is_directory_mode)
         self.directory_button.setVisible(is_directory_mode)
+        self.index_search_inputs.setVisible(is_directory_mode)
+        self.coadd_inputs.setVisible(self.ra_dec_radio.isChecked())
+
+    def update_field_index_button(self):
+        """Show whether positions are resolved from the local field index."""
+        index = shared_field_index()
+        if index.available():
+            self.field_index_button.setText("Update Field Index")
+            self.field_index_button.setToolTip(f"Positions are resolved locally from {len(index)} field footprints")
+        else:
+            self.field_index_button.setText("Download Field Index")
+            self.field_index_button.setToolTip("Positions are resolved on SkyServer until the field index is downloaded")
+
+    def start_field_index_download(self):
+        """Download the field footprint index in the background."""
+        self.field_index_button.setEnabled(False)
+        self.notification_label.setText("<span style='color: #5A9;'>Downloading field footprint index...</span>")
+        self.field_index_thread = FieldIndexThread()
+        self.field_index_thread.progress_signal.connect(self.progress_bar.setValue)
+        self.field_index_thread.finished_signal.connect(self.on_field_index_downloaded)
+        self.field_index_thread.start()
+
+    def on_field_index_downloaded(self, count):
+        """Reload the field index once it has been downloaded."""
+        self.field_index_button.setEnabled(True)
+        if count < 0:
+            self.notification_label.setText("<span style='color: red;'>Failed to download the field index.</span>")
+            return
+        shared_field_index().load()
+        self.update_field_index_button()
+        self.notification_label.setText(f"Field index ready: {count} fields.")
+
+    def toggle_region_shape(self):
+        """Switch the region size inputs between box (width, height) and cone (radius)."""
+        is_cone = self.region_shape_combo.currentText() == "Cone"
+        self.region_width_entry.setPlaceholderText("Radius (deg)" if is_cone else "Width (deg)")
+        self.region_height_entry.setVisible(not is_cone)
 
     def start_fits_download(self):
         """Start downloading FITS files."""
@@ -255,6 +587,10 @@ class FITSRetrieval(QWidget):
         self.clear_metadata_display()  # Clear metadata display before starting a new download
         self.notification_label.setText("")  # Clear any existing messages
         
+        if self.region_radio.isChecked():
+            self.start_region_download()
+            return
+
         # Determine input mode and validate inputs
         if self.ra_dec_radio.isChecked():
             ra = self.ra_entry.text()
@@ -262,7 +598,7 @@ class FITSRetrieval(QWidget):
             if not validate_ra_dec(ra, dec):
                 self.notification_label.setText("<span style='color: red;'>Invalid RA/DEC values. Please try again.</span>")
                 return
-            run_camcol_field = query_run_camcol_field(float(ra), float(dec))
+            run_camcol_field = locate_run_camcol_field(float(ra), float(dec))
             if not run_camcol_field:
                 self.notification_label.setText("<span style='color: red;'>No Run-Camcol-Field found for the given RA/DEC.</span>")
                 return
@@ -291,67 +627,218 @@ class FITSRetrieval(QWidget):
         # Display information about the download process
         self.notification_label.setText(f"<span style='color: #5A9;'>Starting download for: {run_camcol_field}</span>")
 
-        # Start the download process in a separate thread
-        self.thread = FITSDownloadThread(run_camcol_field, selected_bands)
-        self.thread.progress_signal.connect(self.progress_bar.setValue)
-        self.thread.finished_signal.connect(self.on_download_complete)
-        self.thread.start()
+        # Queue the frames ahead of any bulk downloads; files already on disk are not fetched again
+        jobs = frame_jobs(run_camcol_field, selected_bands, self.downloads.compression)
+        self.pending_downloads[run_camcol_field] = (
+            [self.downloads.enqueue(url, destination, INTERACTIVE, processing) for url, destination, processing in jobs],
+            [destination for _, destination, _ in jobs]
+        )
+        self.progress_bar.setValue(0)
+        self.on_download_progress()
+
+    def start_region_download(self):
+        """Queue every field overlapping a sky box or cone, found with a single query."""
+        shape = self.region_shape_combo.currentText().lower()
+        ra, dec = self.region_ra_entry.text(), self.region_dec_entry.text()
+        if not validate_ra_dec(ra, dec):
+            self.notification_label.setText("<span style='color: red;'>Invalid RA/DEC values. Please try again.</span>")
+            return
+        try:
+            width = float(self.region_width_entry.text())
+            height = width if shape == "cone" else float(self.region_height_entry.text())
+            if width <= 0 or height <= 0:
+                raise ValueError
+        except ValueError:
+            self.notification_label.setText("<span style='color: red;'>Enter a positive region size in degrees.</span>")
+            return
 
-    def on_download_complete(self):
+        selected_bands = [band for band, checkbox in self.bands_checkboxes.items() if checkbox.isChecked()]
+        if not selected_bands:
+            self.notification_label.setText("<span style='color: red;'>No bands selected. Please select at least one band.</span>")
+            return
+
+        fields, overlapping = find_region_fields(
+            shape, float(ra), float(dec), width, height, self.best_seeing_checkbox.isChecked()
+        )
+        if not fields:
+            self.notification_label.setText("<span style='color: red;'>No fields found in the given region.</span>")
+            return
+
+        # Wide pulls go to the bulk class so interactive fetches can overtake them
+        jobs = []
+        for row in fields:
+            jobs += frame_jobs(f"{row['run']}-{row['camcol']}-{row['field']}", selected_bands, self.downloads.compression)
+        label = f"{shape} at {float(ra):.4f}, {float(dec):+.4f}"
+        self.pending_downloads[label] = (
+            [self.downloads.enqueue(url, destination, BULK, processing) for url, destination, processing in jobs],
+            [destination for _, destination, _ in jobs]
+        )
+        self.notification_label.setText(
+            f"<span style='color: #5A9;'>Queued {len(fields)} field(s) ({overlapping - len(fields)} redundant skipped), "
+            f"{len(jobs)} file(s), for the {label}</span>"
+        )
+        self.progress_bar.setValue(0)
+        self.on_download_progress()
+
+    def on_download_progress(self, job_id=None):
+        """Track queued frame downloads and finish the ones whose jobs are all done."""
+        for label, (job_ids, paths) in list(self.pending_downloads.items()):
+            if job_id is not None and job_id not in job_ids:
+                continue
+            states = self.downloads.states(job_ids)
+            finished = [state for state in states.values() if state in FINISHED_STATES]
+            self.progress_bar.setValue(int(len(finished) / len(job_ids) * 100))
+            if len(finished) == len(states):
+                del self.pending_downloads[label]
+                self.on_download_complete(label, paths, finished.count("failed"))
+
+    def on_download_complete(self, label, paths, failed=0):
         """Handle completion of FITS download."""
-        # Update the last directory to the folder where FITS files were downloaded
-        base_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
-        data_dir = os.path.join(base_dir, 'data')
-        downloaded_directory = os.path.join(data_dir, self.thread.run_camcol_field)  # Access run_camcol_field from the thread
-        
-        if os.path.exists(downloaded_directory):  # Ensure the directory exists
-            self.last_directory = downloaded_directory
-        
-        self.notification_label.setText("Download complete!")
-        
-        # Reload the directory where files were saved
-        self.load_fits_files(self.last_directory)
+        if failed:
+            self.notification_label.setText(
+                f"<span style='color: red;'>Download of {label} finished with {failed} failed file(s).</span>"
+            )
+        else:
+            self.notification_label.setText(f"Download complete: {label}")
+
+        # Reload the directory where files were saved, or list the files if they span several
+        directories = {os.path.dirname(path) for path in paths}
+        if len(directories) == 1:
+            self.last_directory = directories.pop()
+            self.load_fits_files(self.last_directory)
+        else:
+            self.show_file_paths([path for path in paths if os.path.exists(path)])
+
+    def start_coadd(self):
+        """Download every epoch covering RA/DEC and coadd them per band."""
+        self.notification_label.setText("")
+        ra = self.ra_entry.text()
+        dec = self.dec_entry.text()
+        if not validate_ra_dec(ra, dec):
+            self.notification_label.setText("<span style='color: red;'>Invalid RA/DEC values. Please try again.</span>")
+            return
+
+        selected_bands = [band for band, checkbox in self.bands_checkboxes.items() if checkbox.isChecked()]
+        if not selected_bands:
+            self.notification_label.setText("<span style='color: red;'>No bands selected. Please select at least one band.</span>")
+            return
+
+        try:
+            size = int(self.coadd_size_entry.text())
+        except ValueError:
+            self.notification_label.setText("<span style='color: red;'>Invalid coadd size.</span>")
+            return
+
+        method = "median" if self.coadd_method_combo.currentText() == "Median" else "mean"
+        self.notification_label.setText(f"<span style='color: #5A9;'>Building coadd at RA {ra}, DEC {dec}...</span>")
+        self.coadd_button.setEnabled(False)
+        self.coadd_thread = CoaddThread(float(ra), float(dec), selected_bands, size, method)
+        self.coadd_thread.progress_signal.connect(self.progress_bar.setValue)
+        self.coadd_thread.finished_signal.connect(self.on_coadd_complete)
+        self.coadd_thread.start()
+
+    def on_coadd_complete(self, output_directory):
+        """Show the coadded frames once the coadd thread finishes."""
+        self.coadd_thread = None
+        self.coadd_button.setEnabled(True)
+        if not output_directory:
+            self.notification_label.setText("<span style='color: red;'>No epochs found or coadd failed.</span>")
+            return
+        self.notification_label.setText(f"Coadd complete! Open {output_directory} in Composite Creation.")
+        self.last_directory = output_directory
+        self.load_fits_files(output_directory)
 
-        
     def select_directory(self):
         """Select a directory to list FITS files."""
         directory = QFileDialog.getExistingDirectory(self, "Select FITS Directory", self.last_directory)
         if directory:
             self.last_directory = directory
             self.load_fits_files(directory)
+            self.indexer.update_root(directory)
 
     def load_fits_files(self, directory):
         """Load and display FITS files from the selected directory."""
+        directory = os.path.abspath(directory)
+        if directory != self.listed_directory:
+            self.watcher.watch(directory)
+            if self.listed_directory is not None:
+                self.watcher.unwatch(self.listed_directory)
+            self.listed_directory = directory
+
+        self.fits_list.clear()
+        for file_name in self.watcher.files(directory):
+            if is_fits_file(file_name):
+                item = QListWidgetItem(file_name)
+                item.setData(Qt.UserRole, os.path.join(directory, file_name))
+                self.fits_list.addItem(item)
+
+    def on_files_changed(self, directory, changed, removed):
+        """Refresh the listing when watched files change (the shared IndexUpdater updates the index)."""
+        if directory == self.listed_directory:
+            listed = {self.fits_list.item(row).data(Qt.UserRole) for row in range(self.fits_list.count())}
+            if any(is_fits_file(path) and path not in listed for path in changed) or listed & set(removed):
+                self.load_fits_files(directory)  # Re-list from the watcher's cache, not from disk
+
+    def on_indexing_complete(self, indexed, removed):
+        """Report index updates."""
+        if indexed or removed:
+            self.notification_label.setText(f"Header index updated: {indexed} file(s) indexed, {removed} removed.")
+
+    def search_index(self):
+        """List indexed FITS files matching the header filter and/or covering a position."""
+        terms = parse_filter(self.index_filter_entry.text())
+        covers = self.covers_entry.text().replace(",", " ").split()
+        if not terms and not covers:
+            self.notification_label.setText("<span style='color: red;'>Enter a header filter or a position to search.</span>")
+            return
+
+        paths = self.index.query(terms)
+        if covers:
+            if len(covers) != 2 or not validate_ra_dec(*covers):
+                self.notification_label.setText("<span style='color: red;'>Invalid RA/DEC values. Please try again.</span>")
+                return
+            paths = self.index.covering(float(covers[0]), float(covers[1]), candidates=paths)
+
+        self.show_file_paths(paths)
+        self.notification_label.setText(f"{len(paths)} indexed file(s) match.")
+
+    def show_file_paths(self, paths):
+        """List files from several directories, relative to the data directory where possible."""
+        data_dir = get_data_dir()
+        if self.listed_directory is not None:
+            self.watcher.unwatch(self.listed_directory)
+            self.listed_directory = None
         self.fits_list.clear()
-        for file_name in os.listdir(directory):
-            if file_name.lower().endswith(".fits"):
-                self.fits_list.addItem(QListWidgetItem(file_name))
+        for path in paths:
+            item = QListWidgetItem(os.path.relpath(path, data_dir) if path.startswith(data_dir) else path)
+            item.setData(Qt.UserRole, path)
+            self.fits_list.addItem(item)
 
     def inspect_selected_fits(self, item):
         """Load the selected FITS file and populate dropdown options."""
-        file_path = os.path.join(self.last_directory, item.text())  # Use self.last_directory
+        self.inspect_file(item.data(Qt.UserRole) or os.path.join(self.last_directory, item.text()))
+
+    def inspect_file(self, file_path):
+        """Open a FITS file for inspection."""
         self.current_file_path = file_path
         try:
             if self.hdul_data is not None:
+                self.clear_metadata_display()  # The preview reads from the open file
                 self.hdul_data.close()  # Close any previously opened FITS file
 
-            self.hdul_data = fits.open(file_path)  # Open the FITS file and keep it open
+            # Open the FITS file and keep it open; without memmap, section reads touch only the bytes they need
+            self.hdul_data = fits.open(file_path, memmap=False)
             self.metadata_combo.clear()
             self.metadata_combo.addItems(["HDUL Info"] + [f"HDU {i}" for i in range(len(self.hdul_data))])
             self.update_metadata_display(0)
         except Exception as e:
-            self.metadata_display.setText(f"Error reading FITS file: {e}")
-
-    def add_metadata_entry(self, key, value):
-        """Add a metadata key-value pair to the grid."""
-        row = self.metadata_grid_layout.rowCount()
-        key_label = QLabel(f"{key}:")
-        key_label.setStyleSheet("color: #5A9; font-size: 16px; font-weight: bold; padding: 2px;")
-        value_label = QLabel(str(value))
-        value_label.setStyleSheet("color: white; font-size: 16px; padding: 2px;")
-        self.metadata_grid_layout.addWidget(key_label, row, 0, Qt.AlignCenter)
-        self.metadata_grid_layout.addWidget(value_label, row, 1, Qt.AlignCenter)
-    
+            self.notification_label.setText(f"<span style='color: red;'>Error reading FITS file: {e}</span>")
+
+    def inspect_reported_file(self, file_path):
+        """Open a file picked from the quality report and show its HDUs."""
+        self.inspect_file(file_path)
+        self.inspection_tabs.setCurrentIndex(0)
+
     def update_metadata_display(self, index):
         """Update the inspection display based on selected option."""
         self.clear_metadata_display()
@@ -359,25 +846,101 @@ class FITSRetrieval(QWidget):
         if not self.hdul_data:
             return
 
+        self.preview_button.setEnabled(index > 0)
+
         if index == 0:  # HDUL Info
-            for i, hdu in enumerate(self.hdul_data):
-                hdu_info = f"{type(hdu).__name__}, {hdu.data.shape if hdu.data is not None else 'No Data'}"
-                self.add_metadata_entry(f"HDU {i}", hdu_info)
+            self.header_viewer.show_rows(
+                [(f"HDU {i}", self.summarize_hdu(hdu), hdu.name) for i, hdu in enumerate(self.hdul_data)],
+                ["HDU", "Summary", "Name"]
+            )
         else:  # Specific HDU Header
+            self.header_viewer.show_header(self.hdul_data[index - 1].header, index - 1)
+
+        # The image tab is only offered for image HDUs
+        has_image = index > 0 and is_image_hdu(self.hdul_data[index - 1])
+        self.inspection_tabs.setTabEnabled(1, has_image)
+        if not has_image and self.inspection_tabs.currentIndex() == 1:
+            self.inspection_tabs.setCurrentIndex(0)
+        self.update_image_preview()
+
+    def update_image_preview(self):
+        """Show the selected image HDU in the preview tab when that tab is visible."""
+        index = self.metadata_combo.currentIndex()
+        if self.inspection_tabs.currentIndex() != 1 or not self.hdul_data or index < 1:
+            return
+        if self.preview_key == (self.current_file_path, index):
+            return  # Already displayed; keep the loaded tiles and view position
+        try:
+            self.image_preview.show_hdu(self.hdul_data[index - 1])
+            self.preview_key = (self.current_file_path, index)
+        except Exception as e:
+            self.notification_label.setText(f"<span style='color: red;'>Error previewing image: {e}</span>")
+
+    def summarize_hdu(self, hdu):
+        """Describe an HDU from its header cards only, without reading its data."""
+        header = hdu.header
+        hdu_type = type(hdu).__name__
+
+        if isinstance(hdu, (fits.BinTableHDU, fits.TableHDU)):
+            return f"{hdu_type}, {header.get('NAXIS2', 0)} rows x {header.get('TFIELDS', 0)} columns"
+
+        naxis = header.get("NAXIS", 0)
+        if naxis == 0:
+            return f"{hdu_type}, No Data"
+        shape = tuple(header.get(f"NAXIS{axis}", 0) for axis in range(naxis, 0, -1))
+        return f"{hdu_type}, {shape}, BITPIX={header.get('BITPIX')}"
+
+    def preview_hdu_data(self):
+        """Load the data of the selected HDU and show a short summary of it."""
+        index = self.metadata_combo.currentIndex()
+        if not self.hdul_data or index < 1:
+            return
+
+        try:
             hdu = self.hdul_data[index - 1]
-            for key, value in hdu.header.items():
-                self.add_metadata_entry(key, value)
-                
+            data = hdu.data
+            if data is None:
+                rows = [("Data", "No Data", "")]
+            elif isinstance(hdu, (fits.BinTableHDU, fits.TableHDU)):
+                rows = [("Rows", len(data), ""), ("Columns", ", ".join(data.columns.names), "")]
+                for row_index in range(min(10, len(data))):
+                    rows.append((f"Row {row_index}", ", ".join(str(value) for value in data[row_index]), ""))
+            else:
+                rows = [
+                    ("Shape", data.shape, ""),
+                    ("Type", data.dtype, ""),
+                    ("Min", np.nanmin(data), ""),
+                    ("Max", np.nanmax(data), ""),
+                    ("Mean", np.nanmean(data), ""),
+                    ("Median", np.nanmedian(data), ""),
+                ]
+            self.header_viewer.show_rows(rows)
+        except Exception as e:
+            self.notification_label.setText(f"<span style='color: red;'>Error reading HDU data: {e}</span>")
+
     def clear_metadata_display(self):
-        """Clear the metadata grid layout."""
-        while self.metadata_grid_layout.count():
-            item = self.metadata_grid_layout.takeAt(0)
-            widget = item.widget()
-            if widget:
-                widget.deleteLater()
+        """Clear the header browser and image preview."""
+        self.header_viewer.clear()
+        self.image_preview.clear()
+        self.preview_key = None
     
     def closeEvent(self, event):
         """Handle widget close event to clean up resources."""
         if self.hdul_data is not None:
             self.hdul_data.close()
+        self.watcher.files_changed.disconnect(self.on_files_changed)
+        self.downloads.job_changed.disconnect(self.on_download_progress)
+        self.watcher.unwatch(get_data_dir())
+        if self.listed_directory is not None:
+            self.watcher.unwatch(self.listed_directory)
+        self.indexer.index_updated.disconnect(self.on_indexing_complete)
+        self.indexer.wait()
+        if self.quality_report.scan_thread is not None:
+            self.quality_report.scan_thread.wait()
+        if self.field_index_thread is not None:
+            self.field_index_thread.wait()
+        if self.coadd_thread is not None:
+            self.coadd_thread.progress_signal.disconnect(self.progress_bar.setValue)
+            self.coadd_thread.finished_signal.disconnect(self.on_coadd_complete)
+            self.coadd_thread.wait()
         event.accept()
\ No newline at end of file
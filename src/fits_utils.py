@@ -0,0 +1,46 @@
+from astropy.io import fits
+
+
+FITS_EXTENSIONS = (".fits", ".fit", ".fts", ".fits.fz")
+
+
+def is_fits_file(file_name):
+    """Return True if the file name has a FITS extension."""
+    return file_name.lower().endswith(FITS_EXTENSIONS)
+
+
+def image_hdu(hdul):
+    """Return the first HDU holding an image (the primary HDU of tile-compressed files is empty)."""
+    for hdu in hdul:
+        if hdu.is_image and hdu.header.get("NAXIS", 0) > 0:
+            return hdu
+    return hdul[0]
+
+
+def compress_fits(source, destination, compression="RICE_1"):
+    """
+    Copy a FITS file with its images tile-compressed, so they can later be read tile by tile.
+
+    Compressed images must be extensions, so the primary image moves behind an
+    empty primary HDU. Tables and 1D arrays (e.g. calibration vectors) are copied
+    unchanged so they are never quantized.
+
+    Parameters:
+        compression (str): "RICE_1" (quantized floats) or "GZIP_2" (lossless).
+    """
+    # Lossless GZIP needs quantization turned off for floating point data
+    quantize_level = 0.0 if compression.startswith("GZIP") else 16.0
+    with fits.open(source, memmap=True) as hdul:
+        output = fits.HDUList([fits.PrimaryHDU()])
+        for hdu in hdul:
+            if hdu.is_image and hdu.header.get("NAXIS", 0) >= 2:
+                header = hdu.header.copy()
+                for keyword in ("SIMPLE", "EXTEND", "XTENSION", "PCOUNT", "GCOUNT"):
+                    header.remove(keyword, ignore_missing=True)
+                output.append(fits.CompImageHDU(
+                    data=hdu.data, header=header, name=hdu.name if hdu.name != "PRIMARY" else None,
+                    compression_type=compression, quantize_level=quantize_level
+                ))
+            elif not isinstance(hdu, fits.PrimaryHDU):
+                output.append(hdu.copy())
+        output.writeto(destination, overwrite=True)
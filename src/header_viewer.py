@@ -0,0 +1,226 @@
+from PyQt5.QtWidgets import (
+    QWidget, QVBoxLayout, QHBoxLayout, QLineEdit, QPushButton, QCheckBox, QTableView, QHeaderView, QFileDialog, QLabel
+)
+from PyQt5.QtCore import Qt, QAbstractTableModel, QModelIndex, QSortFilterProxyModel, QVariant
+from PyQt5.QtGui import QColor
+from astropy.io import fits
+import os
+
+
+class HeaderTableModel(QAbstractTableModel):
+    """Table model over a list of row tuples; only the visible rows are ever rendered."""
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.columns = ["Keyword", "Value", "Comment"]
+        self.rows = []
+        self.highlighted = set()  # Row numbers drawn in the highlight color (diff mode)
+
+    def set_rows(self, rows, columns=None, highlighted=None):
+        """Replace the model contents in one reset."""
+        self.beginResetModel()
+        if columns is not None:
+            self.columns = columns
+        self.rows = rows
+        self.highlighted = highlighted or set()
+        self.endResetModel()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.columns)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return QVariant()
+        if role == Qt.DisplayRole:
+            return str(self.rows[index.row()][index.column()])
+        if role == Qt.ForegroundRole:
+            if index.row() in self.highlighted:
+                return QColor("#E8A33D")
+            return QColor("#5A9") if index.column() == 0 else QColor("white")
+        return QVariant()
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return self.columns[section]
+        return QVariant()
+
+
+class HeaderFilterProxy(QSortFilterProxyModel):
+    """Case-insensitive filter over every column, optionally limited to differing rows."""
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setFilterCaseSensitivity(Qt.CaseInsensitive)
+        self.setFilterKeyColumn(-1)
+        self.only_highlighted = False
+
+    def set_only_highlighted(self, enabled):
+        self.only_highlighted = enabled
+        self.invalidateFilter()
+
+    def filterAcceptsRow(self, source_row, source_parent):
+        if self.only_highlighted and source_row not in self.sourceModel().highlighted:
+            return False
+        return super().filterAcceptsRow(source_row, source_parent)
+
+
+class HeaderRows:
+    """
+    Lazy (keyword, value, comment) rows over the cards of a header.
+
+    astropy parses a card's value only when it is accessed, so only the rows the
+    table actually paints (or the filter inspects) are ever parsed.
+    """
+
+    def __init__(self, header):
+        self.cards = header.cards
+        self.cache = {}
+
+    def __len__(self):
+        return len(self.cards)
+
+    def __getitem__(self, row):
+        if row not in self.cache:
+            card = self.cards[row]
+            self.cache[row] = (card.keyword, card.value, card.comment)
+        return self.cache[row]
+
+
+def diff_rows(header_a, header_b):
+    """
+    Align two headers by keyword (and occurrence, for repeated keywords).
+
+    Returns:
+        tuple: (rows, differing row numbers) with rows as (keyword, value A, value B).
+    """
+    def keyed(header):
+        counts, entries = {}, {}
+        for card in header.cards:
+            occurrence = counts.get(card.keyword, 0)
+            counts[card.keyword] = occurrence + 1
+            entries[(card.keyword, occurrence)] = card.value
+        return entries
+
+    entries_a, entries_b = keyed(header_a), keyed(header_b)
+    keys = list(entries_a) + [key for key in entries_b if key not in entries_a]
+
+    rows, differing = [], set()
+    missing = "(missing)"
+    for row, key in enumerate(keys):
+        value_a, value_b = entries_a.get(key, missing), entries_b.get(key, missing)
+        rows.append((key[0], value_a, value_b))
+        if str(value_a) != str(value_b):
+            differing.add(row)
+    return rows, differing
+
+
+class HeaderViewer(QWidget):
+    """Searchable header browser with a diff mode against another file."""
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.current_header = None
+        self.current_hdu_index = 0
+
+        layout = QVBoxLayout(self)
+        layout.setContentsMargins(0, 0, 0, 0)
+
+        # Search and diff controls
+        controls = QHBoxLayout()
+
+        self.search_entry = QLineEdit()
+        self.search_entry.setPlaceholderText("Filter by keyword or value")
+        self.search_entry.setStyleSheet("color: white; background-color: #3A3A3A; font-size: 14px; padding: 5px;")
+        controls.addWidget(self.search_entry, stretch=1)
+
+        self.diff_button = QPushButton("Diff With File...")
+        self.diff_button.setStyleSheet("background-color: #5A9; color: white; font-weight: bold; padding: 5px;")
+        self.diff_button.setEnabled(False)
+        self.diff_button.clicked.connect(self.select_diff_file)
+        controls.addWidget(self.diff_button)
+
+        self.only_differences_checkbox = QCheckBox("Only Differences")
+        self.only_differences_checkbox.setStyleSheet("color: white; font-size: 14px;")
+        self.only_differences_checkbox.setVisible(False)
+        controls.addWidget(self.only_differences_checkbox)
+
+        layout.addLayout(controls)
+
+        self.status_label = QLabel("")
+        self.status_label.setStyleSheet("color: #5A9; font-size: 12px; border: none;")
+        self.status_label.setVisible(False)
+        layout.addWidget(self.status_label)
+
+        # Model/view table
+        self.model = HeaderTableModel(self)
+        self.proxy = HeaderFilterProxy(self)
+        self.proxy.setSourceModel(self.model)
+        self.search_entry.textChanged.connect(self.proxy.setFilterFixedString)
+        self.only_differences_checkbox.toggled.connect(self.proxy.set_only_highlighted)
+
+        self.table = QTableView()
+        self.table.setModel(self.proxy)
+        self.table.setEditTriggers(QTableView.NoEditTriggers)
+        self.table.setSelectionBehavior(QTableView.SelectRows)
+        self.table.setWordWrap(False)
+        self.table.verticalHeader().setVisible(False)
+        self.table.verticalHeader().setDefaultSectionSize(24)  # Fixed row height keeps scrolling virtual
+        self.table.horizontalHeader().setSectionResizeMode(QHeaderView.Interactive)
+        self.table.horizontalHeader().setStretchLastSection(True)
+        self.table.setStyleSheet(
+            "QHeaderView::section {background-color: #2E2E2E; color: white; font-weight: bold; border: 1px solid #3A3A3A;}"
+            "QTableView {background-color: #1E1E1E; color: white; font-size: 14px; gridline-color: #3A3A3A;}"
+        )
+        layout.addWidget(self.table)
+
+    def show_rows(self, rows, columns=None, highlighted=None):
+        """Display arbitrary rows (e.g. an HDU summary or data preview)."""
+        self.model.set_rows(rows, columns or ["Item", "Value", ""], highlighted)
+        self.table.setColumnWidth(0, 160)
+        self.table.setColumnWidth(1, 320)
+
+    def show_header(self, header, hdu_index=0):
+        """Display the cards of a header; switching cost does not depend on header length."""
+        self.current_header = header
+        self.current_hdu_index = hdu_index
+        self.diff_button.setEnabled(True)
+        self.only_differences_checkbox.setVisible(False)
+        self.only_differences_checkbox.setChecked(False)
+        self.status_label.setVisible(False)
+        self.show_rows(HeaderRows(header), ["Keyword", "Value", "Comment"])
+
+    def show_diff(self, header_b, label_b):
+        """Display the current header side by side with another one."""
+        rows, differing = diff_rows(self.current_header, header_b)
+        self.show_rows(rows, ["Keyword", "This File", label_b], differing)
+        self.only_differences_checkbox.setVisible(True)
+        self.status_label.setText(f"{len(differing)} of {len(rows)} cards differ")
+        self.status_label.setVisible(True)
+
+    def select_diff_file(self):
+        """Pick another FITS file and diff the header of the same HDU."""
+        if self.current_header is None:
+            return
+        file_path, _ = QFileDialog.getOpenFileName(
+            self, "Select FITS File to Compare", "", "FITS Files (*.fits *.fit *.fts *.fz);;All Files (*)"
+        )
+        if not file_path:
+            return
+        try:
+            header_b = fits.getheader(file_path, self.current_hdu_index)
+        except Exception as e:
+            self.status_label.setText(f"Error reading header: {e}")
+            self.status_label.setVisible(True)
+            return
+        self.show_diff(header_b, os.path.basename(file_path))
+
+    def clear(self):
+        """Remove all rows."""
+        self.current_header = None
+        self.diff_button.setEnabled(False)
+        self.only_differences_checkbox.setVisible(False)
+        self.status_label.setVisible(False)
+        self.model.set_rows([])
@@ -0,0 +1,158 @@
+from PyQt5.QtWidgets import QGraphicsView, QGraphicsScene, QGraphicsItem, QStyleOptionGraphicsItem
+from PyQt5.QtGui import QImage, QPainter, QTransform, QColor
+from PyQt5.QtCore import Qt, QRectF, pyqtSignal
+import numpy as np
+
+
+class ZoomableGraphicsView(QGraphicsView):
+    """QGraphicsView with wheel zoom around the cursor and drag-to-pan."""
+    view_changed = pyqtSignal()
+
+    MIN_ZOOM = 1 / 64
+    MAX_ZOOM = 32
+
+    def __init__(self, scene=None, parent=None):
+        super().__init__(parent)
+        self.setScene(scene if scene is not None else QGraphicsScene(self))
+        self.setRenderHint(QPainter.SmoothPixmapTransform)
+        self.setDragMode(QGraphicsView.ScrollHandDrag)
+        self.setTransformationAnchor(QGraphicsView.AnchorUnderMouse)
+        self.setResizeAnchor(QGraphicsView.AnchorViewCenter)
+        self.setViewportUpdateMode(QGraphicsView.SmartViewportUpdate)
+        self.setBackgroundBrush(QColor("#2B2B2B"))
+        self.setStyleSheet("border: none;")
+
+        # Notify listeners (tile loaders, overlays) whenever the visible area moves
+        self.horizontalScrollBar().valueChanged.connect(self.view_changed.emit)
+        self.verticalScrollBar().valueChanged.connect(self.view_changed.emit)
+
+    def zoom_level(self):
+        """Return the current view scale (screen pixels per scene unit)."""
+        return self.transform().m11()
+
+    def wheelEvent(self, event):
+        """Zoom in or out around the cursor position."""
+        factor = 1.25 if event.angleDelta().y() > 0 else 0.8
+        new_zoom = self.zoom_level() * factor
+        if self.MIN_ZOOM <= new_zoom <= self.MAX_ZOOM:
+            self.scale(factor, factor)
+            self.view_changed.emit()
+
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        self.view_changed.emit()
+
+    def fit_to_window(self):
+        """Scale the view so the whole scene fits in the viewport."""
+        rect = self.scene().itemsBoundingRect()
+        if not rect.isEmpty():
+            self.fitInView(rect, Qt.KeepAspectRatio)
+            self.view_changed.emit()
+
+    def visible_scene_rect(self):
+        """Return the part of the scene currently shown in the viewport."""
+        return self.mapToScene(self.viewport().rect()).boundingRect()
+
+    def mouseDoubleClickEvent(self, event):
+        """Double-click resets the view to fit the image."""
+        self.fit_to_window()
+
+
+class LODImageItem(QGraphicsItem):
+    """
+    Graphics item that paints an RGB uint8 array directly as a QImage.
+
+    The full-resolution QImage wraps the array buffer without copying. Downsampled
+    levels (2x, 4x, ...) are built on first use and cached, so zoomed-out views
+    paint from a small image instead of resampling the full frame every time.
+    """
+
+    def __init__(self, rgb_image, flip_vertical=False):
+        super().__init__()
+        self.setFlag(QGraphicsItem.ItemUsesExtendedStyleOption)  # Needed for a precise exposedRect
+        self._levels = {}
+        self._buffers = {}  # Keep the arrays alive while their QImages are in use
+        self.set_image(rgb_image, flip_vertical)
+
+    def set_image(self, rgb_image, flip_vertical=False):
+        """Replace the displayed image with a new (H, W, 3) uint8 array."""
+        self.prepareGeometryChange()
+        rgb_image = np.ascontiguousarray(rgb_image, dtype=np.uint8)  # No copy for make_lupton_rgb output
+        self.height, self.width = rgb_image.shape[:2]
+        self._levels.clear()
+        self._buffers.clear()
+        self._buffers[0] = rgb_image
+        self._levels[0] = self._wrap(rgb_image)
+
+        # Display with origin at the bottom (FITS convention) by flipping the item, not the data
+        if flip_vertical:
+            self.setTransform(QTransform(1, 0, 0, -1, 0, self.height))
+        else:
+            self.setTransform(QTransform())
+        self.update()
+
+    @staticmethod
+    def _wrap(array):
+        """Wrap a contiguous (H, W, 3) uint8 array as a QImage sharing its memory."""
+        height, width = array.shape[:2]
+        return QImage(array.data, width, height, array.strides[0], QImage.Format_RGB888)
+
+    def _level(self, level):
+        """Return (QImage, level) for the requested pyramid level, building missing levels on demand."""
+        current = max(key for key in self._levels if key <= level)
+        while current < level:
+            parent = self._buffers[current]
+            h, w = (parent.shape[0] // 2) * 2, (parent.shape[1] // 2) * 2
+            if h == 0 or w == 0:
+                break
+            # 2x2 block average of the previous level
+            blocks = parent[:h, :w].reshape(h // 2, 2, w // 2, 2, 3).astype(np.uint16)
+            current += 1
+            self._buffers[current] = (blocks.sum(axis=(1, 3)) // 4).astype(np.uint8)
+            self._levels[current] = self._wrap(self._buffers[current])
+        return self._levels[current], current
+
+    def boundingRect(self):
+        return QRectF(0, 0, self.width, self.height)
+
+    def paint(self, painter, option, widget=None):
+        # Pick the coarsest level that still has at least one image pixel per screen pixel
+        lod = QStyleOptionGraphicsItem.levelOfDetailFromTransform(painter.worldTransform())
+        level = 0
+        while lod > 0 and lod * (2 ** (level + 1)) <= 1 and min(self.width, self.height) >> (level + 1) > 0:
+            level += 1
+
+        image, level = self._level(level)
+        factor = 2 ** level
+
+        # Only draw the exposed part of the image
+        target = option.exposedRect.intersected(self.boundingRect())
+        if target.isEmpty():
+            return
+        source = QRectF(target.x() / factor, target.y() / factor, target.width() / factor, target.height() / factor)
+        painter.drawImage(target, image, source)
+
+
+class CompositeImageView(ZoomableGraphicsView):
+    """Pan/zoom viewer for composite RGB images backed by an LODImageItem."""
+
+    def __init__(self, parent=None):
+        super().__init__(parent=parent)
+        self.image_item = None
+
+    def display_image(self, rgb_image):
+        """Display an (H, W, 3) uint8 image with its origin at the lower left."""
+        if self.image_item is None:
+            self.image_item = LODImageItem(rgb_image, flip_vertical=True)
+            self.scene().addItem(self.image_item)
+        else:
+            self.image_item.set_image(rgb_image, flip_vertical=True)
+        self.scene().setSceneRect(self.image_item.sceneBoundingRect())
+        self.fit_to_window()
+
+    def reset_canvas(self):
+        """Remove the displayed image."""
+        if self.image_item is not None:
+            self.scene().removeItem(self.image_item)
+            self.image_item = None
+        self.resetTransform()
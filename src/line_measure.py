@@ -0,0 +1,222 @@
+import csv
+import itertools
+import numpy as np
+
+from spectral_stack import read_spectrum, common_grid, resample_chunk, LOGLAM_STEP, CHUNK_SPECTRA
+
+
+# Default line list: name, rest vacuum wavelength and the feature, blue continuum and red continuum windows (Angstrom)
+DEFAULT_LINES = [
+    ("MgII_2799", 2799.49, 2780, 2820, 2700, 2750, 2850, 2900),
+    ("OII_3728", 3728.48, 3716, 3740, 3680, 3710, 3750, 3780),
+    ("NeIII_3870", 3869.86, 3860, 3880, 3840, 3855, 3885, 3900),
+    ("CaII_K_3934", 3934.78, 3924, 3944, 3895, 3915, 3995, 4015),
+    ("CaII_H_3969", 3969.59, 3960, 3980, 3895, 3915, 3995, 4015),
+    ("Hdelta_4102", 4102.89, 4083, 4122, 4041, 4079, 4128, 4161),
+    ("Hgamma_4341", 4341.68, 4320, 4360, 4280, 4310, 4370, 4400),
+    ("HeII_4687", 4687.02, 4677, 4697, 4650, 4670, 4705, 4725),
+    ("Hbeta_4863", 4862.68, 4852, 4872, 4800, 4840, 4880, 4920),
+    ("OIII_4960", 4960.30, 4950, 4970, 4920, 4945, 4980, 4995),
+    ("OIII_5008", 5008.24, 4998, 5018, 4980, 4995, 5030, 5060),
+    ("Mgb_5177", 5176.70, 5160, 5195, 5140, 5155, 5200, 5215),
+    ("NaD_5896", 5895.92, 5880, 5910, 5850, 5875, 5920, 5945),
+    ("OI_6302", 6302.05, 6292, 6312, 6260, 6285, 6320, 6345),
+    ("NII_6550", 6549.86, 6542, 6556, 6500, 6530, 6600, 6630),
+    ("Halpha_6565", 6564.61, 6556, 6573, 6500, 6530, 6600, 6630),
+    ("NII_6585", 6585.27, 6578, 6593, 6500, 6530, 6600, 6630),
+    ("SII_6718", 6718.29, 6710, 6724, 6680, 6700, 6750, 6770),
+    ("SII_6733", 6732.67, 6726, 6740, 6680, 6700, 6750, 6770),
+    ("CaT_8542", 8542.09, 8530, 8555, 8500, 8520, 8565, 8585),
+]
+
+# Quantities measured for every line, in export order
+QUANTITIES = ["flux", "flux_error", "continuum", "equivalent_width", "centroid", "coverage"]
+
+
+def load_line_list(file_path):
+    """
+    Read a line list from a CSV file with the columns of DEFAULT_LINES
+    (name, center, feature_min, feature_max, blue_min, blue_max, red_min, red_max; a header row is optional).
+
+    Returns:
+        list: Line tuples.
+    """
+    lines = []
+    with open(file_path, newline="") as f:
+        for row in csv.reader(f):
+            if not row or row[0].startswith("#"):
+                continue
+            try:
+                lines.append((row[0].strip(), *(float(value) for value in row[1:8])))
+            except ValueError:
+                continue  # Header row
+    if not lines:
+        raise ValueError(f"No lines found in {file_path}.")
+    return lines
+
+
+def line_weights(lines, grid):
+    """
+    Build the (pixels x lines) weight matrices that turn a spectrum matrix into line measurements.
+
+    The continuum under a line is the straight line through the mean flux of the
+    blue and red bands, so its integral over the feature window is linear in the
+    two band means; every quantity is then a sum of matrix products.
+
+    Returns:
+        dict: Weight matrices, plus the line centers and their position between the two bands.
+    """
+    wavelength = 10 ** grid
+    width = wavelength * np.log(10) * (grid[1] - grid[0])  # Pixel width in Angstrom
+    table = np.array([line[1:] for line in lines], dtype=np.float64).T  # (7, lines)
+    center, feature_min, feature_max, blue_min, blue_max, red_min, red_max = table
+
+    def window(low, high):
+        return ((wavelength[:, None] >= low) & (wavelength[:, None] <= high)).astype(np.float64)
+
+    feature, blue, red = window(feature_min, feature_max), window(blue_min, blue_max), window(red_min, red_max)
+    blue_center, red_center = (blue_min + blue_max) / 2, (red_min + red_max) / 2
+    t = (wavelength[:, None] - blue_center) / (red_center - blue_center)  # 0 at the blue band, 1 at the red band
+    feature_width = feature * width[:, None]
+    offset = wavelength[:, None] - center
+
+    weights = {
+        "blue": blue, "red": red, "feature": feature,
+        "flux": feature_width,
+        "flux_variance": feature * width[:, None] ** 2,
+        "continuum_blue": feature_width * (1 - t),
+        "continuum_red": feature_width * t,
+        # First moments about the line center, which keeps float32 sums well conditioned
+        "moment": feature_width * offset,
+        "moment_blue": feature_width * offset * (1 - t),
+        "moment_red": feature_width * offset * t,
+    }
+    weights = {key: value.astype(np.float32) for key, value in weights.items()}
+    weights["center_t"] = (center - blue_center) / (red_center - blue_center)
+    weights["center"] = center
+    return weights
+
+
+def measure_matrix(flux, ivar, weights):
+    """
+    Measure every line in every spectrum of a (spectra x pixels) matrix on the weights' grid.
+
+    Masked pixels (zero ivar) are left out of the continuum bands and count as
+    continuum inside the feature window. Line flux is the integral of flux minus
+    continuum over the feature window (in flux units times Angstrom), the
+    equivalent width is that flux over the continuum at the line center
+    (positive for emission), and the centroid is the flux-weighted mean
+    wavelength of the continuum-subtracted feature.
+
+    Returns:
+        dict: (spectra x lines) arrays for each of QUANTITIES.
+    """
+    valid = (ivar > 0).astype(np.float32)
+    flux = flux * valid
+    with np.errstate(divide="ignore", invalid="ignore"):
+        variance = np.where(ivar > 0, 1 / ivar, 0).astype(np.float32)
+
+        blue_count, red_count = valid @ weights["blue"], valid @ weights["red"]
+        blue_level = (flux @ weights["blue"]) / blue_count
+        red_level = (flux @ weights["red"]) / red_count
+
+        blue_area, red_area = valid @ weights["continuum_blue"], valid @ weights["continuum_red"]
+        line_flux = flux @ weights["flux"] - blue_level * blue_area - red_level * red_area
+        # Feature pixel noise plus the noise of the two band means, scaled by their share of the continuum
+        flux_variance = (
+            variance @ weights["flux_variance"]
+            + blue_area ** 2 * (variance @ weights["blue"]) / blue_count ** 2
+            + red_area ** 2 * (variance @ weights["red"]) / red_count ** 2
+        )
+        moment = (
+            flux @ weights["moment"]
+            - blue_level * (valid @ weights["moment_blue"])
+            - red_level * (valid @ weights["moment_red"])
+        )
+        continuum = blue_level + (red_level - blue_level) * weights["center_t"]
+        feature_pixels = weights["feature"].sum(axis=0)
+        band_pixels = weights["blue"].sum(axis=0) + weights["red"].sum(axis=0)
+
+        results = {
+            "flux": line_flux,
+            "flux_error": np.sqrt(flux_variance),
+            "continuum": continuum,
+            "equivalent_width": line_flux / continuum,
+            "centroid": np.where(line_flux != 0, weights["center"] + moment / line_flux, np.nan),
+            "coverage": ((valid @ weights["feature"]) + blue_count + red_count) / (feature_pixels + band_pixels),
+        }
+    measured = (blue_count > 0) & (red_count > 0) & (feature_pixels > 0)
+    for key in QUANTITIES:
+        if key != "coverage":
+            results[key] = np.where(measured, results[key], np.nan).astype(np.float32)
+    results["coverage"] = results["coverage"].astype(np.float32)
+    return results
+
+
+def measure_lines(spectra, lines=DEFAULT_LINES, rest_frame=True, chunk_size=CHUNK_SPECTRA, progress_callback=None):
+    """
+    Measure a line list in many spectra.
+
+    Spectra are consumed chunk by chunk from any iterable (so tens of thousands
+    can be streamed from disk), resampled onto a rest-frame grid covering the
+    line list, and measured with a few matrix products per chunk.
+
+    Parameters:
+        spectra (iterable): Dictionaries as returned by spectral_stack.read_spectrum.
+        lines (list): Line tuples as in DEFAULT_LINES.
+        rest_frame (bool): Shift each spectrum by its redshift and scale its flux density by (1 + z);
+            spectra without one get NaN results.
+        progress_callback (callable): Called with the number of spectra measured so far.
+
+    Returns:
+        dict: (spectra x lines) float32 arrays for each of QUANTITIES.
+    """
+    low = min(min(line[2], line[4]) for line in lines)
+    high = max(max(line[3], line[7]) for line in lines)
+    grid = common_grid(np.log10(low) - LOGLAM_STEP, np.log10(high) + 2 * LOGLAM_STEP)
+    weights = line_weights(lines, grid)
+
+    parts = {key: [] for key in QUANTITIES}
+    spectra, measured = iter(spectra), 0
+    while True:
+        chunk = list(itertools.islice(spectra, chunk_size))
+        if not chunk:
+            break
+        flux, ivar = resample_chunk(chunk, grid, rest_frame)
+        if rest_frame:
+            # Flux density per rest-frame Angstrom is (1 + z) times that per observed Angstrom
+            z = np.array([np.nan if spectrum.get("z") is None else spectrum["z"] for spectrum in chunk])
+            scale = np.where(np.isnan(z), 1, 1 + z).astype(np.float32)[:, None]
+            flux *= scale
+            ivar /= scale ** 2
+            ivar[np.isnan(z)] = 0
+        results = measure_matrix(flux, ivar, weights)
+        for key in QUANTITIES:
+            parts[key].append(results[key])
+        measured += len(chunk)
+        if progress_callback:
+            progress_callback(measured)
+
+    return {
+        key: np.concatenate(values) if values else np.empty((0, len(lines)), dtype=np.float32)
+        for key, values in parts.items()
+    }
+
+
+def measure_files(file_paths, lines=DEFAULT_LINES, rest_frame=True, progress_callback=None):
+    """
+    Measure a line list in spectrum files, read lazily one chunk at a time.
+
+    Returns:
+        dict: As measure_lines.
+    """
+    return measure_lines((read_spectrum(path) for path in file_paths), lines, rest_frame, progress_callback=progress_callback)
+
+
+def write_line_table(file_path, names, lines, results):
+    """Export measurements as CSV, one row per spectrum and one column per line and quantity."""
+    with open(file_path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["spectrum"] + [f"{line[0]}_{key}" for line in lines for key in QUANTITIES])
+        for row, name in enumerate(names):
+            writer.writerow([name] + [f"{results[key][row, column]:.6g}" for column in range(len(lines)) for key in QUANTITIES])
@@ -0,0 +1,163 @@
+from PyQt5.QtWidgets import (
+    QWidget, QVBoxLayout, QHBoxLayout, QLabel, QPushButton, QCheckBox, QProgressBar, QTableWidget,
+    QTableWidgetItem, QHeaderView
+)
+from PyQt5.QtCore import Qt, QThread, pyqtSignal
+from PyQt5.QtGui import QColor
+import os
+import time
+
+from utilities import get_data_dir
+from download_manager import format_bytes
+
+
+STATUS_COLORS = {"corrupt": "#C0392B", "suspect": "#B9770E"}
+
+
+class QualityScanThread(QThread):
+    progress_signal = pyqtSignal(int)
+    finished_signal = pyqtSignal(int, float)  # Files checked (-1 on failure), seconds taken
+
+    def __init__(self, index, root, rescan=False):
+        super().__init__()
+        self.index = index
+        self.root = root
+        self.rescan = rescan
+
+    def run(self):
+        start = time.time()
+        try:
+            checked = self.index.update_quality(self.root, progress_callback=self.progress_signal.emit, rescan=self.rescan)
+        except Exception as e:
+            print(f"Error scanning {self.root}: {e}")
+            checked = -1
+        self.finished_signal.emit(checked, time.time() - start)
+
+
+class SortItem(QTableWidgetItem):
+    """Table item that sorts by a raw value instead of its display text."""
+
+    def __init__(self, text, value):
+        super().__init__(text)
+        self.value = value
+
+    def sort_key(self):
+        return (self.value is not None, self.value if self.value is not None else 0)
+
+    def __lt__(self, other):
+        if isinstance(other, SortItem):
+            # Missing values sort before everything else
+            return self.sort_key() < other.sort_key()
+        return super().__lt__(other)
+
+
+class QualityReportView(QWidget):
+    """Sortable integrity and quality report of the frames under the data root."""
+    file_activated = pyqtSignal(str)  # Path of a double-clicked row
+
+    COLUMNS = ["File", "Band", "MJD", "Size", "Status", "Checksum", "Sky", "Noise", "Saturated", "NaN", "Problems"]
+
+    def __init__(self, index, parent=None):
+        super().__init__(parent)
+        self.index = index
+        self.scan_thread = None
+
+        layout = QVBoxLayout(self)
+        layout.setContentsMargins(0, 0, 0, 0)
+
+        controls = QHBoxLayout()
+        self.summary_label = QLabel("")
+        self.summary_label.setStyleSheet("color: white; font-size: 14px;")
+        controls.addWidget(self.summary_label, stretch=1)
+
+        self.rescan_checkbox = QCheckBox("Recheck unchanged files")
+        self.rescan_checkbox.setStyleSheet("color: white; font-size: 14px;")
+        controls.addWidget(self.rescan_checkbox)
+
+        self.scan_button = QPushButton("Scan Archive")
+        self.scan_button.setStyleSheet("background-color: #5A9; color: white; font-weight: bold; padding: 5px;")
+        self.scan_button.clicked.connect(self.start_scan)
+        controls.addWidget(self.scan_button)
+        layout.addLayout(controls)
+
+        self.progress_bar = QProgressBar()
+        self.progress_bar.setStyleSheet("QProgressBar {background-color: #3A3A3A; border: none;} QProgressBar::chunk {background-color: #5A9;}")
+        self.progress_bar.setVisible(False)
+        layout.addWidget(self.progress_bar)
+
+        self.table = QTableWidget(0, len(self.COLUMNS))
+        self.table.setHorizontalHeaderLabels(self.COLUMNS)
+        self.table.setEditTriggers(QTableWidget.NoEditTriggers)
+        self.table.setSelectionBehavior(QTableWidget.SelectRows)
+        self.table.verticalHeader().setVisible(False)
+        self.table.horizontalHeader().setSectionResizeMode(0, QHeaderView.Stretch)
+        self.table.setStyleSheet(
+            "QHeaderView::section {background-color: #2E2E2E; color: white; font-weight: bold; border: 1px solid #3A3A3A;}"
+            "QTableWidget {background-color: #1E1E1E; color: white; font-size: 13px; gridline-color: #3A3A3A;}"
+        )
+        self.table.cellDoubleClicked.connect(self.activate_row)
+        layout.addWidget(self.table)
+
+        self.refresh()
+
+    def start_scan(self):
+        """Check every FITS file under the data root in a background process pool."""
+        if self.scan_thread is not None:
+            return
+        self.scan_button.setEnabled(False)
+        self.progress_bar.setValue(0)
+        self.progress_bar.setVisible(True)
+        self.summary_label.setText("Scanning...")
+        self.scan_thread = QualityScanThread(self.index, get_data_dir(), self.rescan_checkbox.isChecked())
+        self.scan_thread.progress_signal.connect(self.progress_bar.setValue)
+        self.scan_thread.finished_signal.connect(self.on_scan_complete)
+        self.scan_thread.start()
+
+    def on_scan_complete(self, checked, seconds):
+        self.scan_thread = None
+        self.scan_button.setEnabled(True)
+        self.progress_bar.setVisible(False)
+        self.refresh()
+        if checked < 0:
+            self.summary_label.setText("<span style='color: red;'>Scan failed.</span>")
+        else:
+            self.summary_label.setText(f"{self.summary_label.text()} - {checked} file(s) checked in {seconds:.1f} s")
+
+    def refresh(self):
+        """Reload the report from the index."""
+        rows = self.index.quality_report()
+        data_dir = get_data_dir()
+
+        self.table.setSortingEnabled(False)  # Sorting while filling would reorder rows mid-insert
+        self.table.setRowCount(len(rows))
+        for row_index, row in enumerate(rows):
+            values = [
+                (os.path.relpath(row["path"], data_dir), row["path"]),
+                (row["band"] or "", row["band"]),
+                (f"{row['mjd']:.2f}" if row["mjd"] is not None else "", row["mjd"]),
+                (format_bytes(row["size"]), row["size"]),
+                (row["status"], row["status"]),
+                (row["checksum"], row["checksum"]),
+                (f"{row['sky']:.4g}" if row["sky"] is not None else "", row["sky"]),
+                (f"{row['noise']:.4g}" if row["noise"] is not None else "", row["noise"]),
+                (f"{row['saturated']:.2%}" if row["saturated"] is not None else "", row["saturated"]),
+                (f"{row['nan_fraction']:.2%}" if row["nan_fraction"] is not None else "", row["nan_fraction"]),
+                (row["problems"], row["problems"]),
+            ]
+            color = STATUS_COLORS.get(row["status"])
+            for column, (text, value) in enumerate(values):
+                item = SortItem(text, value)
+                if column == 0:
+                    item.setData(Qt.UserRole, row["path"])
+                if color:
+                    item.setBackground(QColor(color))
+                self.table.setItem(row_index, column, item)
+        self.table.setSortingEnabled(True)
+
+        counts = {status: sum(row["status"] == status for row in rows) for status in ("ok", "suspect", "corrupt")}
+        self.summary_label.setText(
+            f"{len(rows)} file(s): {counts['ok']} ok, {counts['suspect']} suspect, {counts['corrupt']} corrupt"
+        )
+
+    def activate_row(self, row, column):
+        self.file_activated.emit(self.table.item(row, 0).data(Qt.UserRole))
@@ -1,10 +1,12 @@
 from PyQt5.QtWidgets import (
     QFrame, QVBoxLayout, QHBoxLayout, QLabel, QTabWidget, QWidget, QLineEdit, QPushButton, QFileDialog, QGridLayout, QCheckBox, QMessageBox, 
-    QGraphicsView, QGraphicsScene, QGraphicsPixmapItem, QGraphicsRectItem
+    QGraphicsRectItem
 )
-from PyQt5.QtGui import QPixmap, QImage, QPen
+from PyQt5.QtGui import QPen
 from PyQt5.QtCore import Qt
-from utilities import validate_ra_dec, fetch_sdss_image, get_object_id, get_object_details, get_run_rerun_camcol_field
+from utilities import validate_ra_dec, get_object_id, get_object_details
+from field_index import locate_run_rerun_camcol_field
+from sky_tiles import SkyTileView
 
 
 class StyledMessageBox(QMessageBox):
@@ -21,15 +23,10 @@ class QuickLook(QWidget):
     def __init__(self, parent_tab_widget):
         super().__init__()
         self.parent_tab_widget = parent_tab_widget
-        self.tab_image_mapping = {}
-        self.tab_scene_mapping = {}  # Map tab indices to QGraphicsScenes
-        self.tab_view_mapping = {}   # Map tab indices to QGraphicsViews
-        self.overlay_item_mapping = {}  # Map tab indices to overlay items
-        
-        # Initialize QGraphicsScene and QGraphicsView
-        self.scene = QGraphicsScene()
-        self.view = QGraphicsView(self.scene)  # Link the view to the scene
-        self.image_item = None
+
+        # Tiled sky view, refilled as it pans and zooms
+        self.sky_view = SkyTileView()
+        self.sky_view.sky_clicked.connect(self.set_position)
         self.overlay_item = None
         
         layout = QVBoxLayout(self)
@@ -57,7 +54,8 @@ class QuickLook(QWidget):
         center_section.tabBar().setVisible(False)
         center_section.tabCloseRequested.connect(self.parent_tab_widget.tabCloseRequested)
         main_layout.addWidget(center_section, stretch=3)
-        self.quick_look_center_section = center_section  # Save reference for dynamic tab updates
+        self.quick_look_center_section = center_section
+        center_section.addTab(self.sky_view, "Sky")
 
         # Right Section
         right_section = QFrame(main_frame)
@@ -218,134 +216,84 @@ class QuickLook(QWidget):
             print("Please enter valid numerical values.")
             return
 
-        # Fetch the SDSS image
-        image = fetch_sdss_image(ra, dec, scale, width, height)
-        if image:
-            try:
-                # Convert the fetched image to QPixmap
-                qimage = QImage(image.tobytes("raw", "RGB"), image.width, image.height, QImage.Format_RGB888)
-                pixmap = QPixmap.fromImage(qimage)
-
-                # Create a new scene and add the image
-                scene = QGraphicsScene()
-                image_item = QGraphicsPixmapItem(pixmap)
-                scene.addItem(image_item)
-
-                # Create a new view for the scene
-                view = QGraphicsView(scene)
-
-                # Create a new tab and add the view
-                new_tab = QWidget()
-                layout = QVBoxLayout(new_tab)
-                layout.addWidget(view)
-
-                tab_index = self.quick_look_center_section.addTab(new_tab, f"RA: {ra}, DEC: {dec}")
-                self.quick_look_center_section.setCurrentIndex(tab_index)
-
-                # Map the scene, view, and overlay for the current tab
-                self.tab_scene_mapping[tab_index] = scene
-                self.tab_view_mapping[tab_index] = view
-                self.overlay_item_mapping[tab_index] = None
-
-                # Fetch metadata and update the right section
-                obj_id = get_object_id(ra, dec)
-                if obj_id:
-                    details = get_object_details(obj_id)
-                    run, rerun, camcol, field = get_run_rerun_camcol_field(details['ra'], details['dec'])
-
-                    self.object_id_value.setText(str(obj_id))
-                    self.ra_value.setText(f"{details['ra']:.5f}" if details["ra"] else "Not Retrieved")
-                    self.dec_value.setText(f"{details['dec']:.5f}" if details["dec"] else "Not Retrieved")
-                    for band in ["u", "g", "r", "i", "z"]:
-                        getattr(self, f"{band}_value").setText(f"{details[band]:.2f}" if details[band] else "Not Retrieved")
-                    self.run_value.setText(str(run) if run else "Not Retrieved")
-                    self.rerun_value.setText(str(rerun) if rerun else "Not Retrieved")
-                    self.camcol_value.setText(str(camcol) if camcol else "Not Retrieved")
-                    self.field_value.setText(str(field) if field else "Not Retrieved")
-                    self.specobj_id_value.setText(str(details['specObjID']) if details['specObjID'] else "Not Retrieved")
-                    self.class_value.setText(details['class'] if details['class'] else "Not Retrieved")
-                    self.redshift_value.setText(f"{details['redshift']:.5f}" if details['redshift'] else "Not Retrieved")
-                else:
-                    self.object_id_value.setText("Not Retrieved")
-                    self.ra_value.setText("Not Retrieved")
-                    self.dec_value.setText("Not Retrieved")
-                    for band in ["u", "g", "r", "i", "z"]:
-                        getattr(self, f"{band}_value").setText("Not Retrieved")
-                    self.run_value.setText("Not Retrieved")
-                    self.rerun_value.setText("Not Retrieved")
-                    self.camcol_value.setText("Not Retrieved")
-                    self.field_value.setText("Not Retrieved")
-                    self.specobj_id_value.setText("Not Retrieved")
-                    self.class_value.setText("Not Retrieved")
-                    self.redshift_value.setText("Not Retrieved")
-                    
-                self.save_button.setEnabled(True)
-            except Exception as e:
-                print(f"Error displaying image: {e}")
-        else:
-            print("Failed to fetch image.")
-
-            
-    def toggle_overlay(self):
-        # Get the current tab index
-        current_index = self.quick_look_center_section.currentIndex()
-        if current_index == -1 or current_index not in self.tab_scene_mapping:
+        if not validate_ra_dec(ra, dec):
+            print("RA must be between 0 and 360 and DEC between -90 and 90.")
             return
 
-        # Get the associated scene for the current tab
-        scene = self.tab_scene_mapping[current_index]
+        # Center the tiled view on the position; tiles are fetched as the view needs them
+        try:
+            self.sky_view.show_position(ra, dec, scale, width, height)
+            self.toggle_overlay()
+
+            # Fetch metadata and update the right section
+            obj_id = get_object_id(ra, dec)
+            if obj_id:
+                details = get_object_details(obj_id)
+                run, rerun, camcol, field = locate_run_rerun_camcol_field(details['ra'], details['dec'])
+
+                self.object_id_value.setText(str(obj_id))
+                self.ra_value.setText(f"{details['ra']:.5f}" if details["ra"] else "Not Retrieved")
+                self.dec_value.setText(f"{details['dec']:.5f}" if details["dec"] else "Not Retrieved")
+                for band in ["u", "g", "r", "i", "z"]:
+                    getattr(self, f"{band}_value").setText(f"{details[band]:.2f}" if details[band] else "Not Retrieved")
+                self.run_value.setText(str(run) if run else "Not Retrieved")
+                self.rerun_value.setText(str(rerun) if rerun else "Not Retrieved")
+                self.camcol_value.setText(str(camcol) if camcol else "Not Retrieved")
+                self.field_value.setText(str(field) if field else "Not Retrieved")
+                self.specobj_id_value.setText(str(details['specObjID']) if details['specObjID'] else "Not Retrieved")
+                self.class_value.setText(details['class'] if details['class'] else "Not Retrieved")
+                self.redshift_value.setText(f"{details['redshift']:.5f}" if details['redshift'] else "Not Retrieved")
+            else:
+                self.object_id_value.setText("Not Retrieved")
+                self.ra_value.setText("Not Retrieved")
+                self.dec_value.setText("Not Retrieved")
+                for band in ["u", "g", "r", "i", "z"]:
+                    getattr(self, f"{band}_value").setText("Not Retrieved")
+                self.run_value.setText("Not Retrieved")
+                self.rerun_value.setText("Not Retrieved")
+                self.camcol_value.setText("Not Retrieved")
+                self.field_value.setText("Not Retrieved")
+                self.specobj_id_value.setText("Not Retrieved")
+                self.class_value.setText("Not Retrieved")
+                self.redshift_value.setText("Not Retrieved")
+                
+            self.save_button.setEnabled(True)
+        except Exception as e:
+            print(f"Error displaying image: {e}")
+
+    def set_position(self, ra, dec):
+        """Fill the RA/DEC fields with a position picked on the sky view."""
+        self.ra_entry.setText(f"{ra:.6f}")
+        self.dec_entry.setText(f"{dec:.6f}")
+
+    def toggle_overlay(self):
+        if self.sky_view.layer is None:
+            return
+        scene = self.sky_view.scene()
 
         # Remove the existing overlay if present
-        if self.overlay_item_mapping[current_index]:
-            scene.removeItem(self.overlay_item_mapping[current_index])
-            self.overlay_item_mapping[current_index] = None
+        if self.overlay_item is not None:
+            scene.removeItem(self.overlay_item)
+            self.overlay_item = None
 
-        # Add overlay if the checkbox is checked
+        # Mark the fetched position, at the center of the tangent plane
         if self.label_checkbox.isChecked():
-            # Get the image item from the scene
-            image_item = next((item for item in scene.items() if isinstance(item, QGraphicsPixmapItem)), None)
-            if not image_item:
-                return
-
-            # Get the dimensions of the pixmap
-            pixmap = image_item.pixmap()
-            pixmap_width = pixmap.width()
-            pixmap_height = pixmap.height()
-
-            # Calculate the center of the pixmap
-            center_x = pixmap_width // 2
-            center_y = pixmap_height // 2
-            box_size = 50  # Size of the overlay box
-
-            # Create a rectangle for the overlay
-            rect = QGraphicsRectItem(
-                center_x - box_size // 2, center_y - box_size // 2, box_size, box_size
-            )
-            rect.setPen(QPen(Qt.green, 3))  # Green border with thickness 3
-
-            # Add the rectangle to the scene and map it
+            box_size = 50  # Size of the overlay box in base-scale pixels
+            rect = QGraphicsRectItem(-box_size / 2, -box_size / 2, box_size, box_size)
+            pen = QPen(Qt.green, 3)  # Green border with thickness 3
+            pen.setCosmetic(True)  # Same thickness at every zoom
+            rect.setPen(pen)
+            rect.setZValue(1)
             scene.addItem(rect)
-            self.overlay_item_mapping[current_index] = rect
+            self.overlay_item = rect
 
     def save_image(self):
-        # Get the current tab index
-        current_tab_index = self.quick_look_center_section.currentIndex()
-        if current_tab_index == -1 or current_tab_index not in self.tab_scene_mapping:
+        if self.sky_view.layer is None:
             print("No image to save.")
             return
 
-        # Get the QGraphicsScene and the QGraphicsView associated with the current tab
-        scene = self.tab_scene_mapping[current_tab_index]
-        view = self.tab_view_mapping[current_tab_index]
-
-        # Ensure the scene has an image item
-        image_item = next((item for item in scene.items() if isinstance(item, QGraphicsPixmapItem)), None)
-        if not image_item:
-            print("No image found in the current tab.")
-            return
-
-        # Get the pixmap from the image item
-        pixmap = image_item.pixmap()
+        # Save what the view currently shows
+        pixmap = self.sky_view.viewport().grab()
 
         # Open a file dialog to get the save location and file type
         file_path, _ = QFileDialog.getSaveFileName(
@@ -363,3 +311,8 @@ class QuickLook(QWidget):
                 print("Failed to save the image. Ensure the file path is valid.")
         except Exception as e:
             print(f"Error saving image: {e}")
+
+    def closeEvent(self, event):
+        """Stop tile fetches before closing."""
+        self.sky_view.shutdown()
+        event.accept()
@@ -0,0 +1,183 @@
+import itertools
+import numpy as np
+from astropy.io import fits
+from scipy import ndimage
+
+from spectral_stack import common_grid, resample_chunk, LOGLAM_STEP
+
+
+# Observed log10(wavelength) range covered by SDSS and BOSS spectra
+OBSERVED_LOGLAM = (3.55, 4.02)
+
+# Width of the running mean removed as continuum before correlating (pixels, ~7% in wavelength)
+CONTINUUM_WIDTH = 301
+
+# Memory budget for the batched correlation spectra (bytes)
+CORRELATION_MEMORY = 256 * 1024 ** 2
+
+# Secondary peaks closer than this to a stronger one are treated as part of it (pixels)
+PEAK_SEPARATION = 20
+
+
+def load_templates(file_paths):
+    """
+    Read redshift templates from FITS files.
+
+    A file holds either an image whose rows are templates on the grid
+    loglam = COEFF0 + COEFF1 * pixel (as SDSS spEigen files do), or a binary
+    table with a loglam (or wavelength, in Angstrom) column and a flux column.
+    Templates are rest-frame.
+
+    Returns:
+        list: Dictionaries with "name", "loglam" and "flux".
+    """
+    templates = []
+    for path in file_paths:
+        name = path.replace("\\", "/").split("/")[-1].rsplit(".fits", 1)[0]
+        with fits.open(path) as hdul:
+            hdu = next((hdu for hdu in hdul if hdu.data is not None and hdu.data.size), None)
+            if hdu is None:
+                raise ValueError(f"{path} holds no template data.")
+            if isinstance(hdu, fits.BinTableHDU):
+                columns = {column.lower(): column for column in hdu.columns.names}
+                if "loglam" in columns:
+                    loglam = np.asarray(hdu.data[columns["loglam"]], dtype=np.float64)
+                elif "wavelength" in columns:
+                    loglam = np.log10(np.asarray(hdu.data[columns["wavelength"]], dtype=np.float64))
+                else:
+                    raise ValueError(f"{path} has no loglam or wavelength column.")
+                rows = [np.asarray(hdu.data[columns["flux"]], dtype=np.float64)]
+            else:
+                if "COEFF0" not in hdu.header or "COEFF1" not in hdu.header:
+                    raise ValueError(f"{path} has no COEFF0/COEFF1 wavelength solution.")
+                rows = np.atleast_2d(np.asarray(hdu.data, dtype=np.float64))
+                loglam = hdu.header["COEFF0"] + hdu.header["COEFF1"] * np.arange(rows.shape[1])
+        for index, flux in enumerate(rows):
+            label = name if len(rows) == 1 else f"{name}[{index}]"
+            templates.append({"name": label, "loglam": loglam, "flux": flux})
+    return templates
+
+
+def remove_continuum(flux, valid):
+    """
+    Subtract a running mean of the valid pixels from each row, zero invalid pixels and normalize rows.
+
+    Returns:
+        ndarray: Float32 rows with unit norm (all-zero rows stay zero).
+    """
+    flux = np.where(valid, flux, 0).astype(np.float32)
+    weight = valid.astype(np.float32)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        continuum = ndimage.uniform_filter1d(flux, CONTINUUM_WIDTH, axis=1, mode="nearest") / \
+            ndimage.uniform_filter1d(weight, CONTINUUM_WIDTH, axis=1, mode="nearest")
+    residual = np.where(valid, flux - np.nan_to_num(continuum), 0)
+    residual *= np.hanning(flux.shape[1]).astype(np.float32)  # Taper the edges so they do not correlate
+    norm = np.sqrt((residual ** 2).sum(axis=1, keepdims=True))
+    return np.divide(residual, norm, out=np.zeros_like(residual), where=norm > 0)
+
+
+def template_matrix(templates, step=LOGLAM_STEP):
+    """
+    Resample templates onto one rest-frame grid and prepare them for correlation.
+
+    Returns:
+        tuple: (grid start loglam, (templates x pixels) float32 matrix)
+    """
+    low = min(template["loglam"][0] for template in templates)
+    high = max(template["loglam"][-1] for template in templates)
+    grid = common_grid(low, high, step)
+    rows = np.empty((len(templates), len(grid)), dtype=np.float32)
+    valid = np.empty(rows.shape, dtype=bool)
+    for row, template in enumerate(templates):
+        rows[row] = np.interp(grid, template["loglam"], template["flux"], left=np.nan, right=np.nan)
+        valid[row] = np.isfinite(rows[row])
+    return grid[0], remove_continuum(rows, valid)
+
+
+def find_redshifts(spectra, templates, z_min=-0.01, z_max=1.5, peaks=3, grid=None, memory_limit=CORRELATION_MEMORY,
+                   progress_callback=None):
+    """
+    Estimate redshifts by cross-correlating spectra with templates in log-wavelength space.
+
+    A redshift is a uniform shift in log wavelength, so every spectrum is
+    correlated with every template at all shifts at once: the spectra and the
+    templates are Fourier transformed once each, multiplied pairwise in one
+    broadcast product and transformed back, a chunk of spectra at a time
+    within the memory budget. Both sides are continuum-subtracted and
+    normalized, so correlation peaks lie between -1 and 1.
+
+    Parameters:
+        spectra (iterable): Dictionaries with loglam, flux, ivar and and_mask (see spectral_stack.read_spectrum).
+        templates (list): Rest-frame templates as returned by load_templates.
+        peaks (int): Number of peaks to report per spectrum (the best one first).
+
+    Returns:
+        list: One dictionary per spectrum with "z", "template", "peak", "significance"
+              (peak height in standard deviations of the correlation) and "peaks"
+              (list of (z, template, peak), the best one first).
+    """
+    grid = common_grid(*OBSERVED_LOGLAM) if grid is None else grid
+    step = grid[1] - grid[0]
+    template_start, template_rows = template_matrix(templates, step)
+    length = 1 << int(np.ceil(np.log2(len(grid) + template_rows.shape[1])))
+    template_spectra = np.conj(np.fft.rfft(template_rows, n=length, axis=1))
+
+    # Lag k aligns spectrum pixel i + k with template pixel i: log10(1 + z) = grid[0] - template_start + k * step
+    lag_min = int(np.floor((np.log10(1 + z_min) - grid[0] + template_start) / step))
+    lag_max = int(np.ceil((np.log10(1 + z_max) - grid[0] + template_start) / step))
+    lags = np.arange(max(lag_min, -template_rows.shape[1] + 1), min(lag_max, len(grid) - 1) + 1)
+    if lags.size < 3:
+        raise ValueError("The redshift range does not overlap the templates and the spectrum grid.")
+
+    chunk_size = max(1, int(memory_limit // (len(templates) * (length // 2 + 1) * 8 * 2)))
+    results, spectra, done = [], iter(spectra), 0
+    while True:
+        chunk = list(itertools.islice(spectra, chunk_size))
+        if not chunk:
+            break
+        flux, ivar = resample_chunk(chunk, grid)
+        rows = remove_continuum(flux, ivar > 0)
+        product = np.fft.rfft(rows, n=length, axis=1)[:, None, :] * template_spectra[None, :, :]
+        correlation = np.fft.irfft(product, n=length, axis=2)[:, :, lags % length]  # (spectra, templates, lags)
+        results += summarize_peaks(correlation, lags, grid[0] - template_start, step, templates, peaks, rows)
+        done += len(chunk)
+        if progress_callback:
+            progress_callback(done)
+    return results
+
+
+def summarize_peaks(correlation, lags, offset, step, templates, peaks, rows):
+    """Pick the best and secondary correlation peaks of each spectrum."""
+    best_template = correlation.argmax(axis=1)  # (spectra, lags)
+    best = correlation.max(axis=1)
+
+    # Local maxima of the best-template correlation, strongest first
+    interior = np.zeros(best.shape, dtype=bool)
+    interior[:, 1:-1] = (best[:, 1:-1] > best[:, :-2]) & (best[:, 1:-1] >= best[:, 2:])
+    candidates = np.argsort(-np.where(interior, best, -np.inf), axis=1)[:, :peaks * 8]
+    spread = best.std(axis=1)
+
+    def redshift(row, index):
+        left, center, right = best[row, index - 1:index + 2]
+        denominator = left - 2 * center + right
+        shift = 0.5 * (left - right) / denominator if denominator else 0.0  # Parabolic sub-pixel refinement
+        return float(10 ** (offset + (lags[index] + shift) * step) - 1)
+
+    results = []
+    for row in range(best.shape[0]):
+        found = []
+        for index in candidates[row]:
+            if not interior[row, index] or len(found) == peaks:
+                break
+            if all(abs(index - other) >= PEAK_SEPARATION for other in found):
+                found.append(index)
+        if not found or not rows[row].any():
+            results.append({"z": np.nan, "template": None, "peak": np.nan, "significance": np.nan, "peaks": []})
+            continue
+        listed = [(redshift(row, index), templates[best_template[row, index]]["name"], float(best[row, index])) for index in found]
+        results.append({
+            "z": listed[0][0], "template": listed[0][1], "peak": listed[0][2],
+            "significance": float((best[row, found[0]] - best[row].mean()) / spread[row]) if spread[row] > 0 else np.nan,
+            "peaks": listed,
+        })
+    return results
@@ -0,0 +1,112 @@
+import numpy as np
+from scipy import ndimage
+
+
+def prepare_cutout(data, size=512, factor=2):
+    """
+    Build a downsampled, star-dominated cutout from the center of a frame.
+
+    The central (size * factor) region is block-averaged by `factor`, the sky is
+    subtracted and everything below a 3-sigma threshold is zeroed so the
+    correlation is driven by point sources rather than background structure.
+    """
+    data = np.asarray(data)
+    height, width = data.shape
+    span_y = min(height, size * factor) // factor * factor
+    span_x = min(width, size * factor) // factor * factor
+    y0, x0 = (height - span_y) // 2, (width - span_x) // 2
+    cutout = data[y0:y0 + span_y, x0:x0 + span_x]
+
+    # Block average with strided slices (avoids a reshape copy of the full cutout)
+    binned = np.zeros((span_y // factor, span_x // factor), dtype=np.float32)
+    for dy in range(factor):
+        for dx in range(factor):
+            binned += cutout[dy::factor, dx::factor]
+    binned = np.nan_to_num(binned / factor ** 2, nan=0.0)
+
+    # Keep only the pixels clearly above the sky (sky statistics from a sparse subsample)
+    sample = binned[::4, ::4]
+    sky = np.median(sample)
+    noise = 1.4826 * np.median(np.abs(sample - sky))
+    cutout = np.clip(binned - sky - 3 * noise, 0, None)
+
+    # Compress the dynamic range so a few bright stars do not dominate, then taper the edges
+    cutout = np.sqrt(cutout)
+    window = np.outer(np.hanning(cutout.shape[0]), np.hanning(cutout.shape[1]))
+    return cutout * window
+
+
+def _parabolic_peak(values):
+    """Sub-pixel offset of a peak from three samples centered on it."""
+    left, center, right = values
+    denominator = left - 2 * center + right
+    if denominator == 0:
+        return 0.0
+    return 0.5 * (left - right) / denominator
+
+
+def phase_correlation(reference, image):
+    """
+    Estimate the translation that aligns `image` to `reference`.
+
+    Returns:
+        tuple: (dy, dx, confidence) where the shift is in cutout pixels and
+               confidence is the height of the normalized correlation peak (0 to 1).
+    """
+    cross_power = np.fft.rfft2(reference) * np.conj(np.fft.rfft2(image))
+    cross_power /= np.abs(cross_power) + 1e-12
+    correlation = np.fft.irfft2(cross_power, s=reference.shape)
+
+    peak_y, peak_x = np.unravel_index(np.argmax(correlation), correlation.shape)
+    height, width = correlation.shape
+
+    # Sub-pixel refinement with a parabola along each axis (wrapping around the edges)
+    dy = peak_y + _parabolic_peak(correlation[[(peak_y - 1) % height, peak_y, (peak_y + 1) % height], peak_x])
+    dx = peak_x + _parabolic_peak(correlation[peak_y, [(peak_x - 1) % width, peak_x, (peak_x + 1) % width]])
+
+    # Shifts beyond half the cutout wrap around to negative offsets
+    if dy > height / 2:
+        dy -= height
+    if dx > width / 2:
+        dx -= width
+
+    return dy, dx, float(correlation[peak_y, peak_x])
+
+
+def estimate_offset(reference_data, data, size=512, factor=2, reference_cutout=None):
+    """
+    Measure the offset of `data` relative to `reference_data` in full-resolution pixels.
+
+    Parameters:
+        reference_cutout (ndarray): Output of prepare_cutout for the reference frame,
+                                    to avoid recomputing it for every channel.
+
+    Returns:
+        tuple: (dy, dx, confidence)
+    """
+    if reference_cutout is None:
+        reference_cutout = prepare_cutout(reference_data, size, factor)
+    cutout = prepare_cutout(data, size, factor)
+    dy, dx, confidence = phase_correlation(reference_cutout, cutout)
+    return dy * factor, dx * factor, confidence
+
+
+def apply_shift(data, dy, dx, shape=None, output=None):
+    """
+    Shift a frame by (dy, dx) pixels with bilinear interpolation in a single pass.
+
+    Parameters:
+        shape (tuple): Shape of the reference frame; the data is cropped or padded to it.
+        output (ndarray): Optional array (e.g. a memory-mapped cache file) to write into.
+
+    Returns:
+        ndarray: The shifted frame.
+    """
+    data = np.nan_to_num(np.asarray(data, dtype=np.float32), nan=0.0)
+    if shape is not None and data.shape != tuple(shape):
+        resized = np.zeros(shape, dtype=np.float32)
+        rows, cols = min(shape[0], data.shape[0]), min(shape[1], data.shape[1])
+        resized[:rows, :cols] = data[:rows, :cols]
+        data = resized
+    result = ndimage.shift(data, (dy, dx), output=output, order=1, mode='constant', cval=0.0)
+    return output if output is not None else result
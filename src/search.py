@@ -9,6 +9,7 @@ import csv
 import json
 
 from utilities import fetch_sdss_image
+from spectrogram_inspector import SpectrogramInspector
 
 class ImageFetcher(QThread):
     image_fetched = pyqtSignal(int, QPixmap)
@@ -228,12 +229,29 @@ class Search(QWidget):
 
         layout.addWidget(self.results_table)
         
-        # Export Button
+        # Export and Overlay Buttons
+        results_buttons_layout = QHBoxLayout()
+        results_buttons_layout.setAlignment(Qt.AlignCenter)
+
         export_button = QPushButton("Export Results")
         export_button.setStyleSheet("background-color: #5A9; color: white; font-weight: bold; padding: 10px 20px; border-radius: 0;")
         export_button.setFixedHeight(40)
         export_button.clicked.connect(self.export_results)
-        layout.addWidget(export_button, alignment=Qt.AlignCenter)
+        results_buttons_layout.addWidget(export_button)
+
+        overlay_button = QPushButton("Overlay Spectra")
+        overlay_button.setStyleSheet("background-color: #5A9; color: white; font-weight: bold; padding: 10px 20px; border-radius: 0;")
+        overlay_button.setFixedHeight(40)
+        overlay_button.clicked.connect(self.overlay_spectra)
+        results_buttons_layout.addWidget(overlay_button)
+
+        download_spectra_button = QPushButton("Download Spectra")
+        download_spectra_button.setStyleSheet("background-color: #5A9; color: white; font-weight: bold; padding: 10px 20px; border-radius: 0;")
+        download_spectra_button.setFixedHeight(40)
+        download_spectra_button.clicked.connect(self.download_spectra)
+        results_buttons_layout.addWidget(download_spectra_button)
+
+        layout.addLayout(results_buttons_layout)
 
         self.conditions = []  # Store the conditions for the WHERE clause
         self.setLayout(layout)
@@ -393,6 +411,61 @@ class Search(QWidget):
         self.active_threads.clear()
         super().closeEvent(event)
 
+    def selected_result_rows(self):
+        """Indices of the selected result rows, or of every row if none are selected."""
+        rows = sorted({index.row() for index in self.results_table.selectionModel().selectedRows()})
+        return rows or range(self.results_table.rowCount())
+
+    def open_inspector(self):
+        """Return the open Spectrogram Inspector tab (opening one if needed) and switch to it."""
+        inspector = None
+        for index in range(self.parent_tab_widget.count()):
+            if isinstance(self.parent_tab_widget.widget(index), SpectrogramInspector):
+                inspector = self.parent_tab_widget.widget(index)
+                break
+        if inspector is None:
+            inspector = SpectrogramInspector(self.parent_tab_widget)
+            self.parent_tab_widget.addTab(inspector, "Spectrogram Inspector")
+        self.parent_tab_widget.setCurrentWidget(inspector)
+        return inspector
+
+    def overlay_spectra(self):
+        """Overlay the spectra of the selected result rows (all rows if none are selected) in the Spectrogram Inspector."""
+        rows = self.selected_result_rows()
+
+        headers = [self.results_table.horizontalHeaderItem(col).text() for col in range(self.results_table.columnCount())]
+        plate_col, mjd_col, fiber_col = headers.index("Plate"), headers.index("MJD"), headers.index("Fiber ID")
+        class_col, redshift_col = headers.index("Class"), headers.index("Redshift")
+
+        targets = []
+        for row in rows:
+            try:
+                plate, mjd, fiber = (int(self.results_table.item(row, col).text()) for col in (plate_col, mjd_col, fiber_col))
+            except (AttributeError, ValueError):
+                continue  # Row without a spectrum
+            label = f"{plate}-{mjd}-{fiber:04d} {self.results_table.item(row, class_col).text()} z={self.results_table.item(row, redshift_col).text()}"
+            targets.append((plate, mjd, fiber, label))
+        if not targets:
+            QMessageBox.warning(self, "Overlay Error", "No spectra available in the selected results.")
+            return
+
+        self.open_inspector().overlay_spectra(targets)
+
+    def download_spectra(self):
+        """Bulk-download the spectra of the selected result rows (all rows if none are selected) by SpecObjID."""
+        headers = [self.results_table.horizontalHeaderItem(col).text() for col in range(self.results_table.columnCount())]
+        specobj_col = headers.index("SpecObj ID")
+        specobj_ids = []
+        for row in self.selected_result_rows():
+            try:
+                specobj_ids.append(int(self.results_table.item(row, specobj_col).text()))
+            except (AttributeError, ValueError):
+                continue  # Row without a spectrum
+        if not specobj_ids:
+            QMessageBox.warning(self, "Download Error", "No spectra available in the selected results.")
+            return
+        self.open_inspector().download_spectra(specobj_ids=specobj_ids)
+
     # New export_results method
     def export_results(self):
         if self.results_table.rowCount() == 0:
@@ -0,0 +1,104 @@
+import numpy as np
+
+from utilities import get_fields_in_box
+
+
+# Coverage grid cell size used to drop redundant fields (degrees)
+CELL_SIZE = 0.02
+
+# Upper bound on the number of grid cells per axis, so wide regions stay cheap
+MAX_CELLS = 300
+
+
+def wrap_offset(delta_ra):
+    """Wrap an RA difference into [-180, 180) degrees."""
+    return (np.asarray(delta_ra, dtype=float) + 180.0) % 360.0 - 180.0
+
+
+def region_box(shape, ra, dec, width, height=None):
+    """
+    RA/DEC bounding box of a region.
+
+    Parameters:
+        shape (str): "box" (width x height on the sky) or "cone" (width is the radius).
+
+    Returns:
+        tuple: (ra_min, ra_max, dec_min, dec_max); ra_min > ra_max when the box crosses RA = 0.
+    """
+    half_width = width if shape == "cone" else width / 2
+    half_height = width if shape == "cone" else height / 2
+    dec_min, dec_max = max(-90.0, dec - half_height), min(90.0, dec + half_height)
+
+    cos_dec = np.cos(np.radians(max(abs(dec_min), abs(dec_max))))
+    if cos_dec <= 1e-6 or half_width / cos_dec >= 180:
+        return 0.0, 360.0, dec_min, dec_max  # Region touches a pole or spans all RA
+    half_ra = half_width / float(cos_dec)
+    return float((ra - half_ra) % 360.0), float((ra + half_ra) % 360.0), dec_min, dec_max
+
+
+def region_cells(shape, ra, dec, width, height=None):
+    """
+    Grid of cell centers inside the region, as offsets from its center.
+
+    Returns:
+        tuple: (x, y) arrays in degrees, with x = delta RA * cos(DEC).
+    """
+    half_width = width if shape == "cone" else width / 2
+    half_height = width if shape == "cone" else height / 2
+    step = max(CELL_SIZE, 2 * max(half_width, half_height) / MAX_CELLS)
+
+    x = np.arange(-half_width + step / 2, half_width, step)
+    y = np.arange(-half_height + step / 2, half_height, step)
+    x, y = np.meshgrid(x, y)
+    x, y = x.ravel(), y.ravel()
+    if shape == "cone":
+        inside = x ** 2 + y ** 2 <= half_width ** 2
+        x, y = x[inside], y[inside]
+    return x, y
+
+
+def select_fields(fields, shape, ra, dec, width, height=None, best_seeing=False):
+    """
+    Keep the fields needed to cover a region, dropping ones other runs already cover.
+
+    Fields are considered in order of preference (smallest r-band PSF width when
+    best_seeing is set, otherwise largest overlap with the region) and a field is
+    kept only if it covers part of the region no earlier field covers.
+
+    Returns:
+        list: The selected field rows.
+    """
+    x, y = region_cells(shape, ra, dec, width, height)
+    cos_dec = np.cos(np.radians(dec))
+
+    candidates = []
+    for row in fields:
+        x_min = wrap_offset(row['raMin'] - ra) * cos_dec
+        x_max = wrap_offset(row['raMax'] - ra) * cos_dec
+        inside = (x >= x_min) & (x <= x_max) & (y >= row['decMin'] - dec) & (y <= row['decMax'] - dec)
+        if inside.any():  # Bounding-box matches may miss a cone entirely
+            candidates.append((row, inside))
+
+    if best_seeing:
+        candidates.sort(key=lambda item: item[0].get('psfWidth_r') or np.inf)
+    else:
+        candidates.sort(key=lambda item: -item[1].sum())
+
+    covered = np.zeros(x.size, dtype=bool)
+    selected = []
+    for row, inside in candidates:
+        if (inside & ~covered).any():
+            selected.append(row)
+            covered |= inside
+    return selected
+
+
+def find_region_fields(shape, ra, dec, width, height=None, best_seeing=False):
+    """
+    Find the fields covering a sky box or cone with one SkyServer query.
+
+    Returns:
+        tuple: (selected fields, number of overlapping fields before deduplication)
+    """
+    fields = get_fields_in_box(*region_box(shape, ra, dec, width, height))
+    return select_fields(fields, shape, ra, dec, width, height, best_seeing), len(fields)
@@ -0,0 +1,337 @@
+from PyQt5.QtWidgets import QGraphicsItem, QStyleOptionGraphicsItem
+from PyQt5.QtGui import QImage
+from PyQt5.QtCore import Qt, QObject, QRectF, QTimer, pyqtSignal
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import os
+import numpy as np
+import requests
+
+from image_view import ZoomableGraphicsView
+from utilities import get_data_dir, sdss_cutout_url
+
+
+# Edge length of a cutout tile in pixels
+TILE_SIZE = 256
+
+# Concurrent cutout requests
+TILE_WORKERS = 6
+
+# Maximum number of decoded tiles kept in memory (256 x 256 x 4 bytes each)
+CACHE_TILES = 300
+
+# Size the on-disk tile cache is pruned to when a viewer opens (bytes)
+DISK_CACHE_BYTES = 512 * 1024 ** 2
+
+# Coarsest zoom level; level n tiles have 2**n times the base pixel scale
+MAX_LEVEL = 8
+
+# Coarsest pixel scale requested from the cutout service (arcsec per pixel)
+MAX_CUTOUT_SCALE = 60.0
+
+# Half-width of the explorable tangent plane around its center (degrees); TAN distortion grows quickly beyond
+MAX_OFFSET_DEG = 20.0
+
+# Rings of off-screen tiles prefetched around the view
+PREFETCH_MARGIN = 1
+
+# Pause after the view stops moving before tile requests are updated (milliseconds)
+UPDATE_DELAY_MS = 30
+
+
+def tan_to_sky(xi, eta, ra0, dec0):
+    """
+    Inverse gnomonic (TAN) projection of standard coordinates (degrees, xi east, eta north) around (ra0, dec0).
+
+    Returns:
+        tuple: (ra, dec) in degrees, RA wrapped to [0, 360).
+    """
+    xi, eta, ra0, dec0 = np.radians([xi, eta, ra0, dec0])
+    rho = np.hypot(xi, eta)
+    c = np.arctan(rho)
+    if rho == 0:
+        return float(np.degrees(ra0)) % 360, float(np.degrees(dec0))
+    dec = np.arcsin(np.cos(c) * np.sin(dec0) + eta * np.sin(c) * np.cos(dec0) / rho)
+    ra = ra0 + np.arctan2(xi * np.sin(c), rho * np.cos(dec0) * np.cos(c) - eta * np.sin(dec0) * np.sin(c))
+    return float(np.degrees(ra)) % 360, float(np.degrees(dec))
+
+
+def level_for_zoom(zoom, max_level):
+    """Coarsest level that still has at least one tile pixel per screen pixel."""
+    level = 0
+    while level < max_level and zoom > 0 and zoom * (2 ** (level + 1)) <= 1:
+        level += 1
+    return level
+
+
+def prune_tile_cache(directory, max_bytes=DISK_CACHE_BYTES):
+    """Delete the least recently used cached tiles until the cache fits in max_bytes."""
+    tiles = []
+    for root, _, files in os.walk(directory):
+        for name in files:
+            path = os.path.join(root, name)
+            try:
+                status = os.stat(path)
+            except OSError:
+                continue
+            tiles.append((status.st_mtime, status.st_size, path))
+    total = sum(size for _, size, _ in tiles)
+    for _, size, path in sorted(tiles):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+            total -= size
+        except OSError:
+            pass
+
+
+def fetch_tile(session, ra, dec, scale, path):
+    """
+    Return a cutout tile as a QImage, from the disk cache or else from the cutout service (then cached).
+
+    QImage is safe to build outside the GUI thread, so tiles are decoded by the worker that fetched them.
+    """
+    if os.path.exists(path):
+        image = QImage(path)
+        if not image.isNull():
+            os.utime(path)  # Mark as recently used for pruning
+            return image
+    response = session.get(sdss_cutout_url(ra, dec, scale, TILE_SIZE, TILE_SIZE), timeout=30)
+    response.raise_for_status()
+    image = QImage.fromData(response.content, "JPG")
+    if image.isNull():
+        raise ValueError("The cutout service did not return an image.")
+    temporary_path = path + ".part"
+    with open(temporary_path, "wb") as f:
+        f.write(response.content)
+    os.replace(temporary_path, path)
+    return image
+
+
+class TileSignals(QObject):
+    """Carries finished tiles from worker threads to the view (queued onto the GUI thread)."""
+    tile_ready = pyqtSignal(object, int, object)  # Tile key, view generation, QImage (None on failure)
+
+
+class SkyTileLayer(QGraphicsItem):
+    """
+    Graphics item that paints the cached cutout tiles of a tangent plane.
+
+    Scene units are base-scale pixels with the plane center at the origin,
+    north up and east to the left, as in the cutouts. Painting never fetches:
+    tiles not cached yet are drawn from the nearest coarser cached tile.
+    """
+
+    def __init__(self, half_width, max_level):
+        super().__init__()
+        self.setFlag(QGraphicsItem.ItemUsesExtendedStyleOption)  # Needed for a precise exposedRect
+        self.half_width = half_width
+        self.max_level = max_level
+        self.cache = OrderedDict()  # (level, ty, tx) -> QImage
+
+    def boundingRect(self):
+        return QRectF(-self.half_width, -self.half_width, 2 * self.half_width, 2 * self.half_width)
+
+    @staticmethod
+    def tile_rect(level, ty, tx):
+        span = TILE_SIZE << level
+        return QRectF(tx * span, ty * span, span, span)
+
+    def store(self, key, image):
+        self.cache[key] = image
+        self.cache.move_to_end(key)
+        while len(self.cache) > CACHE_TILES:
+            self.cache.popitem(last=False)
+        self.update(self.tile_rect(*key))
+
+    def cached(self, key):
+        """Return the cached QImage of a tile (marking it recently used) or None."""
+        image = self.cache.get(key)
+        if image is not None:
+            self.cache.move_to_end(key)
+        return image
+
+    def paint(self, painter, option, widget=None):
+        lod = QStyleOptionGraphicsItem.levelOfDetailFromTransform(painter.worldTransform())
+        level = level_for_zoom(lod, self.max_level)
+        exposed = option.exposedRect.intersected(self.boundingRect())
+        if exposed.isEmpty():
+            return
+
+        span = TILE_SIZE << level
+        for ty in range(int(np.floor(exposed.top() / span)), int(np.ceil(exposed.bottom() / span))):
+            for tx in range(int(np.floor(exposed.left() / span)), int(np.ceil(exposed.right() / span))):
+                target = self.tile_rect(level, ty, tx)
+                image = self.cached((level, ty, tx))
+                if image is not None:
+                    painter.drawImage(target, image)
+                    continue
+                # Draw the covering part of the nearest coarser tile until this one arrives
+                for coarse in range(level + 1, self.max_level + 1):
+                    key = (coarse, ty >> (coarse - level), tx >> (coarse - level))  # Floors for negative indices too
+                    image = self.cached(key)
+                    if image is not None:
+                        parent = self.tile_rect(*key)
+                        factor = 1 << coarse
+                        source = QRectF(
+                            (target.left() - parent.left()) / factor, (target.top() - parent.top()) / factor,
+                            span / factor, span / factor
+                        )
+                        painter.drawImage(target, image, source)
+                        break
+
+
+class SkyTileView(ZoomableGraphicsView):
+    """
+    Slippy-map view of SDSS color imagery around a position, built from fixed-size cutout tiles.
+
+    The sky is mapped onto one tangent plane centered on the requested
+    position. Each zoom level divides the plane into TILE_SIZE-pixel tiles, and
+    every tile is one cutout centered on its own center at that level's pixel
+    scale. As the view pans and zooms, the visible tiles are requested nearest
+    to the center first, followed by their parents (for zooming out) and a ring
+    of neighbours (for panning). Queued requests that scroll away are
+    cancelled. Tiles are kept in a memory LRU cache and on disk under
+    data/sky_tiles/, so revisited areas load without the network.
+    """
+    sky_clicked = pyqtSignal(float, float)  # RA and DEC of a double-clicked point
+
+    def __init__(self, parent=None):
+        super().__init__(parent=parent)
+        self.layer = None
+        self.center = None  # (ra, dec) of the tangent point
+        self.scale_arcsec = None  # Base pixel scale
+        self.max_level = 0
+        self.generation = 0  # Bumped when the plane changes, so late tiles of an old plane are dropped
+        self.requests = {}  # Tile key -> future of queued or running fetches
+        self.failed = set()
+        self.directories = {}  # Level -> disk cache directory
+
+        self.session = requests.Session()
+        self.session.mount("https://", requests.adapters.HTTPAdapter(pool_maxsize=TILE_WORKERS))
+        self.executor = ThreadPoolExecutor(max_workers=TILE_WORKERS)
+        self.signals = TileSignals()
+        self.signals.tile_ready.connect(self.on_tile_ready)
+        self.executor.submit(prune_tile_cache, get_data_dir("sky_tiles"))
+
+        self.update_timer = QTimer(self)
+        self.update_timer.setSingleShot(True)
+        self.update_timer.setInterval(UPDATE_DELAY_MS)
+        self.update_timer.timeout.connect(self.update_requests)
+        self.view_changed.connect(self.update_timer.start)
+
+    def show_position(self, ra, dec, scale=0.2, width=1000, height=800):
+        """Center a new tangent plane on (ra, dec) and show a width x height pixel field at the given scale (arcsec/pixel)."""
+        self.cancel_requests()
+        self.requests.clear()  # Fetches still running belong to the old plane; their tiles are dropped on arrival
+        self.generation += 1
+        self.failed.clear()
+        self.directories.clear()
+        self.center = (ra, dec)
+        self.scale_arcsec = scale
+        self.max_level = 0
+        while self.max_level < MAX_LEVEL and scale * 2 ** (self.max_level + 1) <= MAX_CUTOUT_SCALE:
+            self.max_level += 1
+        self.MIN_ZOOM = 1 / 2 ** (self.max_level + 1)
+
+        if self.layer is not None:
+            self.scene().removeItem(self.layer)
+        self.layer = SkyTileLayer(MAX_OFFSET_DEG * 3600 / scale, self.max_level)
+        self.scene().addItem(self.layer)
+        self.scene().setSceneRect(self.layer.boundingRect())
+        self.fitInView(QRectF(-width / 2, -height / 2, width, height), Qt.KeepAspectRatio)
+        self.view_changed.emit()
+
+    def scene_to_sky(self, point):
+        """RA and DEC of a scene point."""
+        degrees = self.scale_arcsec / 3600
+        return tan_to_sky(-point.x() * degrees, -point.y() * degrees, *self.center)
+
+    def tile_center(self, level, ty, tx):
+        """RA and DEC of the center of a tile."""
+        return self.scene_to_sky(SkyTileLayer.tile_rect(level, ty, tx).center())
+
+    def tile_path(self, key, ra, dec):
+        """Disk cache path of a tile, keyed by its center and pixel scale so other planes can reuse it."""
+        level = key[0]
+        if level not in self.directories:
+            self.directories[level] = get_data_dir("sky_tiles", f"{self.scale_arcsec * 2 ** level:g}")
+        return os.path.join(self.directories[level], f"{ra:.6f}{dec:+.6f}.jpg")
+
+    def tiles_in(self, rect, level):
+        """Keys of the tiles of a level that intersect a scene rectangle, nearest to its center first."""
+        rect = rect.intersected(self.layer.boundingRect())
+        if rect.isEmpty():
+            return []
+        span = TILE_SIZE << level
+        center = rect.center()
+        keys = [
+            (level, ty, tx)
+            for ty in range(int(np.floor(rect.top() / span)), int(np.ceil(rect.bottom() / span)))
+            for tx in range(int(np.floor(rect.left() / span)), int(np.ceil(rect.right() / span)))
+        ]
+        return sorted(keys, key=lambda key: ((key[2] + 0.5) * span - center.x()) ** 2 + ((key[1] + 0.5) * span - center.y()) ** 2)
+
+    def wanted_tiles(self):
+        """Tiles to load, most important first: visible, then their parents, then the prefetch ring."""
+        rect = self.visible_scene_rect()
+        level = level_for_zoom(self.zoom_level(), self.max_level)
+        visible = self.tiles_in(rect, level)
+        parents = self.tiles_in(rect, level + 1) if level < self.max_level else []
+        margin = PREFETCH_MARGIN * (TILE_SIZE << level)
+        shown = set(visible)
+        ring = [key for key in self.tiles_in(rect.adjusted(-margin, -margin, margin, margin), level) if key not in shown]
+        return visible + parents + ring
+
+    def update_requests(self):
+        """Requeue fetches in priority order for the current view, cancelling those no longer wanted."""
+        if self.layer is None:
+            return
+        self.cancel_requests()  # Running fetches cannot be cancelled and are kept
+        for key in self.wanted_tiles():
+            if key in self.layer.cache or key in self.requests or key in self.failed:
+                continue
+            ra, dec = self.tile_center(*key)
+            scale = self.scale_arcsec * 2 ** key[0]
+            self.requests[key] = self.executor.submit(
+                self.load_tile, key, self.generation, ra, dec, scale, self.tile_path(key, ra, dec)
+            )
+
+    def cancel_requests(self):
+        """Cancel queued fetches."""
+        for key, future in list(self.requests.items()):
+            if future.cancel():
+                del self.requests[key]
+
+    def load_tile(self, key, generation, ra, dec, scale, path):
+        """Fetch one tile (on a worker thread) and hand it to the GUI thread."""
+        try:
+            image = fetch_tile(self.session, ra, dec, scale, path)
+        except Exception as e:
+            print(f"Error fetching sky tile at RA {ra:.5f}, DEC {dec:.5f}: {e}")
+            image = None
+        self.signals.tile_ready.emit(key, generation, image)
+
+    def on_tile_ready(self, key, generation, image):
+        if generation != self.generation:
+            return  # A tile of an old plane; the same key may already be requested on the new one
+        self.requests.pop(key, None)
+        if image is None:
+            self.failed.add(key)  # Not retried until the plane changes
+        else:
+            self.layer.store(key, image)
+
+    def mouseDoubleClickEvent(self, event):
+        """Double-click centers the view on a point and reports its coordinates."""
+        if self.layer is None:
+            return
+        point = self.mapToScene(event.pos())
+        self.centerOn(point)
+        self.sky_clicked.emit(*self.scene_to_sky(point))
+
+    def shutdown(self):
+        """Cancel queued fetches and release the worker threads."""
+        self.update_timer.stop()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        self.session.close()
@@ -0,0 +1,184 @@
+import os
+import shutil
+import tempfile
+import warnings
+import numpy as np
+
+from spectrum_io import read_spectrum_columns, read_columns
+
+
+# SDSS spectra are sampled every 1e-4 in log10(wavelength)
+LOGLAM_STEP = 1e-4
+
+# Spectra resampled per vectorized pass
+CHUNK_SPECTRA = 512
+
+# Memory budget for one block of the median/percentile step (bytes)
+COMBINE_MEMORY = 256 * 1024 ** 2
+
+# and_mask bits that reject a pixel (every bit set in all exposures, by default)
+DEFAULT_MASK_BITS = -1
+
+
+def read_spectrum(file_path):
+    """
+    Read loglam, flux, ivar, and_mask and the pipeline redshift of a spec-lite file.
+
+    Returns:
+        dict: Arrays under "loglam", "flux", "ivar", "and_mask", and "z" (None if absent).
+    """
+    spectrum = read_spectrum_columns(file_path)
+    spectrum["loglam"] = spectrum["loglam"].astype(np.float64)
+    try:
+        spectrum["z"] = float(read_columns(file_path, ("Z",), hdu=2)["Z"][0])
+    except (ValueError, KeyError, IndexError):
+        spectrum["z"] = None  # No SPALL table with a redshift
+    return spectrum
+
+
+def common_grid(loglam_min, loglam_max, step=LOGLAM_STEP):
+    """Uniform log10(wavelength) grid covering [loglam_min, loglam_max]."""
+    count = int(np.floor((loglam_max - loglam_min) / step)) + 1
+    return loglam_min + step * np.arange(count)
+
+
+def grid_for(spectra, rest_frame=False, step=LOGLAM_STEP):
+    """Grid spanning every spectrum (shifted to rest frame if requested)."""
+    low, high = np.inf, -np.inf
+    for spectrum in spectra:
+        shift = np.log10(1 + spectrum["z"]) if rest_frame and spectrum.get("z") is not None else 0.0
+        low = min(low, spectrum["loglam"][0] - shift)
+        high = max(high, spectrum["loglam"][-1] - shift)
+    return common_grid(low, high, step)
+
+
+def resample_chunk(spectra, grid, rest_frame=False, mask_bits=DEFAULT_MASK_BITS, normalize=None):
+    """
+    Linearly resample a chunk of spectra onto the grid in one vectorized pass.
+
+    Input spectra are assumed uniformly sampled in loglam (as SDSS spectra are),
+    so each output pixel maps to a fractional input index without a search.
+    Variances are propagated through the interpolation, and output pixels that
+    touch a masked or zero-ivar input pixel get zero ivar.
+
+    Parameters:
+        normalize (tuple): Optional (loglam_min, loglam_max) window on the grid; each
+            spectrum is divided by its weighted median flux in that window.
+
+    Returns:
+        tuple: (flux, ivar) arrays of shape (len(spectra), len(grid)).
+    """
+    count = len(spectra)
+    length = max(len(spectrum["loglam"]) for spectrum in spectra)
+    flux = np.zeros((count, length + 1), dtype=np.float32)
+    ivar = np.zeros((count, length + 1), dtype=np.float32)  # The extra column is an always-invalid pad
+    start = np.empty(count)
+    step = np.empty(count)
+    size = np.empty(count, dtype=np.int64)
+
+    for row, spectrum in enumerate(spectra):
+        n = len(spectrum["loglam"])
+        shift = np.log10(1 + spectrum["z"]) if rest_frame and spectrum.get("z") is not None else 0.0
+        start[row] = spectrum["loglam"][0] - shift
+        step[row] = (spectrum["loglam"][-1] - spectrum["loglam"][0]) / max(n - 1, 1)
+        size[row] = n
+        good = np.isfinite(spectrum["flux"]) & np.isfinite(spectrum["ivar"])
+        if spectrum.get("and_mask") is not None:
+            good &= (spectrum["and_mask"] & mask_bits) == 0
+        flux[row, :n] = np.where(good, spectrum["flux"], 0)
+        ivar[row, :n] = np.where(good, spectrum["ivar"], 0)
+
+    # Fractional input index of every output pixel, per spectrum
+    position = (grid[None, :] - start[:, None]) / step[:, None]
+    left = np.floor(position).astype(np.int64)
+    fraction = (position - left).astype(np.float32)
+    inside = (left >= 0) & (left < size[:, None] - 1)
+    left = np.where(inside, left, length)  # Point outside pixels at the pad column
+    right = np.where(inside, left + 1, length)
+
+    flux_left, flux_right = np.take_along_axis(flux, left, 1), np.take_along_axis(flux, right, 1)
+    ivar_left, ivar_right = np.take_along_axis(ivar, left, 1), np.take_along_axis(ivar, right, 1)
+    out_flux = (1 - fraction) * flux_left + fraction * flux_right
+
+    valid = inside & (ivar_left > 0) & (ivar_right > 0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        variance = (1 - fraction) ** 2 / ivar_left + fraction ** 2 / ivar_right
+        out_ivar = np.where(valid, 1 / variance, 0).astype(np.float32)
+    out_flux = np.where(valid, out_flux, 0).astype(np.float32)
+
+    if normalize is not None:
+        window = (grid >= normalize[0]) & (grid <= normalize[1])
+        values = np.where(out_ivar[:, window] > 0, out_flux[:, window], np.nan)
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", RuntimeWarning)  # All-NaN rows are handled below
+            scale = np.nanmedian(values, axis=1) if window.any() else np.full(count, np.nan)
+        usable = np.isfinite(scale) & (scale > 0)
+        scale = np.where(usable, scale, 1).astype(np.float32)
+        out_flux /= scale[:, None]
+        out_ivar *= scale[:, None] ** 2
+        out_ivar[~usable] = 0  # Spectra without flux in the window are left out
+
+    return out_flux, out_ivar
+
+
+def stack_spectra(spectra, rest_frame=False, grid=None, percentiles=(16, 84), mask_bits=DEFAULT_MASK_BITS,
+                  normalize=None, chunk_size=CHUNK_SPECTRA, memory_limit=COMBINE_MEMORY):
+    """
+    Stack spectra onto a common log-wavelength grid.
+
+    Spectra are resampled chunk by chunk into an on-disk (spectra, pixels) cube,
+    accumulating the inverse-variance weighted mean on the way. The median and
+    percentiles are then computed over blocks of pixels, so memory stays bounded
+    for tens of thousands of spectra.
+
+    Parameters:
+        spectra (list): Dictionaries as returned by read_spectrum ("z" is needed for rest_frame).
+        grid (ndarray): Output loglam grid; by default one spanning every spectrum.
+        percentiles (tuple): Percentiles to compute alongside the median.
+
+    Returns:
+        dict: "loglam", "mean", "mean_ivar", "median", "percentiles" ({p: array}) and "count" (pixels stacked).
+    """
+    spectra = list(spectra)
+    if not spectra:
+        raise ValueError("No spectra to stack.")
+    if grid is None:
+        grid = grid_for(spectra, rest_frame)
+
+    count, pixels = len(spectra), len(grid)
+    weighted_sum = np.zeros(pixels)
+    weight_total = np.zeros(pixels)
+    coverage = np.zeros(pixels, dtype=np.int64)
+
+    scratch = tempfile.mkdtemp(prefix="astrovision-stack-")
+    try:
+        cube = np.lib.format.open_memmap(os.path.join(scratch, "flux.npy"), mode="w+", dtype=np.float32, shape=(count, pixels))
+        for start in range(0, count, chunk_size):
+            flux, ivar = resample_chunk(spectra[start:start + chunk_size], grid, rest_frame, mask_bits, normalize)
+            weighted_sum += (flux * ivar).sum(axis=0, dtype=np.float64)
+            weight_total += ivar.sum(axis=0, dtype=np.float64)
+            coverage += (ivar > 0).sum(axis=0)
+            cube[start:start + chunk_size] = np.where(ivar > 0, flux, np.nan)
+        cube.flush()
+
+        median = np.full(pixels, np.nan, dtype=np.float32)
+        bands = {p: np.full(pixels, np.nan, dtype=np.float32) for p in percentiles}
+        columns = max(1, int(memory_limit // (count * 4 * 3)))  # Block, sort copy and mask
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", RuntimeWarning)  # Pixels no spectrum covers stay NaN
+            for x0 in range(0, pixels, columns):
+                block = np.array(cube[:, x0:x0 + columns])
+                values = np.nanpercentile(block, [50, *percentiles], axis=0)
+                median[x0:x0 + columns] = values[0]
+                for p, value in zip(percentiles, values[1:]):
+                    bands[p][x0:x0 + columns] = value
+        del cube
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mean = np.where(weight_total > 0, weighted_sum / weight_total, np.nan)
+    return {
+        "loglam": grid, "mean": mean.astype(np.float32), "mean_ivar": weight_total.astype(np.float32),
+        "median": median, "percentiles": bands, "count": coverage,
+    }
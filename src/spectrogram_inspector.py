@@ -1,11 +1,261 @@
 from PyQt5.QtWidgets import (
-    QWidget, QVBoxLayout, QHBoxLayout, QScrollArea, QRadioButton, QLabel, QLineEdit, QCheckBox, QPushButton, QFileDialog, QFrame, QComboBox, QGridLayout
+    QWidget, QVBoxLayout, QHBoxLayout, QScrollArea, QRadioButton, QLabel, QLineEdit, QCheckBox, QPushButton, QFileDialog, QFrame, QComboBox, QGridLayout,
+    QListWidget, QListWidgetItem, QDoubleSpinBox, QProgressBar
 )
-from PyQt5.QtCore import Qt
+from PyQt5.QtCore import Qt, QTimer, QThread, pyqtSignal
+from PyQt5.QtGui import QGuiApplication
 import pyqtgraph as pg
 import numpy as np
-from utilities import get_plate_mjd_fiber, get_specobj_id_pmf, get_specobj_details, fetch_spectrum_file
-from astropy.io import fits
+import os
+import glob
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from utilities import (
+    get_specobj_record, fetch_spectrum_file, get_plate_spectra, get_specobj_pmf, get_data_dir, default_run2d
+)
+from download_manager import shared_manager, spectrum_jobs, BULK, FINISHED_STATES
+from spectral_stack import stack_spectra
+from spectrum_io import read_spectrum_columns, SPECTRUM_HDUS
+from spectrum_archive import SpectrumArchive, read_sources
+from line_measure import DEFAULT_LINES, load_line_list, measure_lines, write_line_table
+from redshift import load_templates, find_redshifts
+
+
+# A data point within this many screen pixels of the cursor is shown in the hover label
+HOVER_RADIUS_PX = 10
+
+# At most this many points per spectrum are compared per lookup (evenly spaced when zoomed far out)
+HOVER_MAX_CANDIDATES = 256
+
+# Curves are decimated to this many (min, max) samples per screen pixel (pyqtgraph's default is 5)
+SAMPLES_PER_PIXEL = 1.0
+
+
+def fetch_with_reduction(plate, mjd, fiber, metadata):
+    """
+    Retry a spectrum download that failed with the reduction guessed from the plate number, using the
+    run2d of its SpecObj metadata (e.g. SEGUE plates in 103 or 104).
+
+    Returns:
+        str: File path, or None if the metadata gives no other reduction or the download fails.
+    """
+    if metadata and metadata.get("run2d") and str(metadata["run2d"]) != default_run2d(plate):
+        return fetch_spectrum_file(plate, mjd, fiber, metadata["run2d"])
+    return None
+
+
+class SpectrumFetchThread(QThread):
+    """
+    Fetch a list of spectra in the background, reporting each file as it arrives.
+
+    A spectrum missing under the reduction guessed from its plate is retried with the one SpecObj gives.
+    """
+    spectrum_fetched = pyqtSignal(str, str)  # File path, label
+    finished_signal = pyqtSignal(int)  # Number of spectra that could not be fetched
+
+    def __init__(self, targets):
+        super().__init__()
+        self.targets = targets  # (plate, mjd, fiber, label) tuples
+
+    def run(self):
+        failed = 0
+        for plate, mjd, fiber, label in self.targets:
+            if self.isInterruptionRequested():
+                break
+            spectrum_file = fetch_spectrum_file(plate, mjd, fiber)
+            if not spectrum_file:
+                spectrum_file = fetch_with_reduction(
+                    plate, mjd, fiber, get_specobj_record(plate=plate, mjd=mjd, fiber=fiber)
+                )
+            if spectrum_file:
+                self.spectrum_fetched.emit(spectrum_file, label)
+            else:
+                failed += 1
+        self.finished_signal.emit(failed)
+
+
+class SpectrumLookupThread(QThread):
+    """
+    Resolve one spectrum and download it, reporting the metadata and the file as soon as each is ready.
+
+    With Plate, MJD and FiberID known, the metadata query and the download run
+    concurrently, the download guessing the reduction from the plate number; if
+    that fails, it is retried with the reduction the metadata gives (e.g. SEGUE
+    plates in 103 or 104). From RA/DEC the single metadata query also gives the
+    location, and the download starts as soon as it returns.
+    """
+    metadata_ready = pyqtSignal(object)  # Metadata dictionary, or None if no spectrum was found
+    spectrum_ready = pyqtSignal(str)  # Spectrum file path, or "" if the download failed
+
+    def __init__(self, ra=None, dec=None, plate=None, mjd=None, fiber=None):
+        super().__init__()
+        self.position = (ra, dec)
+        self.plate_mjd_fiber = (plate, mjd, fiber)
+
+    def run(self):
+        plate, mjd, fiber = self.plate_mjd_fiber
+        if plate is None:
+            metadata = get_specobj_record(*self.position)
+            self.metadata_ready.emit(metadata)
+            if metadata:
+                self.spectrum_ready.emit(
+                    fetch_spectrum_file(metadata["plate"], metadata["mjd"], metadata["fiberID"], metadata["run2d"]) or ""
+                )
+            return
+
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            lookup = executor.submit(get_specobj_record, plate=plate, mjd=mjd, fiber=fiber)
+            download = executor.submit(fetch_spectrum_file, plate, mjd, fiber)
+            spectrum_file = None
+            for future in as_completed([lookup, download]):
+                if future is lookup:
+                    self.metadata_ready.emit(future.result())
+                else:
+                    spectrum_file = future.result()
+                    if spectrum_file:
+                        self.spectrum_ready.emit(spectrum_file)
+        if not spectrum_file:
+            self.spectrum_ready.emit(fetch_with_reduction(plate, mjd, fiber, lookup.result()) or "")
+
+
+class SpectrumListThread(QThread):
+    """Resolve plates, plate-MJDs and SpecObjIDs to the fibers to download."""
+    finished_signal = pyqtSignal(list)  # Dictionaries with plate, mjd, fiberID and run2d
+
+    def __init__(self, plates, specobj_ids):
+        super().__init__()
+        self.plates = plates  # (plate, mjd or None) tuples
+        self.specobj_ids = specobj_ids
+
+    def run(self):
+        rows = []
+        for plate, mjd in self.plates:
+            rows += get_plate_spectra(plate, mjd)
+        if self.specobj_ids:
+            rows += get_specobj_pmf(self.specobj_ids)
+        self.finished_signal.emit(rows)
+
+
+def parse_bulk_targets(text):
+    """
+    Split a comma or space separated list into plates and SpecObjIDs.
+
+    Entries are a plate ("266"), a plate and plugging MJD ("266-51602") or a
+    SpecObjID (any number too large to be a plate).
+
+    Returns:
+        tuple: ([(plate, mjd or None)], [specObjID])
+    """
+    plates, specobj_ids = [], []
+    for entry in text.replace(",", " ").split():
+        parts = entry.split("-")
+        if len(parts) == 2:
+            plates.append((int(parts[0]), int(parts[1])))
+        elif len(parts) == 1 and int(entry) > 99999:
+            specobj_ids.append(int(entry))
+        elif len(parts) == 1:
+            plates.append((int(entry), None))
+        else:
+            raise ValueError(entry)
+    return plates, specobj_ids
+
+
+def parse_archive_rows(text, count):
+    """
+    Parse archive rows given as indices and start:stop ranges ("0:20, 35"), clipped to the archive size.
+
+    Returns:
+        list: Row indices in the order given, without repeats.
+    """
+    rows = []
+    for entry in text.replace(",", " ").split():
+        if ":" in entry:
+            start, stop = entry.split(":")
+            rows += range(*slice(int(start) if start else None, int(stop) if stop else None).indices(count))
+        elif 0 <= int(entry) < count:
+            rows.append(int(entry))
+    return list(dict.fromkeys(rows))
+
+
+class SpectrumArchiveThread(QThread):
+    """Append spectrum files to a Zarr spectrum archive."""
+    progress = pyqtSignal(int)  # Files processed
+    finished_signal = pyqtSignal(int, int, str)  # Spectra added, archive size, error message
+
+    def __init__(self, archive_path, spectrum_files):
+        super().__init__()
+        self.archive_path = archive_path
+        self.spectrum_files = spectrum_files
+
+    def run(self):
+        try:
+            archive = SpectrumArchive(self.archive_path)
+            added = archive.append_files(self.spectrum_files, progress_callback=self.progress.emit)
+            self.finished_signal.emit(added, len(archive), "")
+        except Exception as e:
+            self.finished_signal.emit(0, 0, str(e))
+
+
+class SpectrumStackThread(QThread):
+    """Read spectra from files or archives and stack them onto a common log-wavelength grid."""
+    finished_signal = pyqtSignal(object, str)  # Stack result (None on failure), error message
+
+    def __init__(self, spectrum_files, rest_frame):
+        super().__init__()
+        self.spectrum_files = spectrum_files
+        self.rest_frame = rest_frame
+
+    def run(self):
+        try:
+            spectra = list(read_sources(self.spectrum_files))
+            if self.rest_frame and any(spectrum["z"] is None for spectrum in spectra):
+                raise ValueError("some spectra have no redshift (files holding only the COADD table)")
+            self.finished_signal.emit(stack_spectra(spectra, rest_frame=self.rest_frame), "")
+        except Exception as e:
+            self.finished_signal.emit(None, str(e))
+
+
+class LineMeasureThread(QThread):
+    """Measure a line list in spectra from files or archives and export the table as CSV."""
+    finished_signal = pyqtSignal(int, int, str)  # Spectra measured, spectra without any measurable line, error message
+
+    def __init__(self, spectrum_files, names, lines, rest_frame, output_path):
+        super().__init__()
+        self.spectrum_files = spectrum_files
+        self.names = names
+        self.lines = lines
+        self.rest_frame = rest_frame
+        self.output_path = output_path
+
+    def run(self):
+        try:
+            results = measure_lines(read_sources(self.spectrum_files), self.lines, self.rest_frame)
+            write_line_table(self.output_path, self.names, self.lines, results)
+            # Spectra with no usable pixel around any line (no redshift in the rest frame, or all NaN)
+            skipped = int(np.count_nonzero(np.all(results["coverage"] == 0, axis=1)))
+            self.finished_signal.emit(len(self.names), skipped, "")
+        except Exception as e:
+            self.finished_signal.emit(0, 0, str(e))
+
+
+class RedshiftThread(QThread):
+    """Estimate the redshifts of spectra from files or archives by template cross-correlation."""
+    finished_signal = pyqtSignal(list, str)  # (label, pipeline z, result) tuples, error message
+
+    def __init__(self, spectrum_files, labels, templates):
+        super().__init__()
+        self.spectrum_files = spectrum_files
+        self.labels = labels
+        self.templates = templates
+
+    def run(self):
+        try:
+            spectra = list(read_sources(self.spectrum_files))
+            results = find_redshifts(spectra, self.templates)
+            self.finished_signal.emit(
+                [(label, spectrum["z"], result) for label, spectrum, result in zip(self.labels, spectra, results)], ""
+            )
+        except Exception as e:
+            self.finished_signal.emit([], str(e))
 
 
 class SpectrogramInspector(QWidget):
@@ -44,10 +294,42 @@ class SpectrogramInspector(QWidget):
         self.plot_widget.addItem(self.hover_text)
         self.hover_text.setVisible(False)  # Hide initially
 
-        self.data_points = None  # Store the data points for hover functionality
+        self.data_points = None  # Store the data points for export
+        self.spectra = []  # Plotted spectra as dicts with sorted wavelengths, flux, label, offset, plot item and source
+        # (a FITS file, or an (archive, row) pair)
+        self.fetch_thread = None
+        self.cancelled_fetches = set()  # Interrupted fetch threads still finishing their current file
+        self.lookup_thread = None
+        self.stack_thread = None
+        self.list_thread = None
+        self.measure_thread = None
+        self.redshift_thread = None
+        self.archive_thread = None
+        self.lines = DEFAULT_LINES
+        self.templates = []
+        self.bulk_jobs = None  # (job ids, destination paths) of the running bulk download
+
+        self.downloads = shared_manager()
+        self.downloads.job_changed.connect(self.on_bulk_progress)
 
-        # Mouse movement event to track hover
-        self.plot_widget.scene().sigMouseMoved.connect(self.update_hover)
+        self.layout_timer = QTimer(self)
+        self.layout_timer.setSingleShot(True)
+        self.layout_timer.setInterval(0)
+        self.layout_timer.timeout.connect(self.apply_offsets)
+
+        # Curves draw only the visible wavelength range, decimated to min/max pairs per screen pixel
+        self.plot_widget.setClipToView(True)
+        self.plot_widget.setDownsampling(auto=True, mode="peak")
+
+        # Mouse moves only record the position; the lookup runs at most once per display refresh
+        self.hover_position = None
+        self.hover_timer = QTimer(self)
+        self.hover_timer.setSingleShot(True)
+        screen = QGuiApplication.primaryScreen()
+        refresh_rate = screen.refreshRate() if screen else 0
+        self.hover_timer.setInterval(int(1000 / refresh_rate) if refresh_rate > 0 else 16)
+        self.hover_timer.timeout.connect(self.update_hover)
+        self.plot_widget.scene().sigMouseMoved.connect(self.schedule_hover)
 
         layout.addWidget(self.plot_widget, stretch=5)
 
@@ -128,10 +410,135 @@ class SpectrogramInspector(QWidget):
         scroll_layout.addWidget(self.plate_mjd_fiber_inputs)
 
         # Fetch Spectrum Button
-        fetch_button = QPushButton("Fetch Spectrum")
-        fetch_button.setStyleSheet("background-color: #5A9; color: white; padding: 10px; font-size: 14px;")
-        fetch_button.clicked.connect(self.fetch_spectrum)
-        scroll_layout.addWidget(fetch_button)
+        self.fetch_button = QPushButton("Fetch Spectrum")
+        self.fetch_button.setStyleSheet("background-color: #5A9; color: white; padding: 10px; font-size: 14px;")
+        self.fetch_button.clicked.connect(self.fetch_spectrum)
+        scroll_layout.addWidget(self.fetch_button)
+
+        # Bulk download of whole plates or search results
+        bulk_label = QLabel("Bulk Download")
+        bulk_label.setStyleSheet("color: white; font-size: 16px; font-weight: bold; margin-top: 10px;")
+        scroll_layout.addWidget(bulk_label)
+
+        self.bulk_input = QLineEdit()
+        self.bulk_input.setStyleSheet("background-color: #3A3A3A; color: white; padding: 5px; font-size: 14px;")
+        self.bulk_input.setPlaceholderText("Plates, Plate-MJDs or SpecObjIDs (e.g. 266, 267-51608)")
+        scroll_layout.addWidget(self.bulk_input)
+
+        self.coadd_only_checkbox = QCheckBox("Fetch only the COADD and SPALL tables (no line fits)")
+        self.coadd_only_checkbox.setStyleSheet("color: white; font-size: 14px; border: None")
+        self.coadd_only_checkbox.setChecked(True)
+        scroll_layout.addWidget(self.coadd_only_checkbox)
+
+        self.bulk_button = QPushButton("Download Spectra")
+        self.bulk_button.setStyleSheet("background-color: #5A9; color: white; padding: 10px; font-size: 14px;")
+        self.bulk_button.clicked.connect(self.start_bulk_download)
+        scroll_layout.addWidget(self.bulk_button)
+
+        self.bulk_progress = QProgressBar()
+        self.bulk_progress.setStyleSheet("QProgressBar {background-color: #3A3A3A; border: none; color: white;} QProgressBar::chunk {background-color: #5A9;}")
+        self.bulk_progress.setVisible(False)
+        scroll_layout.addWidget(self.bulk_progress)
+
+        self.bulk_status = QLabel("")
+        self.bulk_status.setStyleSheet("color: white; font-size: 13px; border: None")
+        self.bulk_status.setWordWrap(True)
+        scroll_layout.addWidget(self.bulk_status)
+
+        # Zarr archive of downloaded spectra
+        archive_label = QLabel("Spectrum Archive")
+        archive_label.setStyleSheet("color: white; font-size: 16px; font-weight: bold; margin-top: 10px;")
+        scroll_layout.addWidget(archive_label)
+
+        self.archive_input = QLineEdit()
+        self.archive_input.setStyleSheet("background-color: #3A3A3A; color: white; padding: 5px; font-size: 14px;")
+        self.archive_input.setPlaceholderText("Archive directory (default: data/spectra.zarr)")
+        scroll_layout.addWidget(self.archive_input)
+
+        self.archive_button = QPushButton("Archive Downloaded Spectra")
+        self.archive_button.setStyleSheet("background-color: #5A9; color: white; padding: 10px; font-size: 14px;")
+        self.archive_button.clicked.connect(self.archive_downloaded_spectra)
+        scroll_layout.addWidget(self.archive_button)
+
+        archive_rows_layout = QHBoxLayout()
+        self.archive_rows_input = QLineEdit()
+        self.archive_rows_input.setStyleSheet("background-color: #3A3A3A; color: white; padding: 5px; font-size: 14px;")
+        self.archive_rows_input.setPlaceholderText("Rows (e.g. 0:20, 35)")
+        archive_rows_layout.addWidget(self.archive_rows_input)
+        archive_overlay_button = QPushButton("Overlay Rows")
+        archive_overlay_button.setStyleSheet("background-color: #5A9; color: white; padding: 10px; font-size: 14px;")
+        archive_overlay_button.clicked.connect(self.overlay_archive_rows)
+        archive_rows_layout.addWidget(archive_overlay_button)
+        scroll_layout.addLayout(archive_rows_layout)
+
+        self.archive_status = QLabel("")
+        self.archive_status.setStyleSheet("color: white; font-size: 13px; border: None")
+        self.archive_status.setWordWrap(True)
+        scroll_layout.addWidget(self.archive_status)
+
+        # Overlay of several spectra
+        overlay_label = QLabel("Overlay")
+        overlay_label.setStyleSheet("color: white; font-size: 16px; font-weight: bold; margin-top: 10px;")
+        scroll_layout.addWidget(overlay_label)
+
+        self.overlay_checkbox = QCheckBox("Add fetched spectra to the overlay")
+        self.overlay_checkbox.setStyleSheet("color: white; font-size: 14px; border: None")
+        scroll_layout.addWidget(self.overlay_checkbox)
+
+        self.overlay_list = QListWidget()
+        self.overlay_list.setStyleSheet("color: white; background-color: #3A3A3A; font-size: 13px;")
+        self.overlay_list.setFixedHeight(150)
+        self.overlay_list.itemChanged.connect(self.toggle_overlay_item)
+        scroll_layout.addWidget(self.overlay_list)
+
+        offset_layout = QHBoxLayout()
+        offset_label = QLabel("Offset per spectrum:")
+        offset_label.setStyleSheet("color: white; font-size: 14px; border: None")
+        offset_layout.addWidget(offset_label)
+        self.offset_spin = QDoubleSpinBox()
+        self.offset_spin.setRange(0, 1e6)
+        self.offset_spin.setDecimals(2)
+        self.offset_spin.setStyleSheet("background-color: #3A3A3A; color: white; padding: 5px; font-size: 14px;")
+        self.offset_spin.valueChanged.connect(self.apply_offsets)
+        offset_layout.addWidget(self.offset_spin)
+        scroll_layout.addLayout(offset_layout)
+
+        stack_layout = QHBoxLayout()
+        self.rest_frame_checkbox = QCheckBox("Rest frame")
+        self.rest_frame_checkbox.setStyleSheet("color: white; font-size: 14px; border: None")
+        stack_layout.addWidget(self.rest_frame_checkbox)
+        self.stack_button = QPushButton("Stack Visible Spectra")
+        self.stack_button.setStyleSheet("background-color: #5A9; color: white; padding: 10px; font-size: 14px;")
+        self.stack_button.clicked.connect(self.stack_visible_spectra)
+        stack_layout.addWidget(self.stack_button)
+        scroll_layout.addLayout(stack_layout)
+
+        lines_layout = QHBoxLayout()
+        self.line_list_button = QPushButton(f"Line List ({len(DEFAULT_LINES)} default)...")
+        self.line_list_button.setStyleSheet("background-color: #3A3A3A; color: white; padding: 10px; font-size: 14px;")
+        self.line_list_button.clicked.connect(self.choose_line_list)
+        lines_layout.addWidget(self.line_list_button)
+        self.measure_button = QPushButton("Measure Lines to CSV")
+        self.measure_button.setStyleSheet("background-color: #5A9; color: white; padding: 10px; font-size: 14px;")
+        self.measure_button.clicked.connect(self.measure_visible_lines)
+        lines_layout.addWidget(self.measure_button)
+        scroll_layout.addLayout(lines_layout)
+
+        redshift_layout = QHBoxLayout()
+        self.templates_button = QPushButton("Redshift Templates...")
+        self.templates_button.setStyleSheet("background-color: #3A3A3A; color: white; padding: 10px; font-size: 14px;")
+        self.templates_button.clicked.connect(self.choose_templates)
+        redshift_layout.addWidget(self.templates_button)
+        self.redshift_button = QPushButton("Estimate Redshifts")
+        self.redshift_button.setStyleSheet("background-color: #5A9; color: white; padding: 10px; font-size: 14px;")
+        self.redshift_button.clicked.connect(self.estimate_redshifts)
+        redshift_layout.addWidget(self.redshift_button)
+        scroll_layout.addLayout(redshift_layout)
+
+        clear_overlay_button = QPushButton("Clear Overlay")
+        clear_overlay_button.setStyleSheet("background-color: #5A9; color: white; padding: 10px; font-size: 14px;")
+        clear_overlay_button.clicked.connect(self.clear_spectra)
+        scroll_layout.addWidget(clear_overlay_button)
 
         # Object Details Section
         object_details_label = QLabel("Object Details")
@@ -199,6 +606,12 @@ class SpectrogramInspector(QWidget):
         # Add the object details grid to the scroll layout
         scroll_layout.addLayout(object_details_grid)
 
+        # Status of the metadata lookup
+        self.metadata_display = QLabel("")
+        self.metadata_display.setStyleSheet("color: white; font-size: 13px; border: None")
+        self.metadata_display.setWordWrap(True)
+        scroll_layout.addWidget(self.metadata_display)
+
         # Save Options
         save_spectrum_label = QLabel("Save Options")
         save_spectrum_label.setStyleSheet("color: white; font-size: 16px; font-weight: bold; margin-top: 10px;")
@@ -223,6 +636,8 @@ class SpectrogramInspector(QWidget):
 
     def fetch_spectrum(self):
         """Fetch spectrum data using selected mode."""
+        if self.lookup_thread is not None:
+            return
         if self.ra_dec_radio.isChecked():
             ra = self.ra_input.text()
             dec = self.dec_input.text()
@@ -230,20 +645,10 @@ class SpectrogramInspector(QWidget):
                 self.hover_text.setText("Error: RA and DEC are required.")
                 return
             try:
-                ra, dec = float(ra), float(dec)
-                plate, mjd, fiber = get_plate_mjd_fiber(ra, dec)
-                if plate and mjd and fiber:
-                    spectrum_file = fetch_spectrum_file(plate, mjd, fiber)
-                    specobj_id = get_specobj_id_pmf(plate, mjd, fiber)
-                    if spectrum_file:
-                        self.display_spectrum(spectrum_file)
-                        self.fetch_metadata(specobj_id)
-                    else:
-                        self.hover_text.setText("Error: Spectrum not found.")
-                else:
-                    self.hover_text.setText("Error: No Plate-MJD-Fiber found.")
+                self.lookup_thread = SpectrumLookupThread(ra=float(ra), dec=float(dec))
             except ValueError:
                 self.hover_text.setText("Error: Invalid RA or DEC format.")
+                return
 
         elif self.plate_mjd_fiber_radio.isChecked():
             plate = self.plate_input.text()
@@ -253,78 +658,485 @@ class SpectrogramInspector(QWidget):
                 self.hover_text.setText("Error: Plate, MJD, and Fiber ID are required.")
                 return
             try:
-                plate, mjd, fiber = int(plate), int(mjd), int(fiber)
-                spectrum_file = fetch_spectrum_file(plate, mjd, fiber)
-                specobj_id = get_specobj_id_pmf(plate, mjd, fiber)
-                if spectrum_file:
-                    self.display_spectrum(spectrum_file)
-                    self.fetch_metadata(specobj_id)
-                else:
-                    self.hover_text.setText("Error: Spectrum not found.")
+                self.lookup_thread = SpectrumLookupThread(plate=int(plate), mjd=int(mjd), fiber=int(fiber))
             except ValueError:
                 self.hover_text.setText("Error: Invalid Plate, MJD, or Fiber ID format.")
+                return
+
+        self.fetch_button.setEnabled(False)
+        self.metadata_display.setText("Fetching...")
+        self.lookup_thread.metadata_ready.connect(self.show_metadata)
+        self.lookup_thread.spectrum_ready.connect(self.on_spectrum_ready)
+        self.lookup_thread.finished.connect(self.on_lookup_finished)
+        self.lookup_thread.start()
+
+    def on_spectrum_ready(self, spectrum_file):
+        if spectrum_file:
+            self.display_spectrum(spectrum_file)
+        else:
+            self.hover_text.setText("Error: Spectrum not found.")
+            self.hover_text.setVisible(True)
+
+    def on_lookup_finished(self):
+        self.lookup_thread = None
+        self.fetch_button.setEnabled(True)
 
     def display_spectrum(self, spectrum_file):
         """Display the spectrum from the FITS file."""
         try:
-            with fits.open(spectrum_file) as hdul:
-                data = hdul[1].data
-                wavelengths = 10 ** data['loglam']  # Convert log(wavelength) to wavelength
-                intensities = data['flux']
-                self.plot_spectrum(wavelengths, intensities)
+            data = read_spectrum_columns(spectrum_file, ("loglam", "flux"))
+            wavelengths = 10 ** data['loglam'].astype(np.float64)  # Convert log(wavelength) to wavelength
+            intensities = data['flux']
+            self.plot_spectrum(wavelengths, intensities, os.path.splitext(os.path.basename(spectrum_file))[0], spectrum_file)
         except Exception as e:
             self.hover_text.setText(f"Error reading FITS file: {e}")
 
-    def plot_spectrum(self, wavelengths, intensities):
-        """Plot the spectrum on the interactive graph."""
-        self.plot_widget.clear()
-        self.plot_widget.setLimits(xMin=wavelengths.min(), xMax=wavelengths.max(), yMin=intensities.min(), yMax=intensities.max())  # Set graph boundaries
-        self.plot_widget.plot(wavelengths, intensities, pen=pg.mkPen(color=(0, 0, 255), width=2))  # Blue line
+    def plot_spectrum(self, wavelengths, intensities, label="", source=None):
+        """Plot the spectrum on the interactive graph, replacing the current ones unless overlaying."""
+        if not self.overlay_checkbox.isChecked():
+            self.clear_spectra()
+        self.add_spectrum(wavelengths, intensities, label, source)
         self.data_points = np.column_stack((wavelengths, intensities))  # Store data points
 
-    def update_hover(self, event):
-        """Update hover label with the current mouse position on the plot."""
-        pos = self.plot_widget.plotItem.vb.mapSceneToView(event)
-        x, y = pos.x(), pos.y()
-
-        # Check distances to the nearest data point for hover functionality
-        if self.data_points is not None:
-            distances = np.sqrt((self.data_points[:, 0] - x) ** 2 + (self.data_points[:, 1] - y) ** 2)
-            nearest_index = np.argmin(distances)
-            if distances[nearest_index] < 5:  # Threshold for hover detection
-                nearest_x, nearest_y = self.data_points[nearest_index]
-                self.hover_text.setText(f"<b>Wavelength:</b> {nearest_x:.2f} Å<br><b>Flux:</b> {nearest_y:.2e} erg/cm²/s/Å")
-                self.hover_text.setPos(nearest_x, nearest_y)
-                self.hover_text.setVisible(True)
-            else:
-                self.hover_text.setVisible(False)
+    def add_spectrum(self, wavelengths, intensities, label="", source=None):
+        """Add a spectrum to the overlay, with its own color and visibility toggle (source is its FITS file, if any)."""
+        # Hover lookups binary-search the wavelengths, so keep them sorted
+        order = np.argsort(wavelengths, kind="stable")
+        wavelengths = np.ascontiguousarray(wavelengths, dtype=np.float64)[order]
+        flux = np.ascontiguousarray(intensities, dtype=np.float64)[order]
+
+        index = len(self.spectra)
+        if index == 0:
+            pen = pg.mkPen(color=(0, 0, 255), width=2)  # Blue line
         else:
-            self.hover_text.setVisible(False)
-            
-    def fetch_metadata(self, specobj_id):
-        """Fetch and display metadata for the object based on SpecObjID."""
-        if not specobj_id:
-            self.show_metadata_error("Error: SpecObjID is required.")
-            return
+            pen = pg.mkPen(color=pg.intColor(index, hues=12, values=2, maxValue=220), width=1)
+        item = pg.PlotDataItem(wavelengths, flux, pen=pen)
+        item.opts["autoDownsampleFactor"] = SAMPLES_PER_PIXEL
+        self.plot_widget.addItem(item)  # Picks up the plot's clip-to-view and peak downsampling
+
+        spectrum = {
+            "wavelengths": wavelengths, "flux": flux, "label": label or f"Spectrum {index + 1}", "offset": 0.0, "item": item,
+            "source": source,
+        }
+        self.spectra.append(spectrum)
+
+        list_item = QListWidgetItem(spectrum["label"])
+        list_item.setFlags(list_item.flags() | Qt.ItemIsUserCheckable)
+        list_item.setCheckState(Qt.Checked)
+        list_item.setForeground(pen.color())
+        self.overlay_list.blockSignals(True)
+        self.overlay_list.addItem(list_item)
+        self.overlay_list.blockSignals(False)
 
+        # Spectra often arrive in bursts; restack them once the burst is over
+        self.layout_timer.start()
+
+    def clear_spectra(self):
+        """Remove every plotted spectrum."""
+        self.plot_widget.clear()
+        self.plot_widget.addItem(self.hover_text)  # clear() removes every item, including the hover label
+        self.hover_text.setVisible(False)
+        self.spectra = []
+        self.overlay_list.clear()
+        self.data_points = None
+
+    def toggle_overlay_item(self, list_item):
+        """Show or hide a spectrum when its overlay entry is checked or unchecked."""
+        spectrum = self.spectra[self.overlay_list.row(list_item)]
+        spectrum["item"].setVisible(list_item.checkState() == Qt.Checked)
+        self.apply_offsets()
+
+    def apply_offsets(self):
+        """Stack visible spectra vertically by the offset step and update the view limits."""
+        step = self.offset_spin.value()
+        visible = [spectrum for spectrum in self.spectra if spectrum["item"].isVisible()]
+        for position, spectrum in enumerate(visible):
+            offset = position * step
+            if offset != spectrum["offset"]:
+                spectrum["offset"] = offset
+                spectrum["item"].setPos(0, offset)  # Moves the curve without resampling it
+
+        if visible:
+            x_min = min(spectrum["wavelengths"][0] for spectrum in visible)
+            x_max = max(spectrum["wavelengths"][-1] for spectrum in visible)
+            y_min = min(np.nanmin(spectrum["flux"]) + spectrum["offset"] for spectrum in visible)
+            y_max = max(np.nanmax(spectrum["flux"]) + spectrum["offset"] for spectrum in visible)
+            self.plot_widget.setLimits(xMin=x_min, xMax=x_max, yMin=y_min, yMax=y_max)  # Set graph boundaries
+
+    def overlay_spectra(self, targets):
+        """
+        Fetch several spectra in the background and add each to the overlay as it arrives.
+
+        Parameters:
+            targets (list): (plate, mjd, fiber, label) tuples.
+        """
+        if self.fetch_thread is not None:
+            self.cancel_fetch()
+        self.overlay_checkbox.setChecked(True)
+        self.fetch_thread = SpectrumFetchThread(targets)
+        self.fetch_thread.spectrum_fetched.connect(self.add_spectrum_file)
+        self.fetch_thread.finished_signal.connect(self.on_overlay_fetched)
+        self.fetch_thread.start()
+
+    def cancel_fetch(self):
+        """Interrupt the running overlay fetch and drop its results, without waiting for its current download."""
+        thread = self.fetch_thread
+        self.fetch_thread = None
+        thread.spectrum_fetched.disconnect(self.add_spectrum_file)
+        thread.finished_signal.disconnect(self.on_overlay_fetched)
+        thread.requestInterruption()
+        # Keep a reference until the thread ends, so it is not destroyed while running
+        self.cancelled_fetches.add(thread)
+        thread.finished.connect(lambda: self.cancelled_fetches.discard(thread))
+        if thread.isFinished():
+            self.cancelled_fetches.discard(thread)
+
+    def add_spectrum_file(self, spectrum_file, label):
+        """Read a spectrum file and add it to the overlay."""
         try:
-            metadata = get_specobj_details(specobj_id)
-            if metadata:
-                # Update the labels with fetched metadata
-                self.specobj_id_value.setText(str(metadata["specObjID"]))
-                self.class_value.setText(metadata["class"])
-                self.subclass_value.setText(metadata.get("subclass", "N/A"))
-                self.redshift_value.setText(f"{metadata['redshift']:.4f} ± {metadata['redshift_error']:.4f}")
-                self.ra_value.setText(f"{metadata['ra']:.5f}")
-                self.dec_value.setText(f"{metadata['dec']:.5f}")
-                self.mjd_value.setText(str(metadata["mjd"]))
-                self.plate_value.setText(str(metadata["plate"]))
-                self.fiber_id_value.setText(str(metadata["fiberID"]))
-            else:
-                self.show_metadata_error("No metadata found for the given SpecObjID.")
+            data = read_spectrum_columns(spectrum_file, ("loglam", "flux"))
+            self.add_spectrum(10 ** data['loglam'].astype(np.float64), data['flux'], label, spectrum_file)
         except Exception as e:
-            self.show_metadata_error(f"Error fetching metadata: {e}")
+            print(f"Error reading {spectrum_file}: {e}")
+
+    def stack_visible_spectra(self):
+        """Stack the visible spectra read from files or archives and add the mean and median stacks to the overlay."""
+        if self.stack_thread is not None:
+            return
+        spectrum_files = [spectrum["source"] for spectrum in self.spectra if spectrum["source"] and spectrum["item"].isVisible()]
+        if len(spectrum_files) < 2:
+            self.hover_text.setText("Error: Stacking needs at least two visible spectra read from files or archives.")
+            self.hover_text.setVisible(True)
+            return
+        self.stack_button.setEnabled(False)
+        self.stack_thread = SpectrumStackThread(spectrum_files, self.rest_frame_checkbox.isChecked())
+        self.stack_thread.finished_signal.connect(self.on_stack_complete)
+        self.stack_thread.start()
+
+    def on_stack_complete(self, result, error):
+        self.stack_thread = None
+        self.stack_button.setEnabled(True)
+        if result is None:
+            self.hover_text.setText(f"Error stacking spectra: {error}")
+            self.hover_text.setVisible(True)
+            return
+        self.overlay_checkbox.setChecked(True)
+        wavelengths = 10 ** result["loglam"]
+        frame = "rest" if self.rest_frame_checkbox.isChecked() else "observed"
+        count = int(result["count"].max())
+        self.add_spectrum(wavelengths, result["mean"], f"Weighted mean of {count} ({frame})")
+        self.add_spectrum(wavelengths, result["median"], f"Median of {count} ({frame})")
+
+    def on_overlay_fetched(self, failed):
+        self.fetch_thread = None
+        if failed:
+            self.hover_text.setText(f"Error: {failed} spectra could not be fetched.")
+            self.hover_text.setVisible(True)
+
+    def choose_line_list(self):
+        """Load a line list from CSV (cancel to return to the default list)."""
+        file_path, _ = QFileDialog.getOpenFileName(self, "Load Line List", "", "CSV Files (*.csv)")
+        if not file_path:
+            self.lines = DEFAULT_LINES
+            self.line_list_button.setText(f"Line List ({len(DEFAULT_LINES)} default)...")
+            return
+        try:
+            self.lines = load_line_list(file_path)
+        except (OSError, ValueError) as e:
+            self.hover_text.setText(f"Error reading line list: {e}")
+            self.hover_text.setVisible(True)
+            return
+        self.line_list_button.setText(f"Line List ({len(self.lines)} from {os.path.basename(file_path)})...")
+
+    def measure_visible_lines(self):
+        """Measure the line list in the visible spectra read from files or archives and save the table as CSV."""
+        if self.measure_thread is not None:
+            return
+        visible = [spectrum for spectrum in self.spectra if spectrum["source"] and spectrum["item"].isVisible()]
+        if not visible:
+            self.hover_text.setText("Error: Line measurement needs visible spectra read from files or archives.")
+            self.hover_text.setVisible(True)
+            return
+        file_path, _ = QFileDialog.getSaveFileName(self, "Save Line Measurements", "", "CSV Files (*.csv)")
+        if not file_path:
+            return
+        self.measure_button.setEnabled(False)
+        self.measure_thread = LineMeasureThread(
+            [spectrum["source"] for spectrum in visible], [spectrum["label"] for spectrum in visible],
+            self.lines, self.rest_frame_checkbox.isChecked(), file_path
+        )
+        self.measure_thread.finished_signal.connect(self.on_measure_complete)
+        self.measure_thread.start()
+
+    def on_measure_complete(self, count, skipped, error):
+        rest_frame = self.measure_thread.rest_frame
+        self.measure_thread = None
+        self.measure_button.setEnabled(True)
+        if error:
+            self.hover_text.setText(f"Error measuring lines: {error}")
+        elif skipped:
+            reason = "no redshift or no valid pixels" if rest_frame else "no valid pixels"
+            self.hover_text.setText(
+                f"Measured {len(self.lines)} lines in {count - skipped} of {count} spectra "
+                f"({skipped} skipped: {reason})."
+            )
+        else:
+            self.hover_text.setText(f"Measured {len(self.lines)} lines in {count} spectra.")
+        self.hover_text.setVisible(True)
+
+    def choose_templates(self):
+        """Load rest-frame redshift templates from FITS files."""
+        file_paths, _ = QFileDialog.getOpenFileNames(self, "Load Redshift Templates", "", "FITS Files (*.fits *.fit)")
+        if not file_paths:
+            return
+        try:
+            self.templates = load_templates(file_paths)
+        except (OSError, ValueError, KeyError) as e:
+            self.hover_text.setText(f"Error reading templates: {e}")
+            self.hover_text.setVisible(True)
+            return
+        self.templates_button.setText(f"Redshift Templates ({len(self.templates)})...")
+
+    def estimate_redshifts(self):
+        """Cross-correlate the visible spectra read from files or archives with the loaded templates."""
+        if self.redshift_thread is not None:
+            return
+        if not self.templates:
+            self.choose_templates()
+            if not self.templates:
+                return
+        visible = [spectrum for spectrum in self.spectra if spectrum["source"] and spectrum["item"].isVisible()]
+        if not visible:
+            self.hover_text.setText("Error: Redshift estimation needs visible spectra read from files or archives.")
+            self.hover_text.setVisible(True)
+            return
+        self.redshift_button.setEnabled(False)
+        self.redshift_thread = RedshiftThread(
+            [spectrum["source"] for spectrum in visible], [spectrum["label"] for spectrum in visible], self.templates
+        )
+        self.redshift_thread.finished_signal.connect(self.on_redshifts_estimated)
+        self.redshift_thread.start()
+
+    def on_redshifts_estimated(self, results, error):
+        self.redshift_thread = None
+        self.redshift_button.setEnabled(True)
+        if error:
+            self.hover_text.setText(f"Error estimating redshifts: {error}")
+            self.hover_text.setVisible(True)
+            return
+        lines = []
+        for label, pipeline_z, result in results[:10]:
+            line = f"<b>{label}</b>: z = {result['z']:.5f} ({result['template']}, peak {result['peak']:.2f}, {result['significance']:.1f}σ)"
+            if pipeline_z is not None:
+                line += f", pipeline z = {pipeline_z:.5f}"
+            others = ", ".join(f"{z:.4f}" for z, _, _ in result["peaks"][1:])
+            if others:
+                line += f"; other peaks at z = {others}"
+            lines.append(line)
+        if len(results) > 10:
+            lines.append(f"... and {len(results) - 10} more")
+        self.hover_text.setHtml("<br>".join(lines))
+        self.hover_text.setVisible(True)
+
+    def archive_path(self):
+        return self.archive_input.text().strip() or os.path.join(get_data_dir(), "spectra.zarr")
+
+    def archive_downloaded_spectra(self):
+        """Append every downloaded spectrum not yet archived to the Zarr archive, in the background."""
+        if self.archive_thread is not None:
+            return
+        spectrum_files = sorted(glob.glob(os.path.join(get_data_dir("spectra"), "*", "spec-*.fits")))
+        if not spectrum_files:
+            self.archive_status.setText("<span style='color: red;'>No downloaded spectra to archive.</span>")
+            return
+        self.archive_button.setEnabled(False)
+        self.archive_status.setText(f"Archiving {len(spectrum_files)} spectra...")
+        self.archive_thread = SpectrumArchiveThread(self.archive_path(), spectrum_files)
+        self.archive_thread.progress.connect(
+            lambda done: self.archive_status.setText(f"Archiving: {done} of {len(spectrum_files)} files read...")
+        )
+        self.archive_thread.finished_signal.connect(self.on_archive_complete)
+        self.archive_thread.start()
+
+    def on_archive_complete(self, added, count, error):
+        self.archive_thread = None
+        self.archive_button.setEnabled(True)
+        if error:
+            self.archive_status.setText(f"<span style='color: red;'>Error archiving spectra: {error}</span>")
+        else:
+            self.archive_status.setText(f"Added {added} spectra; the archive holds {count}.")
+
+    def overlay_archive_rows(self):
+        """Add the selected rows of the archive to the overlay, trimmed to the pixels each spectrum covers."""
+        path = self.archive_path()
+        try:
+            archive = SpectrumArchive(path, mode="r")
+            rows = parse_archive_rows(self.archive_rows_input.text(), len(archive))
+            spectra = archive.read(rows) if rows else []
+        except (OSError, ValueError, KeyError) as e:  # Missing archive, bad row list
+            self.archive_status.setText(f"<span style='color: red;'>Error reading archive: {e}</span>")
+            return
+        if not spectra:
+            self.archive_status.setText("<span style='color: red;'>No archive rows selected.</span>")
+            return
+        self.overlay_checkbox.setChecked(True)
+        for row, spectrum in zip(rows, spectra):
+            covered = np.flatnonzero(spectrum["ivar"] > 0)
+            if covered.size:
+                pixels = slice(covered[0], covered[-1] + 1)
+                self.add_spectrum(10 ** spectrum["loglam"][pixels], spectrum["flux"][pixels], spectrum["name"], (path, row))
+        self.archive_status.setText(f"Overlaid {len(spectra)} of {len(archive)} archived spectra.")
+
+    def start_bulk_download(self):
+        """Download every spectrum of the entered plates, plate-MJDs or SpecObjIDs."""
+        try:
+            plates, specobj_ids = parse_bulk_targets(self.bulk_input.text())
+        except ValueError:
+            self.bulk_status.setText("<span style='color: red;'>Enter plates, Plate-MJD pairs or SpecObjIDs.</span>")
+            return
+        if not plates and not specobj_ids:
+            self.bulk_status.setText("<span style='color: red;'>Enter at least one plate or SpecObjID.</span>")
+            return
+        self.download_spectra(plates, specobj_ids)
+
+    def download_spectra(self, plates=(), specobj_ids=()):
+        """
+        Queue the spectra of plates and SpecObjIDs on the shared download manager.
+
+        The fibers are listed in the background; the downloads then run
+        concurrently under data/spectra/<plate>/, skipping files already there
+        and retrying failures with backoff.
+
+        Parameters:
+            plates (list): (plate, mjd or None) tuples; None takes every plugging of the plate.
+            specobj_ids (list): SpecObjIDs, e.g. from a search.
+        """
+        if self.list_thread is not None or self.bulk_jobs is not None:
+            self.bulk_status.setText("<span style='color: red;'>A bulk download is already running.</span>")
+            return
+        self.bulk_button.setEnabled(False)
+        self.bulk_status.setText("Listing spectra...")
+        self.list_thread = SpectrumListThread(list(plates), list(specobj_ids))
+        self.list_thread.finished_signal.connect(self.on_spectra_listed)
+        self.list_thread.start()
+
+    def on_spectra_listed(self, rows):
+        self.list_thread = None
+        jobs = spectrum_jobs(rows, SPECTRUM_HDUS if self.coadd_only_checkbox.isChecked() else None)
+        if not jobs:
+            self.bulk_button.setEnabled(True)
+            self.bulk_status.setText("<span style='color: red;'>No spectra found.</span>")
+            return
+        self.bulk_progress.setValue(0)
+        self.bulk_progress.setVisible(True)
+        self.bulk_status.setText(f"Downloading {len(jobs)} spectra...")
+        self.bulk_jobs = (self.downloads.enqueue_many(jobs, BULK), [destination for _, destination, _ in jobs])
+        self.on_bulk_progress()
+
+    def on_bulk_progress(self, job_id=None):
+        """Track the bulk download and report once all of its jobs have finished."""
+        if self.bulk_jobs is None:
+            return
+        job_ids, paths = self.bulk_jobs
+        states = self.downloads.states(job_ids)
+        finished = [state for state in states.values() if state in FINISHED_STATES]
+        self.bulk_progress.setValue(int(len(finished) / len(job_ids) * 100))
+        if len(finished) < len(states):
+            return
+
+        self.bulk_jobs = None
+        self.bulk_button.setEnabled(True)
+        self.bulk_progress.setVisible(False)
+        failed = finished.count("failed")
+        fetched, present = finished.count("done"), finished.count("local")
+        directories = sorted({os.path.relpath(os.path.dirname(path), get_data_dir()) for path in paths})
+        message = (
+            f"{fetched} spectra downloaded, {present} already present, into "
+            f"{', '.join(directories) if len(directories) <= 3 else f'{len(directories)} plate directories'}"
+        )
+        if failed:
+            message += f" <span style='color: red;'>({failed} failed; retry them from the download queue)</span>"
+        self.bulk_status.setText(message)
+
+    def schedule_hover(self, position):
+        """Record the cursor position and coalesce hover lookups to the display refresh rate."""
+        self.hover_position = position
+        if not self.hover_timer.isActive():
+            self.hover_timer.start()
+
+    def nearest_point(self, wavelengths, flux, x, y, pixel_width, pixel_height):
+        """
+        Find the point of one spectrum nearest to (x, y) in screen pixels.
+
+        Only points within HOVER_RADIUS_PX horizontally are considered; they are
+        located by binary search, so the cost does not grow with the spectrum length.
+
+        Returns:
+            tuple: (index, distance in pixels), or (None, inf) if no point is close.
+        """
+        radius = HOVER_RADIUS_PX * pixel_width
+        start = np.searchsorted(wavelengths, x - radius, side="left")
+        stop = np.searchsorted(wavelengths, x + radius, side="right")
+        if stop <= start:
+            return None, np.inf
+        step = max(1, (stop - start) // HOVER_MAX_CANDIDATES)
+        candidates = np.arange(start, stop, step)
+
+        dx = (wavelengths[candidates] - x) / pixel_width
+        dy = (flux[candidates] - y) / pixel_height
+        distances = np.hypot(dx, dy)
+        distances[~np.isfinite(distances)] = np.inf
+        nearest = int(np.argmin(distances))
+        return int(candidates[nearest]), float(distances[nearest])
+
+    def update_hover(self):
+        """Update hover label with the data point nearest to the cursor, if it is close on screen."""
+        if self.hover_position is None or not self.spectra:
+            self.hover_text.setVisible(False)
+            return
+
+        view_box = self.plot_widget.plotItem.vb
+        pos = view_box.mapSceneToView(self.hover_position)
+        pixel_width, pixel_height = view_box.viewPixelSize()
+        if not pixel_width or not pixel_height:
+            return
+
+        best = (None, np.inf, None)
+        for spectrum in self.spectra:
+            if not spectrum["item"].isVisible():
+                continue
+            index, distance = self.nearest_point(
+                spectrum["wavelengths"], spectrum["flux"], pos.x(), pos.y() - spectrum["offset"], pixel_width, pixel_height
+            )
+            if distance < best[1]:
+                best = (index, distance, spectrum)
 
+        index, distance, spectrum = best
+        if index is None or distance > HOVER_RADIUS_PX:
+            self.hover_text.setVisible(False)
+            return
+
+        nearest_x, nearest_y = spectrum["wavelengths"][index], spectrum["flux"][index]
+        label = f"<b>{spectrum['label']}</b><br>" if len(self.spectra) > 1 else ""
+        self.hover_text.setHtml(f"{label}<b>Wavelength:</b> {nearest_x:.2f} Å<br><b>Flux:</b> {nearest_y:.2e} erg/cm²/s/Å")
+        self.hover_text.setPos(nearest_x, nearest_y + spectrum["offset"])
+        self.hover_text.setVisible(True)
+
+    def show_metadata(self, metadata):
+        """Display the metadata of the fetched spectrum."""
+        if not metadata:
+            self.show_metadata_error("No spectrum found for the given position or Plate-MJD-Fiber.")
+            return
+        self.specobj_id_value.setText(str(metadata["specObjID"]))
+        self.class_value.setText(metadata["class"])
+        self.subclass_value.setText(metadata.get("subclass") or "N/A")
+        self.redshift_value.setText(f"{metadata['redshift']:.4f} ± {metadata['redshift_error']:.4f}")
+        self.ra_value.setText(f"{metadata['ra']:.5f}")
+        self.dec_value.setText(f"{metadata['dec']:.5f}")
+        self.mjd_value.setText(str(metadata["mjd"]))
+        self.plate_value.setText(str(metadata["plate"]))
+        self.fiber_id_value.setText(str(metadata["fiberID"]))
+        self.metadata_display.setText("")
 
     def show_metadata_error(self, message):
         """Helper function to clear metadata fields and display an error."""
@@ -348,3 +1160,24 @@ class SpectrogramInspector(QWidget):
         file_path, _ = QFileDialog.getSaveFileName(self, "Save Spectrum Data", "", "CSV Files (*.csv)")
         if file_path:
             np.savetxt(file_path, self.data_points, delimiter=",", header="Wavelength (Å),Flux (erg/cm^2/s/Å)", comments="")
+
+    def closeEvent(self, event):
+        """Stop background fetches and stop tracking downloads before closing."""
+        if self.fetch_thread is not None:
+            self.cancel_fetch()
+        for thread in list(self.cancelled_fetches):
+            thread.wait()
+        if self.lookup_thread is not None:
+            self.lookup_thread.wait()
+        if self.stack_thread is not None:
+            self.stack_thread.wait()
+        if self.list_thread is not None:
+            self.list_thread.wait()
+        if self.measure_thread is not None:
+            self.measure_thread.wait()
+        if self.redshift_thread is not None:
+            self.redshift_thread.wait()
+        if self.archive_thread is not None:
+            self.archive_thread.wait()
+        self.downloads.job_changed.disconnect(self.on_bulk_progress)
+        event.accept()
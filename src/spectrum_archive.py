@@ -0,0 +1,239 @@
+import itertools
+import os
+import re
+import numpy as np
+import zarr
+
+from spectral_stack import read_spectrum, common_grid, resample_chunk, LOGLAM_STEP, CHUNK_SPECTRA
+from redshift import OBSERVED_LOGLAM
+
+
+# Spectra per chunk along the first axis, and pixels per chunk along the second
+CHUNK_ROWS = 64
+CHUNK_PIXELS = 1024
+
+# Metadata rows per chunk
+CHUNK_METADATA = 16384
+
+# Spectra whose pixels lie within this fraction of a pixel of the archive grid are copied without resampling
+ALIGN_TOLERANCE = 0.01
+
+# Per-spectrum metadata columns and their types (missing integers are -1, missing redshifts NaN)
+METADATA_COLUMNS = {"name": str, "plate": "i4", "mjd": "i4", "fiber": "i4", "z": "f4"}
+
+# Pixel arrays, in the order they are written
+PIXEL_ARRAYS = {"flux": "f4", "ivar": "f4", "and_mask": "i4"}
+
+SPEC_NAME = re.compile(r"spec-(\d+)-(\d+)-(\d+)")
+
+
+def spectrum_metadata(file_path, spectrum):
+    """Metadata row of a spectrum file, with plate, MJD and fiber parsed from a spec-PPPP-MJD-FFFF name."""
+    name = os.path.splitext(os.path.basename(file_path))[0]
+    match = SPEC_NAME.match(name)
+    plate, mjd, fiber = (int(value) for value in match.groups()) if match else (-1, -1, -1)
+    z = spectrum.get("z")
+    return {"name": name, "plate": plate, "mjd": mjd, "fiber": fiber, "z": np.nan if z is None else z}
+
+
+def grid_rows(spectra, grid):
+    """
+    Put a chunk of spectra on the archive grid.
+
+    Spectra sampled on the grid's own pixel lattice (every SDSS spectrum on the
+    default grid) are copied pixel for pixel; others are linearly resampled,
+    with the mask of the nearest input pixel.
+
+    Returns:
+        tuple: (flux, ivar, and_mask) arrays of shape (len(spectra), len(grid)); uncovered pixels are zero.
+    """
+    count, pixels = len(spectra), len(grid)
+    step = grid[1] - grid[0]
+    flux = np.zeros((count, pixels), dtype=np.float32)
+    ivar = np.zeros((count, pixels), dtype=np.float32)
+    and_mask = np.zeros((count, pixels), dtype=np.int32)
+
+    resampled = []
+    for row, spectrum in enumerate(spectra):
+        loglam = spectrum["loglam"]
+        n = len(loglam)
+        spectrum_step = (loglam[-1] - loglam[0]) / max(n - 1, 1)
+        offset = (loglam[0] - grid[0]) / step
+        first = int(round(offset))
+        if abs(offset - first) > ALIGN_TOLERANCE or abs(spectrum_step - step) * n > ALIGN_TOLERANCE * step:
+            resampled.append(row)
+            continue
+        low, high = max(first, 0), min(first + n, pixels)
+        if high <= low:
+            continue
+        source = slice(low - first, high - first)
+        good = np.isfinite(spectrum["flux"][source]) & np.isfinite(spectrum["ivar"][source])
+        flux[row, low:high] = np.where(good, spectrum["flux"][source], 0)
+        ivar[row, low:high] = np.where(good, spectrum["ivar"][source], 0)
+        if spectrum.get("and_mask") is not None:
+            and_mask[row, low:high] = spectrum["and_mask"][source]
+
+    if resampled:
+        chunk = [spectra[row] for row in resampled]
+        flux[resampled], ivar[resampled] = resample_chunk(chunk, grid, mask_bits=0)  # Masks are kept separately
+        for row, spectrum in zip(resampled, chunk):
+            if spectrum.get("and_mask") is None:
+                continue
+            loglam = spectrum["loglam"]
+            nearest = np.rint((grid - loglam[0]) / ((loglam[-1] - loglam[0]) / max(len(loglam) - 1, 1))).astype(np.int64)
+            inside = (nearest >= 0) & (nearest < len(loglam))
+            and_mask[row, inside] = spectrum["and_mask"][nearest[inside]]
+    return flux, ivar, and_mask
+
+
+class SpectrumArchive:
+    """
+    Many spectra packed into chunked Zarr arrays on one common log-wavelength grid.
+
+    The archive is a directory holding "loglam" (the grid), "flux", "ivar" and
+    "and_mask" as (spectra x pixels) arrays chunked along both axes, and one
+    column per metadata field under "meta/". Spectra are appended in chunks,
+    and any row, slice or list of rows is read without touching the others.
+    Rows read back are dictionaries like spectral_stack.read_spectrum returns,
+    so stacking, line measurement and redshift estimation work on them directly.
+    """
+
+    def __init__(self, path, mode="a", grid=None):
+        self.path = path
+        self.group = zarr.open_group(path, mode=mode)
+        if "loglam" not in self.group:
+            if mode == "r":
+                raise ValueError(f"{path} is not a spectrum archive.")
+            self.create(common_grid(*OBSERVED_LOGLAM, LOGLAM_STEP) if grid is None else np.asarray(grid))
+        self.loglam = self.group["loglam"][:]
+        self.meta = self.group["meta"]
+        if mode != "r":
+            self.truncate_partial()
+
+    def create(self, grid):
+        """Create the empty arrays of a new archive."""
+        self.group.create_array("loglam", data=np.asarray(grid, dtype=np.float64))
+        for name, dtype in PIXEL_ARRAYS.items():
+            self.group.create_array(
+                name, shape=(0, len(grid)), chunks=(CHUNK_ROWS, CHUNK_PIXELS), dtype=dtype, fill_value=0
+            )
+        meta = self.group.create_group("meta")
+        for name, dtype in METADATA_COLUMNS.items():
+            meta.create_array(name, shape=(0,), chunks=(CHUNK_METADATA,), dtype=dtype)
+
+    def truncate_partial(self):
+        """Drop rows of an append that was interrupted before its metadata was written."""
+        count = len(self)
+        for name in PIXEL_ARRAYS:
+            if self.group[name].shape[0] != count:
+                self.group[name].resize((count, len(self.loglam)))
+
+    def __len__(self):
+        return self.meta["name"].shape[0]
+
+    def names(self):
+        """Names of the archived spectra."""
+        return self.meta["name"][:]
+
+    def metadata(self, rows=slice(None)):
+        """Metadata columns of the selected rows (an index, slice or list of indices)."""
+        rows = [rows] if isinstance(rows, (int, np.integer)) else rows
+        return {name: self.meta[name].oindex[rows] if not isinstance(rows, slice) else self.meta[name][rows]
+                for name in METADATA_COLUMNS}
+
+    def append(self, spectra, metadata):
+        """
+        Append spectra and their metadata rows (dictionaries with the METADATA_COLUMNS keys).
+
+        Returns:
+            int: Number of spectra in the archive afterwards.
+        """
+        if not spectra:
+            return len(self)
+        flux, ivar, and_mask = grid_rows(spectra, self.loglam)
+        for name, values in zip(PIXEL_ARRAYS, (flux, ivar, and_mask)):
+            self.group[name].append(values, axis=0)
+        # Metadata last: its length is the number of complete rows
+        for name, dtype in METADATA_COLUMNS.items():
+            self.meta[name].append(np.array([row[name] for row in metadata], dtype=dtype), axis=0)
+        return len(self)
+
+    def append_files(self, file_paths, chunk_size=CHUNK_SPECTRA, progress_callback=None):
+        """
+        Append spectrum files, reading them a chunk at a time and skipping names already archived.
+
+        Parameters:
+            progress_callback (callable): Called with the number of files processed so far.
+
+        Returns:
+            int: Number of spectra added.
+        """
+        present = set(self.names())
+        file_paths = [
+            path for path in file_paths if os.path.splitext(os.path.basename(path))[0] not in present
+        ]
+        added = 0
+        for start in range(0, len(file_paths), chunk_size):
+            spectra, metadata = [], []
+            for path in file_paths[start:start + chunk_size]:
+                try:
+                    spectrum = read_spectrum(path)
+                except (OSError, ValueError, KeyError) as e:
+                    print(f"Error reading {path}: {e}")
+                    continue
+                spectra.append(spectrum)
+                metadata.append(spectrum_metadata(path, spectrum))
+            self.append(spectra, metadata)
+            added += len(spectra)
+            if progress_callback:
+                progress_callback(min(start + chunk_size, len(file_paths)))
+        return added
+
+    def read(self, rows):
+        """
+        Read spectra by row (an index, slice or list of indices).
+
+        Returns:
+            list: Dictionaries with "loglam" (the shared grid), "flux", "ivar", "and_mask", "z" (None if unknown) and "name".
+        """
+        if isinstance(rows, (int, np.integer)):
+            rows = [rows]
+        if isinstance(rows, slice):
+            arrays = [self.group[name][rows] for name in PIXEL_ARRAYS]
+        else:
+            arrays = [self.group[name].oindex[list(rows), :] for name in PIXEL_ARRAYS]
+        metadata = self.metadata(rows)
+        return [
+            {
+                "loglam": self.loglam, "flux": flux, "ivar": ivar, "and_mask": and_mask,
+                "z": None if np.isnan(z) else float(z), "name": str(name),
+            }
+            for flux, ivar, and_mask, z, name in zip(*arrays, metadata["z"], metadata["name"])
+        ]
+
+    def iter_spectra(self, rows=None, chunk_size=CHUNK_ROWS):
+        """Yield spectra of all rows (or of a list of rows), reading a chunk of rows at a time."""
+        if rows is None:
+            for start in range(0, len(self), chunk_size):
+                yield from self.read(slice(start, start + chunk_size))
+        else:
+            rows = iter(rows)
+            while chunk := list(itertools.islice(rows, chunk_size)):
+                yield from self.read(chunk)
+
+
+def read_sources(sources):
+    """
+    Read spectra from mixed sources in order: spectrum file paths, or (archive path, row) tuples.
+
+    Each archive is opened once, however many of its rows are read.
+    """
+    archives = {}
+    for source in sources:
+        if isinstance(source, tuple):
+            path, row = source
+            if path not in archives:
+                archives[path] = SpectrumArchive(path, mode="r")
+            yield archives[path].read(row)[0]
+        else:
+            yield read_spectrum(source)
@@ -0,0 +1,346 @@
+import os
+import numpy as np
+import requests
+
+
+# FITS header and data blocks are multiples of this many bytes
+BLOCK_SIZE = 2880
+
+# Columns read by default from the COADD table of a spec-lite file
+SPECTRUM_COLUMNS = ("loglam", "flux", "ivar", "and_mask")
+
+# Table HDUs fetched when only the spectrum is needed: COADD, and SPALL for the pipeline redshift
+SPECTRUM_HDUS = (1, 2)
+
+# Bytes requested per header read from a remote file (one request covers a typical spec-lite primary header)
+READ_AHEAD = 64 * 1024
+
+CHUNK_SIZE = 64 * 1024
+
+# Binary-table TFORM codes that map onto fixed-width big-endian numbers
+TFORM_TYPES = {"B": "u1", "I": ">i2", "J": ">i4", "K": ">i8", "E": ">f4", "D": ">f8"}
+
+# Width in bytes of the remaining TFORM codes, which are only skipped over
+TFORM_WIDTHS = {"L": 1, "A": 1, "X": 1 / 8, "C": 8, "M": 16, "P": 8, "Q": 16}
+
+
+def scan_header(handle):
+    """
+    Read one FITS header from the current position, keeping only structural keywords.
+
+    Cards are split directly instead of building a full astropy Header, which
+    is what dominates the cost of opening small files.
+
+    Returns:
+        dict: Keyword -> value (strings unquoted and stripped, numbers as int or float), or None at end of file.
+    """
+    keywords = {}
+    while True:
+        block = handle.read(BLOCK_SIZE)
+        if not block and not keywords:
+            return None  # End of file
+        if len(block) < BLOCK_SIZE:
+            raise ValueError("Truncated FITS header.")
+        for start in range(0, BLOCK_SIZE, 80):
+            card = block[start:start + 80].decode("ascii", "replace")
+            key = card[:8].strip()
+            if key == "END":
+                return keywords
+            if card[8:10] != "= " or not (key.startswith(("NAXIS", "TFORM", "TTYPE", "TSCAL", "TZERO")) or key in (
+                "SIMPLE", "XTENSION", "BITPIX", "PCOUNT", "GCOUNT", "TFIELDS", "EXTNAME", "PARTIAL"
+            )):
+                continue
+            value = card[10:]
+            if value.lstrip().startswith("'"):
+                keywords[key] = value.split("'")[1].strip()
+            else:
+                value = value.split("/")[0].strip()
+                try:
+                    keywords[key] = int(value)
+                except ValueError:
+                    try:
+                        keywords[key] = float(value)
+                    except ValueError:
+                        keywords[key] = value
+
+
+def data_size(keywords):
+    """Size in bytes of an HDU's data, padded to whole blocks."""
+    naxis = keywords.get("NAXIS", 0)
+    if naxis == 0:
+        return 0
+    count = 1
+    for axis in range(1, naxis + 1):
+        count *= keywords[f"NAXIS{axis}"]
+    size = abs(keywords["BITPIX"]) // 8 * keywords.get("GCOUNT", 1) * (keywords.get("PCOUNT", 0) + count)
+    return -(-size // BLOCK_SIZE) * BLOCK_SIZE
+
+
+def iter_headers(handle):
+    """
+    Walk the HDUs of a FITS file from the start, skipping their data.
+
+    Yields:
+        tuple: (HDU index, header keywords, byte offset of the header, byte offset of the data)
+    """
+    handle.seek(0)
+    if handle.read(6) != b"SIMPLE":
+        raise ValueError("Not a FITS file.")
+    handle.seek(0)
+    index = 0
+    while True:
+        header_offset = handle.tell()
+        keywords = scan_header(handle)
+        if keywords is None:
+            return
+        data_offset = handle.tell()
+        yield index, keywords, header_offset, data_offset
+        handle.seek(data_offset + data_size(keywords))
+        index += 1
+
+
+def is_hdu(index, keywords, hdu):
+    """Return True if the HDU at `index` with these keywords is `hdu` (an index or EXTNAME)."""
+    return index == hdu or (isinstance(hdu, str) and keywords.get("EXTNAME", "").upper() == hdu.upper())
+
+
+def find_table(handle, hdu):
+    """
+    Locate a binary table HDU by index or EXTNAME.
+
+    Returns:
+        tuple: (header keywords, byte offset of the table header, byte offset of the table data)
+    """
+    return find_tables(handle, (hdu,))[0]
+
+
+def find_tables(handle, hdus):
+    """
+    Locate several binary table HDUs (by index or EXTNAME) in one pass over the headers.
+
+    Returns:
+        list: (header keywords, header offset, data offset) of each table, in the order requested.
+    """
+    found = {}
+    for index, keywords, header_offset, data_offset in iter_headers(handle):
+        for hdu in hdus:
+            if hdu not in found and is_hdu(index, keywords, hdu):
+                if keywords.get("XTENSION") != "BINTABLE":
+                    raise ValueError(f"HDU {hdu} is not a binary table.")
+                found[hdu] = (keywords, header_offset, data_offset)
+        if len(found) == len(hdus):
+            return [found[hdu] for hdu in hdus]
+    missing = next(hdu for hdu in hdus if hdu not in found)
+    raise ValueError(f"HDU {missing} not found.")
+
+
+def row_dtype(keywords):
+    """Structured big-endian dtype of one table row (columns that cannot be read become padding)."""
+    names, formats, offsets = [], [], []
+    offset = 0
+    for column in range(1, keywords["TFIELDS"] + 1):
+        tform = keywords[f"TFORM{column}"].strip()
+        digits = len(tform) - len(tform.lstrip("0123456789"))
+        repeat = int(tform[:digits]) if digits else 1
+        code = tform[digits:digits + 1]
+        if code in TFORM_TYPES:
+            name = keywords.get(f"TTYPE{column}", f"col{column}")
+            names.append(name)
+            formats.append((TFORM_TYPES[code], (repeat,)) if repeat != 1 else TFORM_TYPES[code])
+            offsets.append(offset)
+            width = np.dtype(TFORM_TYPES[code]).itemsize * repeat
+        else:
+            width = int(np.ceil(repeat * TFORM_WIDTHS[code]))
+        offset += width
+    if offset != keywords["NAXIS1"]:
+        raise ValueError("Table columns do not match the row width.")
+    return np.dtype({"names": names, "formats": formats, "offsets": offsets, "itemsize": offset})
+
+
+def read_columns(file_path, columns=SPECTRUM_COLUMNS, hdu=1, dtype=np.float32):
+    """
+    Read selected columns of a FITS binary table through a memory map.
+
+    Only the requested columns are copied out, as contiguous native arrays:
+    floating-point and scaled (TSCAL/TZERO) columns as `dtype`, integer columns
+    such as bit masks in their own integer type. The rest of the table is never
+    parsed or converted, and no astropy record array is built.
+
+    Parameters:
+        columns (tuple): Column names (case-insensitive).
+        hdu (int or str): HDU index or EXTNAME (1 is the COADD table of spec-lite files).
+
+    Returns:
+        dict: Column name (as requested) -> array.
+    """
+    with open(file_path, "rb") as handle:
+        keywords, _, offset = find_table(handle, hdu)
+    rows = keywords["NAXIS2"]
+    row = row_dtype(keywords)
+
+    table = np.memmap(file_path, dtype=row, mode="r", offset=offset, shape=(rows,)) if rows else np.empty(0, row)
+    try:
+        fields = {name.lower(): name for name in row.names}
+        numbers = {keywords.get(f"TTYPE{column}", "").lower(): column for column in range(1, keywords["TFIELDS"] + 1)}
+        result = {}
+        for name in columns:
+            if name.lower() not in fields:
+                raise KeyError(f"Column {name} not found.")
+            values = table[fields[name.lower()]]
+            column = numbers[name.lower()]
+            scale, zero = keywords.get(f"TSCAL{column}", 1), keywords.get(f"TZERO{column}", 0)
+            if scale != 1 or zero != 0:
+                result[name] = np.array(values, dtype=dtype) * dtype(scale) + dtype(zero)
+            elif values.dtype.kind == "f":
+                result[name] = np.array(values, dtype=dtype)  # Native-endian, contiguous copy
+            else:
+                result[name] = np.array(values, dtype=values.dtype.newbyteorder("="))  # Bit masks stay integers
+    finally:
+        del table
+    return result
+
+
+def read_spectrum_columns(file_path, columns=SPECTRUM_COLUMNS):
+    """Read columns of the COADD table of a spec-lite file (float32 values, integer masks)."""
+    return read_columns(file_path, columns, hdu=1)
+
+
+class RemoteFile:
+    """
+    Read-only, seekable view of a remote file that fetches only the bytes read, with HTTP Range requests.
+
+    Reads are served from one read-ahead buffer, so scanning consecutive
+    header blocks costs a single request. A server that ignores Range gets
+    the whole file downloaded once and served from memory.
+    """
+
+    def __init__(self, url, session=None, read_ahead=READ_AHEAD, on_chunk=None):
+        self.url = url
+        self.owns_session = session is None
+        self.session = session or requests.Session()
+        self.read_ahead = read_ahead
+        self.on_chunk = on_chunk  # Called with the size of every chunk received (for progress and bandwidth caps)
+        self.position = 0
+        self.buffer_start = 0
+        self.buffer = b""
+        self.whole_file = False
+        self.bytes_fetched = 0
+
+    def seek(self, offset, whence=0):
+        self.position = offset if whence == 0 else self.position + offset
+        return self.position
+
+    def tell(self):
+        return self.position
+
+    def read(self, size):
+        data = self.buffered(size)
+        if len(data) < size and not self.whole_file:
+            self.buffer_start = self.position
+            self.buffer = self.fetch(self.position, max(size - len(data), self.read_ahead))
+            data += self.buffered(size - len(data))
+        return data
+
+    def buffered(self, size):
+        """Read up to `size` bytes from the buffer."""
+        start = self.position - self.buffer_start
+        if start < 0 or start >= len(self.buffer):
+            return b""
+        data = self.buffer[start:start + size]
+        self.position += len(data)
+        return data
+
+    def fetch(self, start, length):
+        """Fetch bytes [start, start + length), or fewer at the end of the file."""
+        headers = {"Range": f"bytes={start}-{start + length - 1}"}
+        with self.session.get(self.url, headers=headers, stream=True, timeout=60) as response:
+            if response.status_code == 416:  # Past the end of the file
+                return b""
+            response.raise_for_status()
+            chunks = []
+            for chunk in response.iter_content(CHUNK_SIZE):
+                self.bytes_fetched += len(chunk)
+                if self.on_chunk:
+                    self.on_chunk(len(chunk))
+                chunks.append(chunk)
+            data = b"".join(chunks)
+        if response.status_code != 206:
+            self.whole_file = True  # Server ignored the range; keep the whole file
+            self.buffer_start = 0
+        return data
+
+    def close(self):
+        if self.owns_session:
+            self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def primary_header(partial=False):
+    """
+    A data-less primary header block, for files holding only extensions.
+
+    Files holding only some HDUs of their source are marked PARTIAL = T.
+    """
+    cards = ["SIMPLE  =                    T", "BITPIX  =                    8", "NAXIS   =                    0",
+             "EXTEND  =                    T"]
+    if partial:
+        cards.append("PARTIAL =                    T / Only some HDUs of the source file")
+    cards.append("END")
+    return "".join(card.ljust(80) for card in cards).ljust(BLOCK_SIZE).encode("ascii")
+
+
+def is_partial_file(file_path):
+    """Return True if a FITS file was written by fetch_table_hdu with only some HDUs of its source."""
+    try:
+        with open(file_path, "rb") as handle:
+            keywords = scan_header(handle)
+    except (OSError, ValueError):
+        return False
+    return bool(keywords) and keywords.get("PARTIAL") == "T"
+
+
+def fetch_table_hdu(url, destination, hdu=SPECTRUM_HDUS, session=None, on_chunk=None):
+    """
+    Download binary-table HDUs of a remote FITS file into a new FITS file.
+
+    The headers are read with small Range requests until the tables are found;
+    then only their headers and data are downloaded, behind a minimal primary
+    header marked PARTIAL, so the result is a valid FITS file whose HDUs 1, 2, ...
+    are the tables in the order requested. For spec-lite files the default
+    fetches the COADD and SPALL tables without the SPZLINE extension.
+
+    Parameters:
+        hdu (int, str or tuple): HDU index or EXTNAME, or a tuple of them.
+
+    Returns:
+        int: Number of bytes transferred.
+    """
+    hdus = hdu if isinstance(hdu, (tuple, list)) else (hdu,)
+    with RemoteFile(url, session, on_chunk=on_chunk) as remote:
+        ranges = [
+            (header_offset, data_offset + data_size(keywords))
+            for keywords, header_offset, data_offset in find_tables(remote, hdus)
+        ]
+        remote.read_ahead = 0  # From here on, fetch exactly the tables
+        temporary_path = destination + ".tmp"
+        try:
+            with open(temporary_path, "wb") as output:
+                output.write(primary_header(partial=True))
+                for start, end in ranges:
+                    remote.seek(start)
+                    while remote.tell() < end:
+                        chunk = remote.read(min(end - remote.tell(), CHUNK_SIZE * 16))
+                        if not chunk:
+                            raise ValueError("Remote file is truncated.")
+                        output.write(chunk)
+            os.replace(temporary_path, destination)
+        except Exception:
+            if os.path.exists(temporary_path):
+                os.remove(temporary_path)
+            raise
+        return remote.bytes_fetched
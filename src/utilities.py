@@ -4,6 +4,18 @@ import bz2
 import shutil
 from PIL import Image
 from io import BytesIO
+from spectrum_io import fetch_table_hdu, is_partial_file, SPECTRUM_HDUS
+
+
+# Function to get the managed data directory
+def get_data_dir(*parts):
+    """
+    Return the path of the application's data directory (or a path inside it), creating it if needed.
+    """
+    base_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+    directory = os.path.join(base_dir, 'data', *parts)
+    os.makedirs(directory, exist_ok=True)
+    return directory
 
 
 # Function to validate RA/DEC input
@@ -19,12 +31,20 @@ def validate_ra_dec(ra, dec):
         return False
 
 
+# Function to build the URL of an SDSS JPEG cutout
+def sdss_cutout_url(ra, dec, scale=0.2, width=2048, height=1489):
+    """
+    URL of a north-up, TAN-projected SDSS color cutout centered on RA and DEC (scale in arcsec per pixel).
+    """
+    return f"https://skyserver.sdss.org/dr18/SkyServerWS/ImgCutout/getjpeg?ra={ra}&dec={dec}&scale={scale}&width={width}&height={height}"
+
+
 # Function to fetch SDSS image based on RA and DEC
 def fetch_sdss_image(ra, dec, scale=0.2, width=2048, height=1489):
     """
     Fetch SDSS image cutout based on RA and DEC.
     """
-    url = f"https://skyserver.sdss.org/dr18/SkyServerWS/ImgCutout/getjpeg?ra={ra}&dec={dec}&scale={scale}&width={width}&height={height}"
+    url = sdss_cutout_url(ra, dec, scale, width, height)
     try:
         response = requests.get(url)
         response.raise_for_status()
@@ -148,6 +168,59 @@ def get_specobj_id_pmf(plate, mjd, fiberid):
     return None
 
 
+# Function to convert a SpecObj row into the metadata dictionary used by the interface
+def specobj_metadata(row):
+    """
+    Map a SkyServer SpecObj row (specObjID, class, subclass, z, zErr, ra, dec, mjd, plate, fiberID, run2d) to metadata.
+    """
+    return {
+        "specObjID": row["specObjID"],
+        "class": row["class"],
+        "subclass": row.get("subclass", None),
+        "redshift": row["z"],
+        "redshift_error": row["zErr"],
+        "ra": row["ra"],
+        "dec": row["dec"],
+        "mjd": row["mjd"],
+        "plate": row["plate"],
+        "fiberID": row["fiberID"],
+        "run2d": row.get("run2d"),
+    }
+
+
+# Function to fetch the spectrum location and metadata in one query
+def get_specobj_record(ra=None, dec=None, plate=None, mjd=None, fiber=None):
+    """
+    Find a spectrum by RA/DEC (within 0.001 degrees) or by Plate, MJD, and FiberID, and return
+    its location and metadata from a single SpecObj query.
+
+    Returns:
+        dict: Metadata as from get_specobj_details (including plate, mjd, fiberID and run2d), or None.
+    """
+    url = "http://skyserver.sdss.org/dr18/SkyServerWS/SearchTools/SqlSearch"
+    if plate is not None:
+        condition = f"plate = {int(plate)} AND mjd = {int(mjd)} AND fiberID = {int(fiber)}"
+    else:
+        condition = f"ra BETWEEN {float(ra)} - 0.001 AND {float(ra)} + 0.001 AND dec BETWEEN {float(dec)} - 0.001 AND {float(dec)} + 0.001"
+    query = f"""
+    SELECT TOP 1
+        specObjID, class, subclass, z, zErr, ra, dec, mjd, plate, fiberID, run2d
+    FROM SpecObj
+    WHERE {condition}
+    """
+    params = {"cmd": query, "format": "json"}
+    try:
+        response = requests.get(url, params=params)
+        response.raise_for_status()
+        data = response.json()
+        return specobj_metadata(data[0]['Rows'][0])
+    except (IndexError, KeyError):
+        print("No spectrum found for the given position or Plate-MJD-Fiber.")
+    except Exception as e:
+        print(f"Error querying spectrum: {e}")
+    return None
+
+
 # Function to fetch detailed metadata for a given SpecObjID
 def get_specobj_details(specobj_id):
     """
@@ -182,19 +255,7 @@ def get_specobj_details(specobj_id):
         response.raise_for_status()
         data = response.json()
         if "Rows" in data[0] and len(data[0]["Rows"]) > 0:
-            row = data[0]["Rows"][0]
-            return {
-                "specObjID": row["specObjID"],
-                "class": row["class"],
-                "subclass": row.get("subclass", None),
-                "redshift": row["z"],
-                "redshift_error": row["zErr"],
-                "ra": row["ra"],
-                "dec": row["dec"],
-                "mjd": row["mjd"],
-                "plate": row["plate"],
-                "fiberID": row["fiberID"]
-            }
+            return specobj_metadata(data[0]["Rows"][0])
         else:
             print("No metadata found for the given SpecObjID.")
             return None
@@ -281,6 +342,73 @@ def query_run_rerun_camcol_field(ra, dec):
     return None
 
 
+# Function to list every field (all runs) covering RA/DEC
+def get_fields_covering(ra, dec):
+    """
+    Query all Run-Camcol-Field entries whose footprint contains RA/DEC.
+
+    Repeated imaging (e.g. Stripe 82) returns one entry per run.
+
+    Returns:
+        list: Dictionaries with run, rerun, camcol, field and mjd, or an empty list.
+    """
+    url = "http://skyserver.sdss.org/dr18/SkyServerWS/SearchTools/SqlSearch"
+    query = f"""
+    SELECT run, rerun, camcol, field, mjd_r AS mjd
+    FROM Field
+    WHERE {ra} BETWEEN raMin AND raMax
+    AND {dec} BETWEEN decMin AND decMax
+    ORDER BY mjd_r
+    """
+    params = {"cmd": query, "format": "json"}
+    try:
+        response = requests.get(url, params=params)
+        response.raise_for_status()
+        data = response.json()
+        return data[0]['Rows']
+    except (IndexError, KeyError):
+        print("No fields found for the given RA/DEC.")
+    except Exception as e:
+        print(f"Error querying fields: {e}")
+    return []
+
+
+# Function to list every field overlapping an RA/DEC box
+def get_fields_in_box(ra_min, ra_max, dec_min, dec_max):
+    """
+    Query all fields (every run) whose footprint overlaps an RA/DEC box, in a single request.
+
+    A box crossing RA = 0 is given with ra_min > ra_max.
+
+    Returns:
+        list: Dictionaries with run, rerun, camcol, field, mjd, psfWidth_r and the
+              field's raMin, raMax, decMin, decMax, or an empty list.
+    """
+    url = "http://skyserver.sdss.org/dr18/SkyServerWS/SearchTools/SqlSearch"
+    if ra_min <= ra_max:
+        ra_condition = f"raMax >= {ra_min} AND raMin <= {ra_max}"
+    else:
+        ra_condition = f"(raMax >= {ra_min} OR raMin <= {ra_max})"
+    query = f"""
+    SELECT run, rerun, camcol, field, mjd_r AS mjd, psfWidth_r, raMin, raMax, decMin, decMax
+    FROM Field
+    WHERE {ra_condition}
+    AND decMax >= {dec_min} AND decMin <= {dec_max}
+    ORDER BY run, camcol, field
+    """
+    params = {"cmd": query, "format": "json"}
+    try:
+        response = requests.get(url, params=params)
+        response.raise_for_status()
+        data = response.json()
+        return data[0]['Rows']
+    except (IndexError, KeyError):
+        print("No fields found in the given region.")
+    except Exception as e:
+        print(f"Error querying fields in region: {e}")
+    return []
+
+
 # Function to get FITS file URLs
 def get_fits_urls(run_camcol_field, bands):
     """
@@ -304,17 +432,18 @@ def download_fits_files(run_camcol_field, bands, progress_callback=None):
     """
     Download and decompress FITS files for specified bands.
     """
-    base_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
-    data_dir = os.path.join(base_dir, 'data')
-    directory = os.path.join(data_dir, run_camcol_field)
-
-    if not os.path.exists(directory):
-        os.makedirs(directory)
+    directory = get_data_dir(run_camcol_field)
 
     fits_urls = get_fits_urls(run_camcol_field, bands)
     total_files = len(fits_urls)
 
     for index, fits_url in enumerate(fits_urls, start=1):
+        # Skip frames that are already on disk
+        if os.path.exists(os.path.join(directory, fits_url.split("/")[-1].replace(".bz2", ""))):
+            if progress_callback:
+                progress_callback(int(index / total_files * 100))
+            continue
+
         try:
             response = requests.get(fits_url, stream=True)
             if response.status_code == 200:
@@ -364,27 +493,126 @@ def get_plate_mjd_fiber(ra, dec):
     return None, None, None
 
 
+# Function to guess the reduction of a plate
+def default_run2d(plate):
+    """
+    Reduction holding a plate's spectra when SpecObj.run2d is not known: 26 for SDSS-I/II plates, v5_13_2 for BOSS/eBOSS.
+    """
+    return "v5_13_2" if int(plate) >= 3500 else "26"
+
+
+# Function to build the URL of a spec-lite file
+def spectrum_url(plate, mjd, fiber, run2d=None):
+    """
+    URL of the spec-lite file of a fiber; run2d is the reduction (26, 103 or 104 for SDSS, v5_13_2 for BOSS/eBOSS).
+    """
+    run2d = str(run2d or default_run2d(plate))
+    # BOSS/eBOSS reductions (v5_*, v6_*) live under spectro/boss, the SDSS-I/II and SEGUE ones under spectro/sdss
+    survey = "boss" if run2d.startswith("v") else "sdss"
+    return (
+        f"https://dr18.sdss.org/sas/dr18/spectro/{survey}/redux/{run2d}/spectra/lite/"
+        f"{int(plate):04d}/spec-{int(plate):04d}-{mjd}-{int(fiber):04d}.fits"
+    )
+
+
+# Function to get the local path of a spec-lite file
+def spectrum_path(plate, mjd, fiber):
+    """
+    Path of a spectrum in the managed data directory (data/spectra/<plate>/).
+    """
+    return os.path.join(get_data_dir("spectra", str(plate)), f"spec-{int(plate):04d}-{mjd}-{int(fiber):04d}.fits")
+
+
+# Function to list the spectra of plates
+def get_plate_spectra(plate, mjd=None):
+    """
+    Query every fiber with a spectrum on a plate (optionally a single plugging MJD).
+
+    Returns:
+        list: Dictionaries with plate, mjd, fiberID and run2d, or an empty list.
+    """
+    url = "http://skyserver.sdss.org/dr18/SkyServerWS/SearchTools/SqlSearch"
+    mjd_condition = f"AND mjd = {int(mjd)}" if mjd is not None else ""
+    query = f"""
+    SELECT plate, mjd, fiberID, run2d
+    FROM SpecObjAll
+    WHERE plate = {int(plate)} {mjd_condition}
+    ORDER BY mjd, fiberID
+    """
+    params = {"cmd": query, "format": "json"}
+    try:
+        response = requests.get(url, params=params)
+        response.raise_for_status()
+        data = response.json()
+        return data[0]['Rows']
+    except (IndexError, KeyError):
+        print("No spectra found for the given plate.")
+    except Exception as e:
+        print(f"Error querying plate spectra: {e}")
+    return []
+
+
+# Function to resolve SpecObjIDs to Plate, MJD, and Fiber
+def get_specobj_pmf(specobj_ids, batch_size=500):
+    """
+    Query Plate, MJD, FiberID and run2d of many SpecObjIDs, a batch per request.
+
+    Returns:
+        list: Dictionaries with specObjID, plate, mjd, fiberID and run2d for the IDs found.
+    """
+    url = "http://skyserver.sdss.org/dr18/SkyServerWS/SearchTools/SqlSearch"
+    specobj_ids = [int(specobj_id) for specobj_id in specobj_ids]
+    rows = []
+    for start in range(0, len(specobj_ids), batch_size):
+        id_list = ", ".join(str(specobj_id) for specobj_id in specobj_ids[start:start + batch_size])
+        query = f"""
+        SELECT specObjID, plate, mjd, fiberID, run2d
+        FROM SpecObjAll
+        WHERE specObjID IN ({id_list})
+        """
+        params = {"cmd": query, "format": "json"}
+        try:
+            response = requests.get(url, params=params)
+            response.raise_for_status()
+            data = response.json()
+            rows += data[0]['Rows']
+        except (IndexError, KeyError):
+            print("No spectra found for the given SpecObjIDs.")
+        except Exception as e:
+            print(f"Error resolving SpecObjIDs: {e}")
+    return rows
+
+
 # Function to fetch spectrum based on Plate, MJD, and Fiber
-def fetch_spectrum_file(plate, mjd, fiber):
+def fetch_spectrum_file(plate, mjd, fiber, run2d=None, hdu=SPECTRUM_HDUS):
     """
-    Fetch spectrum data given Plate, MJD, and FiberID using DR18.
+    Fetch spectrum data given Plate, MJD, and FiberID using DR18, into the managed data directory.
+
+    Only the table HDUs `hdu` (by default COADD and SPALL, which holds the redshift) are
+    downloaded, with HTTP Range requests; pass hdu=None for the whole file, which replaces
+    a file previously fetched in part.
     """
-    url = f"https://dr18.sdss.org/sas/dr18/spectro/sdss/redux/26/spectra/lite/{plate}/spec-{plate}-{mjd}-{fiber:04d}.fits"
-    file_name = f"spec-{plate}-{mjd}-{fiber:04d}.fits"
+    url = spectrum_url(plate, mjd, fiber, run2d)
+    file_name = spectrum_path(plate, mjd, fiber)
     try:
         # Check if the file already exists
-        if os.path.exists(file_name):
+        if os.path.exists(file_name) and not (hdu is None and is_partial_file(file_name)):
             print(f"File '{file_name}' already exists. Skipping download.")
             return file_name  # Return the existing file path
 
-        # Download the spectrum file
-        response = requests.get(url)
+        if hdu is not None:
+            fetch_table_hdu(url, file_name, hdu)
+            return file_name
+
+        # Download the spectrum file, moving it into place only once complete
+        response = requests.get(url, timeout=60)
         response.raise_for_status()
 
         # Save the file
-        with open(file_name, "wb") as f:
+        with open(file_name + ".part", "wb") as f:
             f.write(response.content)
+        os.replace(file_name + ".part", file_name)
         return file_name
     except Exception as e:
         print(f"Error fetching spectrum data: {e}")
-        return None
\ No newline at end of file
+        return None